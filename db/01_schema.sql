@@ -40,6 +40,22 @@ CREATE TABLE IF NOT EXISTS forecasting.category_sales_forecast (
     mae               DOUBLE PRECISION
 );
 
+-- forecasting.worker_shards (live forecasting worker replicas, by heartbeat)
+CREATE TABLE IF NOT EXISTS forecasting.worker_shards (
+    worker_id    TEXT PRIMARY KEY,
+    started_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+    heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- forecasting.merchant_leases (which replica forecasts a merchant in a worker cycle)
+CREATE TABLE IF NOT EXISTS forecasting.merchant_leases (
+    merchant_id  BIGINT PRIMARY KEY,
+    worker_id    TEXT        NOT NULL,
+    cycle        BIGINT      NOT NULL,  -- floor(epoch seconds / cycle length)
+    leased_until TIMESTAMPTZ NOT NULL,  -- extended by the holder's heartbeats
+    completed    BOOLEAN     NOT NULL DEFAULT FALSE
+);
+
 
 -- ingestion.merchants
 -- Each merchant operates in a single base currency (no multi-currency orders)
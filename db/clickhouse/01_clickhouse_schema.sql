@@ -26,12 +26,115 @@ CREATE TABLE IF NOT EXISTS category_sales_forecast (
     model_name        LowCardinality(String),  -- rolling, wma, ses, arima, snaive, ensemble
     generated_at      DateTime64(3, 'UTC'),
     forecast_horizon  UInt16,
-    forecasted_values String,  -- JSON array of forecasts
+    forecast_dates    Array(DateTime64(3, 'UTC')),  -- bucket start of each forecast point
+    forecast_values   Array(Float64),               -- forecast of each point (same length)
     mae               Nullable(Float64)
 )
 ENGINE = MergeTree()
 PARTITION BY toYYYYMM(generated_at)
-ORDER BY (merchant_id, category_id, model_name, generated_at);
+ORDER BY (merchant_id, category_id, model_name, generated_at)
+TTL toDateTime(generated_at) + INTERVAL 7 DAY  -- full-resolution history; older runs live in category_sales_forecast_daily
+SETTINGS non_replicated_deduplication_window = 1000;  -- dedup of retried worker inserts (insert_deduplication_token)
+
+-- Migration of tables created with the JSON forecasted_values String column
+ALTER TABLE category_sales_forecast ADD COLUMN IF NOT EXISTS forecast_dates Array(DateTime64(3, 'UTC')) AFTER forecast_horizon;
+ALTER TABLE category_sales_forecast ADD COLUMN IF NOT EXISTS forecast_values Array(Float64) AFTER forecast_dates;
+-- Old rows are converted before the JSON column is dropped (points were written with a 'date' or 'bucket_start' key);
+-- the column is added first so the conversion is a no-op on tables that never had it
+ALTER TABLE category_sales_forecast ADD COLUMN IF NOT EXISTS forecasted_values String DEFAULT '';
+ALTER TABLE category_sales_forecast UPDATE
+    forecast_dates = arrayMap(
+        point -> parseDateTime64BestEffortOrZero(
+            if(JSONHas(point, 'date'), JSONExtractString(point, 'date'), JSONExtractString(point, 'bucket_start')), 3, 'UTC'
+        ),
+        JSONExtractArrayRaw(forecasted_values)
+    ),
+    forecast_values = arrayMap(point -> JSONExtractFloat(point, 'value'), JSONExtractArrayRaw(forecasted_values))
+WHERE forecasted_values != '' AND empty(forecast_values)
+SETTINGS mutations_sync = 2;
+ALTER TABLE category_sales_forecast DROP COLUMN IF EXISTS forecasted_values;
+ALTER TABLE category_sales_forecast MODIFY TTL toDateTime(generated_at) + INTERVAL 7 DAY;
+ALTER TABLE category_sales_forecast MODIFY SETTING non_replicated_deduplication_window = 1000;
+
+-- Latest forecast per (merchant, category, model), read by /forecast/compare-models
+-- ReplacingMergeTree: keeps the most recent run; fed by a materialized view on every forecast insert
+CREATE TABLE IF NOT EXISTS category_sales_forecast_latest (
+    merchant_id       UInt64,
+    category_id       UInt64,
+    model_name        LowCardinality(String),
+    generated_at      DateTime64(3, 'UTC'),
+    forecast_horizon  UInt16,
+    forecast_dates    Array(DateTime64(3, 'UTC')),
+    forecast_values   Array(Float64),
+    mae               Nullable(Float64)
+)
+ENGINE = ReplacingMergeTree(generated_at)
+ORDER BY (merchant_id, category_id, model_name);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS category_sales_forecast_latest_mv TO category_sales_forecast_latest AS
+SELECT merchant_id, category_id, model_name, generated_at, forecast_horizon, forecast_dates, forecast_values, mae
+FROM category_sales_forecast;
+
+-- Downsampled forecast history: the last run of each day per (merchant, category, model), kept for a year
+CREATE TABLE IF NOT EXISTS category_sales_forecast_daily (
+    merchant_id       UInt64,
+    category_id       UInt64,
+    model_name        LowCardinality(String),
+    forecast_day      Date,
+    generated_at      DateTime64(3, 'UTC'),
+    forecast_horizon  UInt16,
+    forecast_dates    Array(DateTime64(3, 'UTC')),
+    forecast_values   Array(Float64),
+    mae               Nullable(Float64)
+)
+ENGINE = ReplacingMergeTree(generated_at)
+PARTITION BY toYYYYMM(forecast_day)
+ORDER BY (merchant_id, category_id, model_name, forecast_day)
+TTL forecast_day + INTERVAL 365 DAY;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS category_sales_forecast_daily_mv TO category_sales_forecast_daily AS
+SELECT merchant_id, category_id, model_name, toDate(generated_at) AS forecast_day, generated_at,
+       forecast_horizon, forecast_dates, forecast_values, mae
+FROM category_sales_forecast;
+
+-- Backfill of existing forecasts (no-op once the tables have rows)
+INSERT INTO category_sales_forecast_latest
+SELECT merchant_id, category_id, model_name, generated_at, forecast_horizon, forecast_dates, forecast_values, mae
+FROM category_sales_forecast
+WHERE (SELECT count() FROM category_sales_forecast_latest) = 0;
+
+INSERT INTO category_sales_forecast_daily
+SELECT merchant_id, category_id, model_name, toDate(generated_at) AS forecast_day, generated_at,
+       forecast_horizon, forecast_dates, forecast_values, mae
+FROM category_sales_forecast
+WHERE (SELECT count() FROM category_sales_forecast_daily) = 0;
+
+-- ARIMA parameters per series (warm starts for the forecasting worker)
+-- ReplacingMergeTree: keeps the most recent fit for each (merchant, category, bucket_type)
+CREATE TABLE IF NOT EXISTS arima_model_params (
+    merchant_id  UInt64,
+    category_id  UInt64,
+    bucket_type  LowCardinality(String),
+    params       Array(Float64),  -- statsmodels ARIMA params vector
+    nobs         UInt32,          -- observations when the params were optimised
+    fitted_at    DateTime64(3, 'UTC')
+)
+ENGINE = ReplacingMergeTree(fitted_at)
+ORDER BY (merchant_id, category_id, bucket_type);
+
+-- Model selected for model=auto per series (computed by the forecasting worker)
+-- ReplacingMergeTree: keeps the most recent selection for each (merchant, category, bucket_type)
+CREATE TABLE IF NOT EXISTS category_model_selection (
+    merchant_id  UInt64,
+    category_id  UInt64,
+    bucket_type  LowCardinality(String),
+    model_name   LowCardinality(String),  -- model with the lowest one-step holdout error
+    holdout_ape  Float64,                 -- its absolute percentage error on the last point
+    data_points  UInt32,                  -- series length at selection time
+    selected_at  DateTime64(3, 'UTC')
+)
+ENGINE = ReplacingMergeTree(selected_at)
+ORDER BY (merchant_id, category_id, bucket_type);
 
 -- Processed Events (idempotency tracking)
 CREATE TABLE IF NOT EXISTS processed_events (
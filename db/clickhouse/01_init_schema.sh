@@ -29,12 +29,126 @@ CREATE TABLE IF NOT EXISTS category_sales_forecast (
     model_name        LowCardinality(String),
     generated_at      DateTime64(3, 'UTC'),
     forecast_horizon  UInt16,
-    forecasted_values String,
+    forecast_dates    Array(DateTime64(3, 'UTC')),
+    forecast_values   Array(Float64),
     mae               Nullable(Float64)
 )
 ENGINE = MergeTree()
 PARTITION BY toYYYYMM(generated_at)
-ORDER BY (merchant_id, category_id, model_name, generated_at);
+ORDER BY (merchant_id, category_id, model_name, generated_at)
+TTL toDateTime(generated_at) + INTERVAL 7 DAY
+SETTINGS non_replicated_deduplication_window = 1000;
+"
+
+# Migration of tables created with the JSON forecasted_values String column: old rows are converted
+# (points were written with a 'date' or 'bucket_start' key) before the column is dropped; it is added
+# first so the conversion is a no-op on tables that never had it
+clickhouse-client --multiquery --query "
+ALTER TABLE category_sales_forecast ADD COLUMN IF NOT EXISTS forecast_dates Array(DateTime64(3, 'UTC')) AFTER forecast_horizon;
+ALTER TABLE category_sales_forecast ADD COLUMN IF NOT EXISTS forecast_values Array(Float64) AFTER forecast_dates;
+ALTER TABLE category_sales_forecast ADD COLUMN IF NOT EXISTS forecasted_values String DEFAULT '';
+ALTER TABLE category_sales_forecast UPDATE
+    forecast_dates = arrayMap(
+        point -> parseDateTime64BestEffortOrZero(
+            if(JSONHas(point, 'date'), JSONExtractString(point, 'date'), JSONExtractString(point, 'bucket_start')), 3, 'UTC'
+        ),
+        JSONExtractArrayRaw(forecasted_values)
+    ),
+    forecast_values = arrayMap(point -> JSONExtractFloat(point, 'value'), JSONExtractArrayRaw(forecasted_values))
+WHERE forecasted_values != '' AND empty(forecast_values)
+SETTINGS mutations_sync = 2;
+ALTER TABLE category_sales_forecast DROP COLUMN IF EXISTS forecasted_values;
+"
+clickhouse-client --query "ALTER TABLE category_sales_forecast MODIFY TTL toDateTime(generated_at) + INTERVAL 7 DAY;"
+# Retried worker inserts carry an insert_deduplication_token; keep recent tokens on the non-replicated table
+clickhouse-client --query "ALTER TABLE category_sales_forecast MODIFY SETTING non_replicated_deduplication_window = 1000;"
+
+# Latest forecast per (merchant, category, model), fed by a materialized view
+clickhouse-client --query "
+CREATE TABLE IF NOT EXISTS category_sales_forecast_latest (
+    merchant_id       UInt64,
+    category_id       UInt64,
+    model_name        LowCardinality(String),
+    generated_at      DateTime64(3, 'UTC'),
+    forecast_horizon  UInt16,
+    forecast_dates    Array(DateTime64(3, 'UTC')),
+    forecast_values   Array(Float64),
+    mae               Nullable(Float64)
+)
+ENGINE = ReplacingMergeTree(generated_at)
+ORDER BY (merchant_id, category_id, model_name);
+"
+
+clickhouse-client --query "
+CREATE MATERIALIZED VIEW IF NOT EXISTS category_sales_forecast_latest_mv TO category_sales_forecast_latest AS
+SELECT merchant_id, category_id, model_name, generated_at, forecast_horizon, forecast_dates, forecast_values, mae
+FROM category_sales_forecast;
+"
+
+# Downsampled forecast history (last run of each day), fed by a materialized view
+clickhouse-client --query "
+CREATE TABLE IF NOT EXISTS category_sales_forecast_daily (
+    merchant_id       UInt64,
+    category_id       UInt64,
+    model_name        LowCardinality(String),
+    forecast_day      Date,
+    generated_at      DateTime64(3, 'UTC'),
+    forecast_horizon  UInt16,
+    forecast_dates    Array(DateTime64(3, 'UTC')),
+    forecast_values   Array(Float64),
+    mae               Nullable(Float64)
+)
+ENGINE = ReplacingMergeTree(generated_at)
+PARTITION BY toYYYYMM(forecast_day)
+ORDER BY (merchant_id, category_id, model_name, forecast_day)
+TTL forecast_day + INTERVAL 365 DAY;
+"
+
+clickhouse-client --query "
+CREATE MATERIALIZED VIEW IF NOT EXISTS category_sales_forecast_daily_mv TO category_sales_forecast_daily AS
+SELECT merchant_id, category_id, model_name, toDate(generated_at) AS forecast_day, generated_at,
+       forecast_horizon, forecast_dates, forecast_values, mae
+FROM category_sales_forecast;
+"
+
+# Backfill of existing forecasts (no-op once the tables have rows)
+clickhouse-client --multiquery --query "
+INSERT INTO category_sales_forecast_latest
+SELECT merchant_id, category_id, model_name, generated_at, forecast_horizon, forecast_dates, forecast_values, mae
+FROM category_sales_forecast
+WHERE (SELECT count() FROM category_sales_forecast_latest) = 0;
+INSERT INTO category_sales_forecast_daily
+SELECT merchant_id, category_id, model_name, toDate(generated_at) AS forecast_day, generated_at,
+       forecast_horizon, forecast_dates, forecast_values, mae
+FROM category_sales_forecast
+WHERE (SELECT count() FROM category_sales_forecast_daily) = 0;
+"
+
+clickhouse-client --query "
+CREATE TABLE IF NOT EXISTS arima_model_params (
+    merchant_id      UInt64,
+    category_id      UInt64,
+    bucket_type      LowCardinality(String),
+    params           Array(Float64),
+    nobs             UInt32,
+    fitted_at        DateTime64(3, 'UTC')
+)
+ENGINE = ReplacingMergeTree(fitted_at)
+ORDER BY (merchant_id, category_id, bucket_type);
+"
+
+clickhouse-client --query "
+CREATE TABLE IF NOT EXISTS category_model_selection (
+    merchant_id      UInt64,
+    category_id      UInt64,
+    bucket_type      LowCardinality(String),
+    model_name       LowCardinality(String),
+    holdout_ape      Float64,
+    data_points      UInt32,
+    selected_at      DateTime64(3, 'UTC')
+)
+ENGINE = ReplacingMergeTree(selected_at)
+ORDER BY (merchant_id, category_id, bucket_type);
 "
 
 clickhouse-client --query "
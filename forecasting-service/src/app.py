@@ -1,22 +1,41 @@
 import logging
 from fastapi import FastAPI, Query, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel, Field
-from typing import List, Dict
+from typing import Callable, Hashable, List, Dict, Optional
 from enum import Enum
 from contextlib import asynccontextmanager
 import os
 
+from apscheduler.schedulers.background import BackgroundScheduler
+
 from . import db
 from .service import ForecastingService, CategoryForecastResult, compute_confidence # Import compute_confidence
 
 from .evaluate_models import evaluate_models
+from .eval_jobs import get_evaluation_jobs
+from .response_cache import ResponseCache
+from .category_catalog import get_category_catalog
+from .forecast_store import LatestForecastStore
+from .executors import ALL_EXECUTORS, BoundedExecutor, io_executor, fit_executor, eval_executor
+from .config import (
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_AGE_SECONDS,
+    CATEGORY_CATALOG_REFRESH_SECONDS,
+    FORECAST_STORE_ENABLED,
+)
 from .postgres_client import get_postgres_client
 from .clickhouse_client import get_clickhouse_client
 
 logger = logging.getLogger(__name__)
 
+class ForecastPointResponse(BaseModel):
+    date: str = Field(..., example="2024-01-15 00:00:00")
+    value: float = Field(..., example=1234.56)
+
+
 class CategoryForecastResponse(BaseModel):
     category_id: int = Field(..., example=101)
     category_name: str = Field(..., example="Beverages")
@@ -24,6 +43,8 @@ class CategoryForecastResponse(BaseModel):
     model: str = Field(..., example="rolling")
     lookback: int = Field(..., example=4)      # Re-added
     confidence: str = Field(..., example="MEDIUM") # Re-added
+    # Full pre-computed horizon (compare-models only); forecast_value is its first point
+    forecast_points: Optional[List[ForecastPointResponse]] = None
 
 
 class ForecastResponse(BaseModel):
@@ -31,6 +52,26 @@ class ForecastResponse(BaseModel):
     messages: List[str]
 
 
+class EvaluationJobProgress(BaseModel):
+    categories_done: int = Field(..., example=12)
+    categories_total: Optional[int] = Field(None, example=40)
+
+
+class EvaluationJobResponse(BaseModel):
+    job_id: str
+    merchant_id: int = Field(..., example=1)
+    bucket_type: str = Field(..., example="DAY")
+    test_points: int = Field(..., example=5)
+    status: str = Field(..., example="running")  # queued | running | completed | failed
+    reused: bool = False  # True when an identical stored job was returned
+    progress: EvaluationJobProgress
+    submitted_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    metrics: Optional[Dict[str, Dict]] = None  # Partial while running, final once completed
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Verify Postgres connectivity on startup
@@ -55,7 +96,26 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"Failed to connect to ClickHouse: {e}")
     
+    # Preload category names; if Postgres is down the periodic refresh keeps retrying
+    catalog = get_category_catalog()
+    catalog.refresh()
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(catalog.refresh, 'interval', seconds=CATEGORY_CATALOG_REFRESH_SECONDS, coalesce=True, max_instances=1)
+    # Load the latest forecasts before serving; until a refresh succeeds compare-models reads ClickHouse
+    if forecast_store is not None:
+        forecast_store.refresh()
+        scheduler.add_job(
+            forecast_store.refresh, 'interval', seconds=forecast_store.refresh_interval_seconds,
+            coalesce=True, max_instances=1,
+        )
+    scheduler.start()
+    
     yield
+    
+    scheduler.shutdown(wait=False)
+    get_evaluation_jobs().shutdown()
+    for executor in ALL_EXECUTORS:
+        executor.shutdown()
 
 
 app = FastAPI(
@@ -110,6 +170,43 @@ class ForecastModelName(str, Enum):
 
 forecasting_service = ForecastingService()
 
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    max_age_seconds=RESPONSE_CACHE_MAX_AGE_SECONDS,
+) if RESPONSE_CACHE_ENABLED else None
+
+# Latest forecasts of every merchant, serialized, for compare-models
+forecast_store = LatestForecastStore(
+    build=lambda latest_forecasts: _compare_models_response(latest_forecasts).model_dump_json().encode()
+) if FORECAST_STORE_ENABLED else None
+
+
+async def _cached_response(
+    key: Hashable,
+    probe: Callable[[], Optional[int]],
+    build: Callable[[], ForecastResponse],
+    build_executor: BoundedExecutor,
+) -> Response:
+    """
+    Serve a serialized response from the response cache while `probe()` (a one-row
+    freshness query) returns the same token it did when the response was built.
+    The probe runs before the build, so data changing mid-build only causes an extra miss.
+    Probes run on the io executor; only misses take a slot on `build_executor`.
+    """
+    if response_cache is None:
+        return await build_executor.run(build)
+    try:
+        token = await io_executor.run(probe)
+    except Exception as e:
+        logger.warning(f"Freshness probe failed, bypassing response cache: {e}")
+        return await build_executor.run(build)
+
+    body = response_cache.get(key, token)
+    if body is None:
+        body = (await build_executor.run(build)).model_dump_json().encode()
+        response_cache.put(key, token, body)
+    return Response(content=body, media_type="application/json")
+
 
 @app.get("/", include_in_schema=False)
 async def root():
@@ -122,17 +219,54 @@ def health():
 
 
 @app.get("/health/postgres", tags=["health"], summary="PostgreSQL health")
-def postgres_health():
+async def postgres_health():
     """Check PostgreSQL database connection status."""
     client = get_postgres_client()
-    return client.health_check()
+    return await io_executor.run(client.health_check)
 
 
 @app.get("/health/clickhouse", tags=["health"], summary="ClickHouse health")
-def clickhouse_health():
+async def clickhouse_health():
     """Check ClickHouse database connection status."""
     client = get_clickhouse_client()
-    return client.health_check()
+    return await io_executor.run(client.health_check)
+
+
+@app.get("/health/caches", tags=["health"], summary="In-process cache statistics")
+async def cache_health():
+    """Size and hit/miss/eviction counters of the fit, response and category caches and the forecast store."""
+    fit_cache = forecasting_service.fit_cache
+    return {
+        "category_catalog": get_category_catalog().stats(),
+        "fit_cache": fit_cache.stats() if fit_cache is not None else {"enabled": False},
+        "response_cache": response_cache.stats() if response_cache is not None else {"enabled": False},
+        "forecast_store": forecast_store.stats() if forecast_store is not None else {"enabled": False},
+    }
+
+
+@app.get("/health/executors", tags=["health"], summary="API executor load")
+async def executor_health():
+    """Pending, completed and rejected calls per API executor, and evaluation job counts."""
+    stats = {executor.name: executor.stats() for executor in ALL_EXECUTORS}
+    stats["eval_jobs"] = get_evaluation_jobs().stats()
+    return stats
+
+
+@app.get("/health/forecast-age", tags=["health"], summary="Age of the stored forecasts per merchant")
+async def forecast_age_health():
+    """Seconds since each merchant's latest stored forecast (stalest first), with max and median."""
+    ages = await io_executor.run(db.fetch_forecast_ages)
+    merchants = [
+        {"merchant_id": merchant_id, "generated_at_ms": generated_at_ms, "age_seconds": age_seconds}
+        for merchant_id, (generated_at_ms, age_seconds) in sorted(ages.items(), key=lambda item: -item[1][1])
+    ]
+    sorted_ages = sorted(age_seconds for _, age_seconds in ages.values())
+    return {
+        "merchant_count": len(merchants),
+        "max_age_seconds": sorted_ages[-1] if sorted_ages else None,
+        "p50_age_seconds": sorted_ages[len(sorted_ages) // 2] if sorted_ages else None,
+        "merchants": merchants,
+    }
 
 
 @app.get(
@@ -142,15 +276,26 @@ def clickhouse_health():
     summary="Real-time forecast generation",
     description="Generate forecasts on-the-fly for top N categories. Use this for real-time predictions with custom model/lookback. Slower than compare-models but uses live data.",
 )
-def forecast_top_categories(
+async def forecast_top_categories(
     merchant_id: int = Query(..., description="Merchant identifier", examples={"default": {"value": 1}}),
     bucket_type: str = Query(..., regex="^(DAY|WEEK|MONTH)$", description="Aggregation bucket type", examples={"day": {"value": "DAY"}}),
     model: ForecastModelName = Query(ForecastModelName.rolling, description="Forecasting model", examples={"rolling": {"value": "rolling"}, "wma": {"value": "wma"}, "ses": {"value": "ses"}, "snaive": {"value": "snaive"}}),
     lookback: int = Query(4, ge=1, le=12, description="Rolling window lookback", examples={"default": {"value": 4}}),
     limit: int = Query(5, ge=1, le=20, description="Max number of categories to return", examples={"default": {"value": 5}}),
 ):
-    # This endpoint still calculates on-demand, which could be a future improvement.
+    # Computed on demand; repeated requests are served from the response cache until the aggregates change.
     logger.info(f"Received /forecast/top-categories request for merchant_id={merchant_id}, bucket_type={bucket_type}, model={model}, lookback={lookback}, limit={limit}")
+    return await _cached_response(
+        key=("top-categories", merchant_id, bucket_type, model.value, lookback, limit),
+        probe=lambda: db.get_agg_freshness(merchant_id, bucket_type),
+        build=lambda: _build_top_categories(merchant_id, bucket_type, model, lookback, limit),
+        build_executor=fit_executor,
+    )
+
+
+def _build_top_categories(
+    merchant_id: int, bucket_type: str, model: ForecastModelName, lookback: int, limit: int
+) -> ForecastResponse:
     category_series, category_names = db.fetch_category_time_series(
         merchant_id=merchant_id,
         bucket_type=bucket_type
@@ -187,13 +332,28 @@ def forecast_top_categories(
     summary="Pre-computed forecast lookup (fast)",
     description="Fetch the latest pre-computed forecasts from the database. These are generated by the forecasting-worker every 60 seconds. Use this for dashboard displays and quick lookups.",
 )
-def compare_models(
+async def compare_models(
     merchant_id: int = Query(..., description="Merchant identifier", examples={"default": {"value": 1}}),
     limit: int = Query(5, ge=1, le=20, description="Max number of categories to return", examples={"default": {"value": 5}}),
 ):
     logger.info(f"Received /forecast/compare-models request for merchant_id={merchant_id}, limit={limit}")
-    latest_forecasts = db.fetch_latest_forecasts(merchant_id, limit)
+    if forecast_store is not None:
+        body = forecast_store.get(merchant_id)
+        if body is not None:
+            return Response(content=body, media_type="application/json")
+    return await _cached_response(
+        key=("compare-models", merchant_id, limit),
+        probe=lambda: db.get_latest_forecast_time(merchant_id),
+        build=lambda: _build_compare_models(merchant_id, limit),
+        build_executor=io_executor,
+    )
+
+
+def _build_compare_models(merchant_id: int, limit: int) -> ForecastResponse:
+    return _compare_models_response(db.fetch_latest_forecasts(merchant_id, limit))
+
 
+def _compare_models_response(latest_forecasts: List[Dict]) -> ForecastResponse:
     if not latest_forecasts:
         return ForecastResponse(forecasts=[], messages=["No pre-computed forecasts found for this merchant."])
 
@@ -203,10 +363,14 @@ def compare_models(
     fixed_confidence = compute_confidence(fixed_lookback)
 
     for forecast_row in latest_forecasts:
-        # The pre-computed forecast values are a list of dicts.
-        # For this API, we'll just take the first predicted value.
-        forecast_values = forecast_row['forecasted_values']
-        first_forecast_value = forecast_values[0]['value'] if forecast_values else 0.0
+        # The pre-computed forecast has one date/value per bucket of the horizon.
+        # forecast_value stays the next bucket; the whole horizon is in forecast_points.
+        forecast_values = forecast_row['forecast_values']
+        first_forecast_value = forecast_values[0] if forecast_values else 0.0
+        forecast_points = [
+            ForecastPointResponse(date=str(date), value=value)
+            for date, value in zip(forecast_row['forecast_dates'], forecast_values)
+        ]
 
         all_forecasts.append(
             CategoryForecastResponse(
@@ -215,7 +379,8 @@ def compare_models(
                 model=forecast_row['model_name'],
                 forecast_value=first_forecast_value,
                 lookback=fixed_lookback,    # Injected
-                confidence=fixed_confidence # Injected
+                confidence=fixed_confidence, # Injected
+                forecast_points=forecast_points,
             )
         )
     
@@ -232,18 +397,52 @@ def compare_models(
     summary="Model accuracy evaluation (slowest)",
     description="Run walk-forward validation to compare model accuracy. Returns MAE/RMSE metrics per model. Use this for model selection and accuracy analysis.",
 )
-def run_evaluation(
+async def run_evaluation(
     merchant_id: int = Query(..., description="Merchant identifier", examples={"default": {"value": 1}}),
     bucket_type: str = Query(..., regex="^(DAY|WEEK|MONTH)$", description="Aggregation bucket type", examples={"day": {"value": "DAY"}}),
     test_points: int = Query(5, ge=1, le=20, description="Number of test points for validation"),
 ):
     try:
-        return evaluate_models(
+        return await eval_executor.run(
+            evaluate_models,
             merchant_id=merchant_id,
             bucket_type=bucket_type,
             test_points=test_points
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post(
+    "/evaluate-models/jobs",
+    response_model=EvaluationJobResponse,
+    status_code=202,
+    tags=["evaluation"],
+    summary="Start a background model evaluation",
+    description="Queue the walk-forward validation of /evaluate-models as a background job and return its id immediately. Poll GET /evaluate-models/jobs/{job_id} for progress and metrics. An identical job whose data has not changed since is returned instead of being re-run.",
+)
+async def submit_evaluation_job(
+    merchant_id: int = Query(..., description="Merchant identifier", examples={"default": {"value": 1}}),
+    bucket_type: str = Query(..., regex="^(DAY|WEEK|MONTH)$", description="Aggregation bucket type", examples={"day": {"value": "DAY"}}),
+    test_points: int = Query(5, ge=1, le=20, description="Number of test points for validation"),
+):
+    jobs = get_evaluation_jobs()
+    job, reused = await io_executor.run(jobs.submit, merchant_id, bucket_type, test_points)
+    return {**jobs.snapshot(job), "reused": reused}
+
+
+@app.get(
+    "/evaluate-models/jobs/{job_id}",
+    response_model=EvaluationJobResponse,
+    tags=["evaluation"],
+    summary="Evaluation job status",
+    description="Status, progress and metrics of an evaluation job. While running, metrics cover the categories evaluated so far.",
+)
+async def get_evaluation_job(job_id: str):
+    jobs = get_evaluation_jobs()
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Evaluation job {job_id} not found")
+    return jobs.snapshot(job)
@@ -0,0 +1,126 @@
+"""
+Parameter store for warm-started ARIMA refits.
+
+Keeps the fitted parameters of each (merchant, category, bucket_type) series.
+The next forecast either re-applies them with a Kalman filter pass (no
+optimisation) when only a few points arrived since the fit, or uses them as
+start_params for a much shorter MLE fit. Entries can be persisted to the
+ClickHouse table arima_model_params so a restarted worker starts warm.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (merchant_id, category_id, bucket_type)
+ArimaKey = Tuple[int, int, str]
+
+PARAMS_COLUMNS = ['merchant_id', 'category_id', 'bucket_type', 'params', 'nobs', 'fitted_at']
+
+
+@dataclass
+class ArimaState:
+    params: np.ndarray
+    nobs: int          # Observations in the series when the params were last optimised
+    fitted_at: float   # Epoch seconds of that fit
+
+
+class ArimaParamStore:
+    """
+    Thread-safe, size-bounded (LRU) map of ArimaKey -> ArimaState.
+    """
+
+    def __init__(self, max_new_points: int = 2, max_age_seconds: int = 3600, max_entries: int = 100_000):
+        self.max_new_points = max_new_points
+        self.max_age_seconds = max_age_seconds
+        self.max_entries = max_entries
+        self._states: "OrderedDict[ArimaKey, ArimaState]" = OrderedDict()
+        self._dirty: Dict[ArimaKey, ArimaState] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: ArimaKey) -> Optional[ArimaState]:
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+            return state
+
+    def put(self, key: ArimaKey, state: ArimaState, dirty: bool = True):
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            if dirty:
+                self._dirty[key] = state
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
+
+    def can_reuse(self, state: ArimaState, nobs: int) -> bool:
+        """True when stored params may be applied as-is: few new points and a recent fit."""
+        new_points = nobs - state.nobs
+        return 0 <= new_points <= self.max_new_points and time.time() - state.fitted_at <= self.max_age_seconds
+
+    def drain_dirty(self) -> Dict[ArimaKey, ArimaState]:
+        """Return and clear the entries changed since the last drain."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            return dirty
+
+    def merge(self, states: Dict[ArimaKey, ArimaState]):
+        """Adopt states fitted elsewhere (e.g. in a pool process); they are persisted on the next flush."""
+        for key, state in states.items():
+            self.put(key, state)
+
+    def load(self, ch_client) -> int:
+        """Load the most recent params of every series from ClickHouse."""
+        columns = ch_client.query_columns(
+            """
+            SELECT merchant_id, category_id, bucket_type, params, nobs,
+                   toUnixTimestamp64Milli(fitted_at) AS fitted_at_ms
+            FROM arima_model_params FINAL
+            """
+        )
+        if not columns:
+            return 0
+        for merchant_id, category_id, bucket_type, params, nobs, fitted_at_ms in zip(
+            columns['merchant_id'].tolist(),
+            columns['category_id'].tolist(),
+            columns['bucket_type'].tolist(),
+            columns['params'],
+            columns['nobs'].tolist(),
+            columns['fitted_at_ms'].tolist(),
+        ):
+            self.put(
+                (merchant_id, category_id, bucket_type),
+                ArimaState(np.asarray(params, dtype=np.float64), int(nobs), fitted_at_ms / 1000.0),
+                dirty=False,
+            )
+        logger.info(f"Loaded {len(columns['merchant_id'])} ARIMA parameter sets from ClickHouse")
+        return len(columns['merchant_id'])
+
+    def flush(self, ch_client) -> int:
+        """Persist changed entries to ClickHouse (ReplacingMergeTree keeps the newest per series)."""
+        dirty = self.drain_dirty()
+        if not dirty:
+            return 0
+        data = [
+            [merchant_id, category_id, bucket_type, state.params.tolist(), state.nobs,
+             datetime.fromtimestamp(state.fitted_at, tz=timezone.utc)]
+            for (merchant_id, category_id, bucket_type), state in dirty.items()
+        ]
+        try:
+            ch_client.insert('arima_model_params', data, PARAMS_COLUMNS)
+        except Exception:
+            # Keep them for the next flush
+            with self._lock:
+                for key, state in dirty.items():
+                    self._dirty.setdefault(key, state)
+            raise
+        return len(data)
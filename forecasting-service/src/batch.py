@@ -0,0 +1,72 @@
+"""
+Vectorized batch engine for the closed-form forecasting models.
+
+Aligns every category series of a merchant into one right-aligned NumPy matrix
+(categories x buckets) so rolling, WMA and seasonal-naive forecasts for all
+categories are computed with a few array operations instead of a Python loop
+per category.
+"""
+
+from typing import Dict, List
+
+import numpy as np
+
+from .timeseries import TimeSeries
+
+
+class BatchForecastEngine:
+    """
+    Holds the most recent `window` buckets of every category series.
+
+    Rows are right-aligned on the latest bucket and left-padded with NaN, so
+    column -1 is always a category's last observation. `offset` arguments drop
+    the last N buckets (e.g. offset=1 forecasts the final point from the rest).
+    """
+
+    def __init__(self, series_map: Dict[int, TimeSeries], window: int):
+        self.category_ids: List[int] = list(series_map.keys())
+        self.window = max(int(window), 1)
+        self.lengths = np.zeros(len(self.category_ids), dtype=np.int64)
+        self.values = np.full((len(self.category_ids), self.window), np.nan, dtype=np.float64)
+
+        for row, category_id in enumerate(self.category_ids):
+            series = series_map[category_id]
+            self.lengths[row] = len(series)
+            tail = series.values[-self.window:]
+            if len(tail):
+                self.values[row, self.window - len(tail):] = tail
+
+    def _tail(self, size: int, offset: int) -> np.ndarray:
+        end = self.window - offset
+        if size > end:
+            raise ValueError(f"Batch window {self.window} too small for size={size}, offset={offset}")
+        return self.values[:, end - size:end]
+
+    def available(self, offset: int = 0) -> np.ndarray:
+        """Number of usable data points per category once `offset` buckets are dropped."""
+        return np.maximum(self.lengths - offset, 0)
+
+    def rolling(self, lookback: int, offset: int = 0) -> np.ndarray:
+        """Mean of the last `lookback` values per category (NaN where data is short)."""
+        tail = self._tail(lookback, offset)
+        eligible = self.available(offset) >= lookback
+        return np.where(eligible, tail.sum(axis=1) / lookback, np.nan)
+
+    def wma(self, lookback: int, offset: int = 0) -> np.ndarray:
+        """Linearly weighted mean of the last `lookback` values (weights 1..lookback)."""
+        tail = self._tail(lookback, offset)
+        weights = np.arange(1, lookback + 1, dtype=np.float64)
+        eligible = self.available(offset) >= lookback
+        return np.where(eligible, (tail @ weights) / weights.sum(), np.nan)
+
+    def snaive(self, period: int, offset: int = 0) -> np.ndarray:
+        """Value observed one season (`period` buckets) before the forecast bucket."""
+        tail = self._tail(period, offset)
+        eligible = self.available(offset) >= period
+        return np.where(eligible, tail[:, 0], np.nan)
+
+    def snaive_steps(self, period: int, steps: int, offset: int = 0) -> np.ndarray:
+        """Seasonal-naive forecasts of the next `steps` buckets (categories x steps): the last season repeated."""
+        tail = self._tail(period, offset)
+        eligible = self.available(offset) >= period
+        return np.where(eligible[:, None], tail[:, np.arange(steps) % period], np.nan)
@@ -0,0 +1,168 @@
+"""
+Process-wide cache of category names (ingestion.categories in PostgreSQL).
+
+Loaded once at startup and kept current by an incremental refresh on
+updated_at, so forecast requests for known categories never query Postgres.
+Ids that are not cached yet are looked up directly; while Postgres is
+unavailable those lookups back off and callers fall back to str(category_id).
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from opentelemetry import trace
+
+from .config import CATEGORY_CATALOG_REFRESH_SECONDS, CATEGORY_CATALOG_LAG_SECONDS
+from .postgres_client import get_postgres_client
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+
+class CategoryCatalog:
+    """
+    Thread-safe map of category_id -> name with an updated_at watermark.
+    """
+
+    _instance = None
+
+    def __init__(
+        self,
+        refresh_interval_seconds: float = CATEGORY_CATALOG_REFRESH_SECONDS,
+        lag_seconds: float = CATEGORY_CATALOG_LAG_SECONDS,
+    ):
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.lag = timedelta(seconds=lag_seconds)
+        self._names: Dict[int, str] = {}
+        self._watermark: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # Direct lookups of unknown ids are skipped until this time after a Postgres failure
+        self._backoff_until = 0.0
+        # Ids Postgres did not return -> monotonic time after which they may be looked up again
+        self._unknown: Dict[int, float] = {}
+        self.last_refresh_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def loaded(self) -> bool:
+        return self.last_refresh_at is not None
+
+    def refresh(self) -> int:
+        """
+        Load categories changed since the watermark (all of them on the first call).
+        Returns the number of rows read; failures are logged and leave the cache as is.
+        """
+        with self._refresh_lock:
+            since = self._watermark - self.lag if self._watermark is not None else None
+            with tracer.start_as_current_span("db.refresh_category_catalog") as span:
+                span.set_attribute("db.system", "postgresql")
+                span.set_attribute("db.operation", "SELECT")
+                span.set_attribute("incremental", since is not None)
+                try:
+                    with get_postgres_client().cursor() as cur:
+                        if since is None:
+                            cur.execute("SELECT id, name, updated_at FROM ingestion.categories")
+                        else:
+                            cur.execute(
+                                "SELECT id, name, updated_at FROM ingestion.categories WHERE updated_at > %s",
+                                (since,),
+                            )
+                        rows = cur.fetchall()
+                except Exception as e:
+                    self._record_failure(e)
+                    return 0
+                span.set_attribute("row_count", len(rows))
+
+            with self._lock:
+                for row in rows:
+                    self._names[row['id']] = row['name']
+                    self._unknown.pop(row['id'], None)
+                    if self._watermark is None or row['updated_at'] > self._watermark:
+                        self._watermark = row['updated_at']
+            self.last_refresh_at = time.time()
+            self.last_error = None
+            if rows:
+                logger.info(f"Category catalog refreshed: {len(rows)} rows ({len(self._names)} cached)")
+            return len(rows)
+
+    def _record_failure(self, error: Exception):
+        self.failures += 1
+        self.last_error = str(error)
+        self._backoff_until = time.monotonic() + self.refresh_interval_seconds
+        logger.warning(f"Category catalog could not reach Postgres, serving cached names: {error}")
+
+    def _lookup(self, category_ids: Iterable[int]) -> Dict[int, str]:
+        """Direct lookup of ids missing from the cache (e.g. created since the last refresh)."""
+        ids = list(category_ids)
+        if not ids or time.monotonic() < self._backoff_until:
+            return {}
+        with tracer.start_as_current_span("db.get_category_names") as span:
+            span.set_attribute("db.system", "postgresql")
+            span.set_attribute("db.operation", "SELECT")
+            span.set_attribute("category_count", len(ids))
+            placeholders = ','.join(['%s'] * len(ids))
+            try:
+                with get_postgres_client().cursor() as cur:
+                    cur.execute(f"SELECT id, name FROM ingestion.categories WHERE id IN ({placeholders})", tuple(ids))
+                    rows = cur.fetchall()
+            except Exception as e:
+                self._record_failure(e)
+                return {}
+        found = {row['id']: row['name'] for row in rows}
+        retry_at = time.monotonic() + self.refresh_interval_seconds
+        with self._lock:
+            self._names.update(found)
+            for category_id in ids:
+                if category_id not in found:
+                    self._unknown[category_id] = retry_at
+        return found
+
+    def get_names(self, category_ids: Iterable[int]) -> Dict[int, str]:
+        """
+        Names of the given categories. Ids unknown to both the cache and Postgres
+        (or unresolvable while it is down) are left out; callers fall back to str(id).
+        """
+        names: Dict[int, str] = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for category_id in category_ids:
+                name = self._names.get(category_id)
+                if name is not None:
+                    names[category_id] = name
+                elif self._unknown.get(category_id, 0.0) <= now:
+                    missing.append(category_id)
+            self.hits += len(names)
+            self.misses += len(missing)
+        if missing:
+            names.update(self._lookup(missing))
+        return names
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._names),
+                "watermark": self._watermark.isoformat() if self._watermark is not None else None,
+                "last_refresh_at": self.last_refresh_at,
+                "hits": self.hits,
+                "misses": self.misses,
+                "failures": self.failures,
+                "last_error": self.last_error,
+            }
+
+
+def get_category_catalog() -> CategoryCatalog:
+    return CategoryCatalog.get_instance()
@@ -5,7 +5,12 @@ Singleton client for ClickHouse database access (analytics queries and writes).
 
 import os
 import logging
+from typing import Dict, Iterator, Optional, Sequence
+
 import clickhouse_connect
+from clickhouse_connect import common as clickhouse_common
+import numpy as np
+import pandas as pd
 from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
@@ -34,8 +39,15 @@ class ClickHouseClient:
         return cls._instance
     
     def _get_client(self):
-        """Lazy initialization of ClickHouse client."""
+        """
+        Lazy initialization of ClickHouse client.
+        The client is shared by concurrent threads (worker pipeline stages, the write buffer's
+        flusher, API executors), so it runs without a session: ClickHouse rejects concurrent
+        queries in one session ("session is locked"). Nothing here relies on session state.
+        """
         if self._client is None:
+            # Applies to clients created from here on (a common setting in clickhouse-connect 0.7)
+            clickhouse_common.set_setting("autogenerate_session_id", False)
             self._client = clickhouse_connect.get_client(
                 host=CLICKHOUSE_HOST,
                 port=CLICKHOUSE_PORT,
@@ -58,6 +70,36 @@ class ClickHouseClient:
             rows.append(dict(zip(columns, row)))
         return rows
     
+    def query_df(self, sql: str, parameters: dict = None) -> pd.DataFrame:
+        """
+        Execute a query and return results as a pandas DataFrame.
+        Columns are decoded block-wise into NumPy arrays; no per-row Python objects are built.
+        """
+        client = self._get_client()
+        return client.query_df(sql, parameters=parameters)
+    
+    def query_columns(self, sql: str, parameters: dict = None) -> Dict[str, np.ndarray]:
+        """
+        Execute a query and return results as {column_name: numpy array}.
+        Returns an empty dict when the query produced no rows.
+        Cast Decimal columns with toFloat64() in SQL to get float64 arrays.
+        """
+        df = self.query_df(sql, parameters)
+        if df.empty:
+            return {}
+        return {column: df[column].to_numpy() for column in df.columns}
+    
+    def stream_columns(self, sql: str, parameters: dict = None) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Execute a query and yield its result block by block as {column_name: numpy array},
+        so large scans can be processed without holding the whole result in memory.
+        """
+        client = self._get_client()
+        with client.query_df_stream(sql, parameters=parameters) as stream:
+            for df in stream:
+                if not df.empty:
+                    yield {column: df[column].to_numpy() for column in df.columns}
+    
     def insert(self, table: str, data: list, column_names: list):
         """
         Insert data into a table.
@@ -65,6 +107,17 @@ class ClickHouseClient:
         client = self._get_client()
         client.insert(table, data, column_names=column_names)
     
+    def insert_columns(self, table: str, columns: Dict[str, Sequence], settings: Optional[dict] = None):
+        """
+        Insert column-oriented data, {column_name: values}, without building per-row lists.
+        NumPy arrays are converted with one tolist() per column (a 2-D array gives one Array value per row);
+        DateTime64 values may be given as integer ticks (epoch milliseconds for DateTime64(3)).
+        `settings` are per-insert ClickHouse settings (e.g. async_insert, insert_deduplication_token).
+        """
+        data = [values.tolist() if isinstance(values, np.ndarray) else values for values in columns.values()]
+        client = self._get_client()
+        client.insert(table, data, column_names=list(columns), column_oriented=True, settings=settings)
+    
     def command(self, sql: str, parameters: dict = None):
         """
         Execute a command (INSERT, UPDATE, etc.) that doesn't return results.
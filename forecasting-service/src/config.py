@@ -1,3 +1,187 @@
 import os
+import socket
 
 
+# --- Forecasting worker ---
+
+# Processes used to fit the per-category models (SES, ARIMA).
+# 1 = fit sequentially inside the worker process, 0 = one process per CPU.
+WORKER_PROCESSES = int(os.getenv("FORECAST_WORKER_PROCESSES", "1"))
+
+# Fit tasks are grouped into about this many chunks per process. More chunks
+# balance better at the end of a run; fewer chunks mean less pickling overhead.
+WORKER_CHUNKS_PER_PROCESS = int(os.getenv("FORECAST_WORKER_CHUNKS_PER_PROCESS", "4"))
+
+# Incremental runs: only refit (merchant, category) series whose category_sales_agg
+# rows changed since the last run, carrying previous forecasts forward for the rest.
+WORKER_INCREMENTAL = os.getenv("FORECAST_WORKER_INCREMENTAL", "true").lower() == "true"
+# Re-scan this far behind the stored watermark, for rows that become visible late.
+WATERMARK_LAG_SECONDS = int(os.getenv("FORECAST_WATERMARK_LAG_SECONDS", "10"))
+# Force a full refit every N runs as a safety net (0 = never).
+FULL_REFRESH_EVERY_RUNS = int(os.getenv("FORECAST_FULL_REFRESH_EVERY_RUNS", "60"))
+# Merchants whose last results are kept for carrying forward (0 = all); others are refitted in full on change.
+WORKER_INCREMENTAL_MAX_MERCHANTS = int(os.getenv("FORECAST_WORKER_INCREMENTAL_MAX_MERCHANTS", "50000"))
+
+# Bulk fetch: read every planned merchant's series in one ordered scan and split it per
+# merchant on the client, instead of one FINAL query per merchant.
+WORKER_BULK_FETCH = os.getenv("FORECAST_WORKER_BULK_FETCH", "true").lower() == "true"
+# Split the bulk scan of a full run into this many queries by hash of merchant_id (bounds per-query memory).
+WORKER_FETCH_PARTITIONS = int(os.getenv("FORECAST_WORKER_FETCH_PARTITIONS", "1"))
+# Planned merchants (incremental, sharded or prioritized runs) are fetched in batches of this many per query.
+WORKER_FETCH_BATCH = int(os.getenv("FORECAST_WORKER_FETCH_BATCH", "100"))
+# Buckets forecast ahead per series (every model forecasts all of them from one fit), by bucket type.
+FORECAST_HORIZONS = {
+    "DAY": int(os.getenv("FORECAST_HORIZON_DAY", "7")),
+    "WEEK": int(os.getenv("FORECAST_HORIZON_WEEK", "4")),
+    "MONTH": int(os.getenv("FORECAST_HORIZON_MONTH", "3")),
+}
+# Select the model=auto winner of every refitted series and store it in category_model_selection.
+WORKER_MODEL_SELECTION = os.getenv("FORECAST_WORKER_MODEL_SELECTION", "true").lower() == "true"
+
+
+# --- Worker pipeline ---
+
+# Each run streams merchants through fetch -> fit -> write stages connected by bounded queues.
+# Threads per stage: fetch units (scan partitions / merchant batches) read concurrently, merchants
+# fitted concurrently (0 = one per fitting process), merchants stored concurrently.
+WORKER_FETCH_THREADS = int(os.getenv("FORECAST_WORKER_FETCH_THREADS", "1"))
+WORKER_FIT_THREADS = int(os.getenv("FORECAST_WORKER_FIT_THREADS", "0"))
+WORKER_WRITE_THREADS = int(os.getenv("FORECAST_WORKER_WRITE_THREADS", "1"))
+# Backpressure: merchants waiting for the fit / write stage before the stage in front blocks.
+WORKER_FIT_QUEUE_SIZE = int(os.getenv("FORECAST_WORKER_FIT_QUEUE_SIZE", "8"))
+WORKER_WRITE_QUEUE_SIZE = int(os.getenv("FORECAST_WORKER_WRITE_QUEUE_SIZE", "8"))
+# Queued merchants a fit thread takes at once; their SES/ARIMA fits go to the process pool in one
+# call, so its cost-balanced chunks span merchants (keep at most FORECAST_WORKER_FIT_QUEUE_SIZE).
+WORKER_FIT_BATCH = int(os.getenv("FORECAST_WORKER_FIT_BATCH", "8"))
+
+
+# --- Worker write buffer ---
+
+# Forecast and model selection rows are buffered across merchants and written as one insert once
+# this many rows are buffered (0 = one insert per merchant) or the oldest is this many seconds old.
+WORKER_WRITE_BUFFER_ROWS = int(os.getenv("FORECAST_WORKER_WRITE_BUFFER_ROWS", "10000"))
+WORKER_WRITE_BUFFER_SECONDS = float(os.getenv("FORECAST_WORKER_WRITE_BUFFER_SECONDS", "5"))
+# Use ClickHouse async inserts (async_insert=1, waiting for the server-side flush).
+WORKER_ASYNC_INSERT = os.getenv("FORECAST_WORKER_ASYNC_INSERT", "false").lower() == "true"
+# Retries of a failed insert (same insert_deduplication_token), with exponential backoff.
+WORKER_INSERT_RETRIES = int(os.getenv("FORECAST_WORKER_INSERT_RETRIES", "3"))
+WORKER_INSERT_RETRY_BACKOFF_SECONDS = float(os.getenv("FORECAST_WORKER_INSERT_RETRY_BACKOFF_SECONDS", "0.5"))
+
+
+# --- Worker priority scheduling ---
+
+# Order each cycle's merchants by forecast staleness x size x data velocity and cut them to a time budget;
+# merchants that do not fit are deferred to the next cycle. Opt-in: a prioritized full run fetches the ranked
+# merchants in batches (FORECAST_WORKER_FETCH_BATCH) instead of the partitioned bulk scan.
+WORKER_PRIORITY = os.getenv("FORECAST_WORKER_PRIORITY", "false").lower() == "true"
+# Seconds of fitting per cycle when prioritizing (0 = no budget, only ordering). Keep below the 60s run interval.
+WORKER_CYCLE_BUDGET_SECONDS = float(os.getenv("FORECAST_WORKER_CYCLE_BUDGET_SECONDS", "50"))
+# Staleness assumed for merchants without a stored forecast.
+WORKER_PRIORITY_MAX_AGE_SECONDS = float(os.getenv("FORECAST_WORKER_PRIORITY_MAX_AGE_SECONDS", "86400"))
+
+# --- Worker sharding ---
+
+# Several worker replicas split the merchants: a consistent-hash ring over the live replicas
+# (heartbeats in Postgres forecasting.worker_shards) assigns each merchant to one replica, and a
+# per-cycle lease in forecasting.merchant_leases makes sure it is forecast once per cycle.
+WORKER_SHARDING = os.getenv("FORECAST_WORKER_SHARDING", "false").lower() == "true"
+# Replica identity on the ring (default: hostname-pid).
+WORKER_ID = os.getenv("FORECAST_WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")
+# Replicas and leases without a heartbeat for this long are considered dead; their merchants move.
+WORKER_LEASE_TTL_SECONDS = int(os.getenv("FORECAST_WORKER_LEASE_TTL_SECONDS", "90"))
+WORKER_HEARTBEAT_SECONDS = int(os.getenv("FORECAST_WORKER_HEARTBEAT_SECONDS", "15"))
+# Length of a forecasting cycle; a merchant is leased at most once per cycle.
+WORKER_CYCLE_SECONDS = int(os.getenv("FORECAST_WORKER_CYCLE_SECONDS", "60"))
+# Virtual nodes per replica on the hash ring (more = more even split).
+WORKER_RING_VNODES = int(os.getenv("FORECAST_WORKER_RING_VNODES", "64"))
+
+# --- ClickHouse reads ---
+
+# How deduplicated category_sales_agg series are read from the ReplacingMergeTree:
+# "argmax" = GROUP BY the sorting key keeping argMax(..., updated_at) (no query-time merge),
+# "final"  = SELECT ... FINAL. Both return the same rows (see src/dedup_check.py).
+AGG_READ_MODE = os.getenv("FORECAST_AGG_READ_MODE", "argmax").lower()
+
+
+# --- ARIMA warm start ---
+
+ARIMA_WARM_START = os.getenv("FORECAST_ARIMA_WARM_START", "true").lower() == "true"
+# Re-apply stored params without re-optimising while at most this many points were added since the fit.
+ARIMA_MAX_NEW_POINTS = int(os.getenv("FORECAST_ARIMA_MAX_NEW_POINTS", "2"))
+# Stored params older than this are re-optimised (warm-started) regardless of new points.
+ARIMA_PARAMS_MAX_AGE_SECONDS = int(os.getenv("FORECAST_ARIMA_PARAMS_MAX_AGE_SECONDS", "3600"))
+ARIMA_PARAMS_MAX_ENTRIES = int(os.getenv("FORECAST_ARIMA_PARAMS_MAX_ENTRIES", "100000"))
+# Persist params to ClickHouse (arima_model_params) so restarts start warm. Used by the worker.
+ARIMA_PARAMS_PERSIST = os.getenv("FORECAST_ARIMA_PARAMS_PERSIST", "true").lower() == "true"
+
+
+# --- Fit cache (on-demand forecasts) ---
+
+FIT_CACHE_ENABLED = os.getenv("FORECAST_FIT_CACHE_ENABLED", "true").lower() == "true"
+FIT_CACHE_MAX_BYTES = int(os.getenv("FORECAST_FIT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+FIT_CACHE_TTL_SECONDS = float(os.getenv("FORECAST_FIT_CACHE_TTL_SECONDS", "300"))
+
+# --- Response cache (forecast endpoints) ---
+
+# Serialized responses are reused while the freshness probe (max updated_at /
+# generated_at for the merchant) is unchanged and the entry is younger than the max age.
+RESPONSE_CACHE_ENABLED = os.getenv("FORECAST_RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("FORECAST_RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+RESPONSE_CACHE_MAX_AGE_SECONDS = float(os.getenv("FORECAST_RESPONSE_CACHE_MAX_AGE_SECONDS", "600"))
+
+# --- Latest-forecast store (API) ---
+
+# Keep the latest forecasts of every merchant in the API process and serve /forecast/compare-models
+# from memory; the store polls category_sales_forecast_latest for new generated_at values.
+FORECAST_STORE_ENABLED = os.getenv("FORECAST_STORE_ENABLED", "false").lower() == "true"
+# Poll interval; the worker writes once per 60s cycle.
+FORECAST_STORE_REFRESH_SECONDS = float(os.getenv("FORECAST_STORE_REFRESH_SECONDS", "30"))
+# Reload every merchant this often anyway (picks up renamed categories).
+FORECAST_STORE_FULL_RELOAD_SECONDS = float(os.getenv("FORECAST_STORE_FULL_RELOAD_SECONDS", "600"))
+
+# --- Auto model selection (API) ---
+
+# model=auto uses the worker's stored selection and fits only the chosen model; categories
+# without one (new, or bucket types the worker does not forecast) are selected per request.
+AUTO_STORED_SELECTION = os.getenv("FORECAST_AUTO_STORED_SELECTION", "true").lower() == "true"
+
+# --- Category catalog (API) ---
+
+# Category names are cached in process and refreshed incrementally on ingestion.categories.updated_at.
+CATEGORY_CATALOG_REFRESH_SECONDS = float(os.getenv("FORECAST_CATEGORY_CATALOG_REFRESH_SECONDS", "30"))
+# Re-read rows this far behind the newest updated_at seen, for transactions that commit late.
+CATEGORY_CATALOG_LAG_SECONDS = float(os.getenv("FORECAST_CATEGORY_CATALOG_LAG_SECONDS", "60"))
+
+# --- API executors ---
+
+# Threads for blocking database reads of the fast endpoints (compare-models, freshness probes, health).
+API_IO_THREADS = int(os.getenv("FORECAST_API_IO_THREADS", "16"))
+# Queued + running reads beyond this are answered with 503 (0 = unbounded).
+API_IO_MAX_PENDING = int(os.getenv("FORECAST_API_IO_MAX_PENDING", "256"))
+# On-demand model fitting (top-categories). Kept small: fits are CPU bound.
+API_FIT_THREADS = int(os.getenv("FORECAST_API_FIT_THREADS", "2"))
+# Queued + running fit requests beyond this are answered with 503 (0 = unbounded).
+API_FIT_MAX_PENDING = int(os.getenv("FORECAST_API_FIT_MAX_PENDING", "32"))
+API_EVAL_THREADS = int(os.getenv("FORECAST_API_EVAL_THREADS", "1"))
+API_EVAL_MAX_PENDING = int(os.getenv("FORECAST_API_EVAL_MAX_PENDING", "4"))
+
+# --- Walk-forward evaluation ---
+
+# SES/ARIMA are fitted once per category and rolled forward through the test origins;
+# their parameters are re-estimated every N origins (0 = never, fastest).
+EVAL_REFIT_EVERY = int(os.getenv("FORECAST_EVAL_REFIT_EVERY", "5"))
+
+# --- Evaluation jobs (API) ---
+
+# Processes evaluating category shards of background evaluation jobs, shared by all jobs
+# (1 = evaluate inside the job's thread, 0 = one process per CPU).
+EVAL_JOB_PROCESSES = int(os.getenv("FORECAST_EVAL_JOB_PROCESSES", "2"))
+# Categories per shard; progress and partial metrics advance one shard at a time.
+EVAL_JOB_SHARD_CATEGORIES = int(os.getenv("FORECAST_EVAL_JOB_SHARD_CATEGORIES", "4"))
+# Jobs fetching and dispatching at the same time; further jobs wait in the queue.
+EVAL_JOB_CONCURRENCY = int(os.getenv("FORECAST_EVAL_JOB_CONCURRENCY", "4"))
+# Queued + running jobs beyond this are rejected with 503.
+EVAL_JOB_MAX_PENDING = int(os.getenv("FORECAST_EVAL_JOB_MAX_PENDING", "32"))
+# Finished jobs kept for polling and reuse (oldest dropped first), and for how long.
+EVAL_JOB_MAX_STORED = int(os.getenv("FORECAST_EVAL_JOB_MAX_STORED", "256"))
+EVAL_JOB_MAX_AGE_SECONDS = float(os.getenv("FORECAST_EVAL_JOB_MAX_AGE_SECONDS", "3600"))
@@ -2,52 +2,67 @@
 Database module for forecasting service.
 
 Data sources:
-- ClickHouse: Analytics data (category_sales_agg, category_sales_forecast)
+- ClickHouse: Analytics data (category_sales_agg, category_sales_forecast, category_model_selection)
 - PostgreSQL: Catalog data (ingestion.categories for category names)
 """
 
 import os
-import json
 import logging
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from datetime import datetime
+import numpy as np
+import pandas as pd
 from opentelemetry import trace
 
-from .service import TimeSeriesPoint
-from .postgres_client import get_postgres_client
+from .timeseries import TimeSeries, split_series
+from .category_catalog import get_category_catalog
+from .config import AGG_READ_MODE
 from .clickhouse_client import get_clickhouse_client
 
 logger = logging.getLogger(__name__)
 tracer = trace.get_tracer(__name__)
 
 
-def _get_category_names_from_postgres(category_ids: List[int]) -> Dict[int, str]:
+def agg_series_sql(
+    where: str,
+    order_by: str,
+    key_columns: str = "category_id",
+    table: str = "category_sales_agg",
+    mode: Optional[str] = None,
+) -> str:
     """
-    Fetch category names from PostgreSQL (catalog data).
-    Category names stay in PostgreSQL as part of the OLTP catalog.
+    SQL selecting deduplicated (key_columns, bucket_start, total_sales_amount) rows
+    of category_sales_agg (ReplacingMergeTree(updated_at)) matching `where`.
+
+    mode "argmax" groups by the full sorting key and keeps the latest version with
+    argMax(..., updated_at): parts are read in parallel with no query-time merge.
+    mode "final" reads through FINAL. The two differ only for versions of a key with
+    identical updated_at (FINAL keeps the last inserted, argMax any of them).
+    `where` must only filter sorting key columns, so it selects whole keys in both modes.
     """
-    if not category_ids:
-        return {}
-    
-    with tracer.start_as_current_span("db.get_category_names") as span:
-        span.set_attribute("db.system", "postgresql")
-        span.set_attribute("db.operation", "SELECT")
-        span.set_attribute("category_count", len(category_ids))
-        
-        client = get_postgres_client()
-        placeholders = ','.join(['%s'] * len(category_ids))
-        sql = f"SELECT id, name FROM ingestion.categories WHERE id IN ({placeholders})"
-        
-        with client.cursor() as cur:
-            cur.execute(sql, tuple(category_ids))
-            rows = cur.fetchall()
-            return {row['id']: row['name'] for row in rows}
+    mode = mode or AGG_READ_MODE
+    if mode == "final":
+        return f"""
+            SELECT {key_columns}, bucket_start, toFloat64(total_sales_amount) AS total_sales_amount
+            FROM {table} FINAL
+            WHERE {where}
+            ORDER BY {order_by}
+        """
+    if mode == "argmax":
+        return f"""
+            SELECT {key_columns}, bucket_start, toFloat64(argMax(total_sales_amount, updated_at)) AS total_sales_amount
+            FROM {table}
+            WHERE {where}
+            GROUP BY merchant_id, category_id, bucket_type, bucket_start
+            ORDER BY {order_by}
+        """
+    raise ValueError(f"Unknown category_sales_agg read mode: {mode}")
 
 
 def fetch_category_time_series(
     merchant_id: int,
     bucket_type: str
-) -> Tuple[Dict[int, List[TimeSeriesPoint]], Dict[int, str]]:
+) -> Tuple[Dict[int, TimeSeries], Dict[int, str]]:
     """
     Fetch time series data for all categories of a merchant.
     
@@ -61,44 +76,106 @@ def fetch_category_time_series(
         
         ch_client = get_clickhouse_client()
         
-        # Use FINAL to get deduplicated results from ReplacingMergeTree
-        sql = """
-            SELECT
-                category_id,
-                bucket_start,
-                total_sales_amount
-            FROM category_sales_agg FINAL
-            WHERE merchant_id = %(merchant_id)s
-              AND bucket_type = %(bucket_type)s
-            ORDER BY category_id, bucket_start
-        """
+        # Latest version of each row of the ReplacingMergeTree
+        sql = agg_series_sql(
+            where="merchant_id = %(merchant_id)s AND bucket_type = %(bucket_type)s",
+            order_by="category_id, bucket_start",
+        )
         
-        rows = ch_client.query(sql, {"merchant_id": merchant_id, "bucket_type": bucket_type})
-        span.set_attribute("row_count", len(rows))
+        columns = ch_client.query_columns(sql, {"merchant_id": merchant_id, "bucket_type": bucket_type})
+        span.set_attribute("row_count", len(columns["category_id"]) if columns else 0)
     
-    if not rows:
+    if not columns:
         return {}, {}
     
-    # Build time series
-    series: Dict[int, List[TimeSeriesPoint]] = {}
-    category_ids = set()
-    
-    for row in rows:
-        category_id = row['category_id']
-        category_ids.add(category_id)
-        series.setdefault(category_id, []).append(
-            TimeSeriesPoint(
-                bucket_start=row['bucket_start'],
-                value=float(row['total_sales_amount'])
-            )
-        )
+    # Build one array-backed series per category (rows are ordered by category_id, bucket_start)
+    series = split_series(columns["category_id"], columns["bucket_start"], columns["total_sales_amount"])
     
-    # Fetch category names from PostgreSQL (catalog stays in OLTP)
-    category_names = _get_category_names_from_postgres(list(category_ids))
+    # Category names from the in-process catalog (PostgreSQL only for ids it doesn't know yet)
+    category_names = get_category_catalog().get_names(series.keys())
     
     return series, category_names
 
 
+def _merchant_series(parts: List[Dict[str, np.ndarray]]) -> Tuple[int, Dict[int, TimeSeries]]:
+    """Join the block pieces of one merchant and split them per category."""
+    if len(parts) == 1:
+        columns = parts[0]
+    else:
+        columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    merchant_id = int(columns["merchant_id"][0])
+    return merchant_id, split_series(columns["category_id"], columns["bucket_start"], columns["total_sales_amount"])
+
+
+def _split_merchant_blocks(blocks: Iterable[Dict[str, np.ndarray]]) -> Iterator[Tuple[int, Dict[int, TimeSeries]]]:
+    """
+    Turn result blocks ordered by merchant_id into one batch per merchant.
+    A merchant is yielded as soon as the first row of the next merchant arrives.
+    """
+    parts: List[Dict[str, np.ndarray]] = []  # rows of the merchant still being read
+    for block in blocks:
+        merchants = block["merchant_id"]
+        if parts and parts[-1]["merchant_id"][0] != merchants[0]:
+            yield _merchant_series(parts)
+            parts = []
+        start = 0
+        for end in np.flatnonzero(merchants[1:] != merchants[:-1]) + 1:
+            parts.append({name: column[start:end] for name, column in block.items()})
+            yield _merchant_series(parts)
+            parts = []
+            start = end
+        parts.append({name: column[start:] for name, column in block.items()})
+    if parts:
+        yield _merchant_series(parts)
+
+
+def stream_merchant_series(
+    bucket_type: str,
+    merchant_ids: Optional[Iterable[int]] = None,
+    partitions: int = 1,
+    partition: Optional[int] = None,
+) -> Iterator[Tuple[int, Dict[int, TimeSeries]]]:
+    """
+    Stream the series of every merchant (or of `merchant_ids`) as (merchant_id, {category_id: series}).
+    
+    Data source: ClickHouse (category_sales_agg)
+    
+    One ordered, deduplicated scan replaces a DISTINCT query plus one query per merchant. With
+    `partitions` > 1 the scan is split into that many queries by cityHash64(merchant_id),
+    which bounds the sort/merge memory of each query; `partition` runs only that one of them.
+    """
+    params = {"bucket_type": bucket_type, "partitions": partitions}
+    merchant_filter = ""
+    if merchant_ids is not None:
+        params["merchant_ids"] = tuple(sorted(merchant_ids))
+        if not params["merchant_ids"]:
+            return
+        merchant_filter = "AND merchant_id IN %(merchant_ids)s"
+    
+    ch_client = get_clickhouse_client()
+    for partition in (range(partitions) if partition is None else [partition]):
+        partition_filter = "AND cityHash64(merchant_id) %% %(partitions)s = %(partition)s" if partitions > 1 else ""
+        sql = agg_series_sql(
+            where=f"bucket_type = %(bucket_type)s {merchant_filter} {partition_filter}",
+            order_by="merchant_id, category_id, bucket_start",
+            key_columns="merchant_id, category_id",
+        )
+        # Not made current: the span stays open across yields to the caller
+        span = tracer.start_span("db.stream_merchant_series")
+        span.set_attribute("db.system", "clickhouse")
+        span.set_attribute("db.operation", "SELECT")
+        span.set_attribute("bucket_type", bucket_type)
+        span.set_attribute("partition", partition)
+        merchant_count = 0
+        try:
+            for merchant in _split_merchant_blocks(ch_client.stream_columns(sql, {**params, "partition": partition})):
+                merchant_count += 1
+                yield merchant
+        finally:
+            span.set_attribute("merchant_count", merchant_count)
+            span.end()
+
+
 def get_distinct_merchants() -> List[int]:
     """
     Returns a list of all unique merchant_ids from the sales aggregation table.
@@ -110,10 +187,185 @@ def get_distinct_merchants() -> List[int]:
         
         ch_client = get_clickhouse_client()
         
-        rows = ch_client.query("SELECT DISTINCT merchant_id FROM category_sales_agg FINAL")
-        span.set_attribute("merchant_count", len(rows))
+        # No FINAL: replacing versions never add or remove a merchant
+        columns = ch_client.query_columns("SELECT DISTINCT merchant_id FROM category_sales_agg")
+        merchant_ids = columns["merchant_id"].tolist() if columns else []
+        span.set_attribute("merchant_count", len(merchant_ids))
     
-    return [row['merchant_id'] for row in rows]
+    return merchant_ids
+
+
+def get_agg_watermark(bucket_type: str) -> Optional[int]:
+    """
+    Latest updated_at in category_sales_agg for a bucket type, as epoch milliseconds.
+    Data source: ClickHouse
+    """
+    ch_client = get_clickhouse_client()
+    columns = ch_client.query_columns(
+        """
+        SELECT toUnixTimestamp64Milli(max(updated_at)) AS watermark_ms
+        FROM category_sales_agg
+        WHERE bucket_type = %(bucket_type)s
+        HAVING count() > 0
+        """,
+        {"bucket_type": bucket_type},
+    )
+    return int(columns["watermark_ms"][0]) if columns else None
+
+
+def get_agg_freshness(merchant_id: int, bucket_type: str) -> Optional[int]:
+    """
+    Latest updated_at of a merchant's aggregates for a bucket type, as epoch milliseconds.
+    Cheap freshness probe for cached responses (primary key prefix, no FINAL).
+    Data source: ClickHouse (category_sales_agg)
+    """
+    ch_client = get_clickhouse_client()
+    columns = ch_client.query_columns(
+        """
+        SELECT toUnixTimestamp64Milli(max(updated_at)) AS updated_at_ms
+        FROM category_sales_agg
+        WHERE merchant_id = %(merchant_id)s AND bucket_type = %(bucket_type)s
+        HAVING count() > 0
+        """,
+        {"merchant_id": merchant_id, "bucket_type": bucket_type},
+    )
+    return int(columns["updated_at_ms"][0]) if columns else None
+
+
+def get_latest_forecast_time(merchant_id: int) -> Optional[int]:
+    """
+    Latest generated_at of a merchant's stored forecasts, as epoch milliseconds.
+    Data source: ClickHouse (category_sales_forecast_latest)
+    """
+    ch_client = get_clickhouse_client()
+    columns = ch_client.query_columns(
+        """
+        SELECT toUnixTimestamp64Milli(max(generated_at)) AS generated_at_ms
+        FROM category_sales_forecast_latest
+        WHERE merchant_id = %(merchant_id)s
+        HAVING count() > 0
+        """,
+        {"merchant_id": merchant_id},
+    )
+    return int(columns["generated_at_ms"][0]) if columns else None
+
+
+def get_forecast_watermark() -> Optional[int]:
+    """
+    Latest generated_at of all stored forecasts, as epoch milliseconds.
+    One aggregate without GROUP BY: a cheap probe for whether any forecast was written.
+    Data source: ClickHouse (category_sales_forecast_latest)
+    """
+    ch_client = get_clickhouse_client()
+    columns = ch_client.query_columns(
+        """
+        SELECT toUnixTimestamp64Milli(max(generated_at)) AS watermark_ms
+        FROM category_sales_forecast_latest
+        HAVING count() > 0
+        """
+    )
+    return int(columns["watermark_ms"][0]) if columns else None
+
+
+def fetch_forecast_ages() -> Dict[int, Tuple[int, int]]:
+    """
+    Latest stored forecast per merchant, {merchant_id: (generated_at epoch ms, age in seconds)}.
+    Data source: ClickHouse (category_sales_forecast_latest)
+    """
+    with tracer.start_as_current_span("db.fetch_forecast_ages") as span:
+        span.set_attribute("db.system", "clickhouse")
+        span.set_attribute("db.operation", "SELECT")
+        columns = get_clickhouse_client().query_columns(
+            """
+            SELECT
+                merchant_id,
+                toUnixTimestamp64Milli(max(generated_at)) AS generated_at_ms,
+                dateDiff('second', max(generated_at), now64(3)) AS age_seconds
+            FROM category_sales_forecast_latest
+            GROUP BY merchant_id
+            """
+        )
+        span.set_attribute("merchant_count", len(columns["merchant_id"]) if columns else 0)
+    if not columns:
+        return {}
+    return {
+        merchant_id: (generated_at_ms, age_seconds)
+        for merchant_id, generated_at_ms, age_seconds in zip(
+            columns["merchant_id"].tolist(), columns["generated_at_ms"].tolist(), columns["age_seconds"].tolist()
+        )
+    }
+
+
+def fetch_changed_categories(bucket_type: str, since_ms: int) -> Tuple[Dict[int, Set[int]], Optional[int]]:
+    """
+    Returns the (merchant -> categories) whose aggregates changed after `since_ms`
+    (epoch milliseconds), plus the newest updated_at among them.
+    Data source: ClickHouse (category_sales_agg)
+
+    No FINAL needed: any row version newer than the watermark means the series changed.
+    """
+    with tracer.start_as_current_span("db.fetch_changed_categories") as span:
+        span.set_attribute("db.system", "clickhouse")
+        span.set_attribute("db.operation", "SELECT")
+        span.set_attribute("bucket_type", bucket_type)
+        
+        ch_client = get_clickhouse_client()
+        
+        sql = """
+            SELECT
+                merchant_id,
+                category_id,
+                toUnixTimestamp64Milli(max(updated_at)) AS updated_at_ms
+            FROM category_sales_agg
+            WHERE bucket_type = %(bucket_type)s
+              AND updated_at > fromUnixTimestamp64Milli(%(since_ms)s)
+            GROUP BY merchant_id, category_id
+        """
+        
+        columns = ch_client.query_columns(sql, {"bucket_type": bucket_type, "since_ms": since_ms})
+        span.set_attribute("changed_series", len(columns["merchant_id"]) if columns else 0)
+    
+    if not columns:
+        return {}, None
+    
+    changed: Dict[int, Set[int]] = {}
+    for merchant_id, category_id in zip(columns["merchant_id"].tolist(), columns["category_id"].tolist()):
+        changed.setdefault(merchant_id, set()).add(category_id)
+    return changed, int(columns["updated_at_ms"].max())
+
+
+def forecast_columns(merchant_id: int, all_models_results: Dict, generated_at: datetime, first_id: int) -> Dict[str, list]:
+    """
+    Column-oriented category_sales_forecast rows for one merchant's run_all_models results:
+    one row per (category, model) with a forecast, its points in the forecast_dates / forecast_values arrays.
+    Rows get consecutive ids from `first_id`.
+    """
+    category_ids, model_names, horizons, dates, values, maes = [], [], [], [], [], []
+    for category_id, results in all_models_results.items():
+        for model_name, forecast in results['models'].items():
+            if forecast.forecast:
+                category_ids.append(category_id)
+                model_names.append(model_name)
+                horizons.append(len(forecast.forecast))
+                dates.extend(point.bucket_start for point in forecast.forecast)
+                values.append([point.value for point in forecast.forecast])
+                maes.append(forecast.mae)
+
+    # One conversion of all points to epoch milliseconds, then split back per row
+    dates_ms = np.array(dates, dtype="datetime64[ms]").astype(np.int64)
+    offsets = np.cumsum(horizons)[:-1]
+    rows = len(category_ids)
+    return {
+        'id': list(range(first_id, first_id + rows)),
+        'merchant_id': [merchant_id] * rows,
+        'category_id': category_ids,
+        'model_name': model_names,
+        'generated_at': [generated_at] * rows,
+        'forecast_horizon': horizons,
+        'forecast_dates': [row.tolist() for row in np.split(dates_ms, offsets)] if rows else [],
+        'forecast_values': values,
+        'mae': maes,
+    }
 
 
 def save_forecast_results(
@@ -137,93 +389,196 @@ def save_forecast_results(
         
         ch_client = get_clickhouse_client()
         
-        # Prepare batch data for insert
-        data = []
-        columns = ['id', 'merchant_id', 'category_id', 'model_name', 
-                   'generated_at', 'forecast_horizon', 'forecasted_values', 'mae']
-        
         row_id = int(datetime.now().timestamp() * 1000000)  # Simple ID generation
+        columns = forecast_columns(merchant_id, all_models_results, generated_at, row_id)
+        rows = len(columns['id'])
         
-        for category_id, results in all_models_results.items():
-            for model_name, forecast in results['models'].items():
-                if forecast.forecast is not None:
-                    # Convert forecast points to JSON string
-                    forecast_values = json.dumps([
-                        {'bucket_start': p.bucket_start.isoformat(), 'value': p.value}
-                        for p in forecast.forecast
-                    ])
-                    
-                    data.append([
-                        row_id,
-                        merchant_id,
-                        category_id,
-                        model_name,
-                        generated_at,
-                        forecast_horizon,
-                        forecast_values,
-                        forecast.mae
-                    ])
-                    row_id += 1
-        
-        if data:
-            ch_client.insert('category_sales_forecast', data, columns)
+        if rows:
+            ch_client.insert_columns('category_sales_forecast', columns)
         
-        logger.info(f"Saved {len(data)} forecasts for merchant {merchant_id} to ClickHouse")
+        logger.info(f"Saved {rows} forecasts for merchant {merchant_id} to ClickHouse")
+
+
+def save_model_selection(
+    merchant_id: int,
+    bucket_type: str,
+    selections: Dict[int, Tuple[str, float, int]],
+    selected_at: datetime,
+) -> int:
+    """
+    Stores the model=auto selection, {category_id: (model_name, holdout_ape, data_points)}.
+    Data source: ClickHouse (category_model_selection, ReplacingMergeTree keeps the newest per series)
+    """
+    with tracer.start_as_current_span("db.save_model_selection") as span:
+        span.set_attribute("db.system", "clickhouse")
+        span.set_attribute("db.operation", "INSERT")
+        span.set_attribute("merchant_id", merchant_id)
+        span.set_attribute("row_count", len(selections))
+
+        columns = model_selection_columns(merchant_id, bucket_type, selections, selected_at)
+        if selections:
+            get_clickhouse_client().insert_columns('category_model_selection', columns)
+        return len(selections)
+
+
+def model_selection_columns(
+    merchant_id: int,
+    bucket_type: str,
+    selections: Dict[int, Tuple[str, float, int]],
+    selected_at: datetime,
+) -> Dict[str, list]:
+    """Column-oriented category_model_selection rows for one merchant's selection."""
+    rows = len(selections)
+    values = list(selections.values())
+    return {
+        'merchant_id': [merchant_id] * rows,
+        'category_id': list(selections),
+        'bucket_type': [bucket_type] * rows,
+        'model_name': [model_name for model_name, _, _ in values],
+        'holdout_ape': [holdout_ape for _, holdout_ape, _ in values],
+        'data_points': [data_points for _, _, data_points in values],
+        'selected_at': [selected_at] * rows,
+    }
+
+
+def fetch_model_selection(merchant_id: int, bucket_type: str) -> Dict[int, Tuple[str, float, int]]:
+    """
+    Latest stored model=auto selection per category of a merchant,
+    {category_id: (model_name, holdout_ape, data_points)}.
+    Data source: ClickHouse (category_model_selection)
+    """
+    with tracer.start_as_current_span("db.fetch_model_selection") as span:
+        span.set_attribute("db.system", "clickhouse")
+        span.set_attribute("db.operation", "SELECT")
+        span.set_attribute("merchant_id", merchant_id)
+        span.set_attribute("bucket_type", bucket_type)
+
+        columns = get_clickhouse_client().query_columns(
+            """
+            SELECT category_id,
+                   argMax(model_name, selected_at) AS model_name,
+                   argMax(holdout_ape, selected_at) AS holdout_ape,
+                   argMax(data_points, selected_at) AS data_points
+            FROM category_model_selection
+            WHERE merchant_id = %(merchant_id)s AND bucket_type = %(bucket_type)s
+            GROUP BY category_id
+            """,
+            {"merchant_id": merchant_id, "bucket_type": bucket_type},
+        )
+        if not columns:
+            return {}
+        span.set_attribute("row_count", len(columns["category_id"]))
+        return {
+            category_id: (model_name, float(holdout_ape), int(data_points))
+            for category_id, model_name, holdout_ape, data_points in zip(
+                columns["category_id"].tolist(),
+                columns["model_name"].tolist(),
+                columns["holdout_ape"].tolist(),
+                columns["data_points"].tolist(),
+            )
+        }
 
 
 def fetch_latest_forecasts(merchant_id: int, limit: int) -> List[Dict]:
     """
     Fetches the most recently generated forecast for a given merchant.
     
-    Data source: ClickHouse (category_sales_forecast)
+    Data source: ClickHouse (category_sales_forecast_latest)
+    """
+    return fetch_latest_forecasts_bulk([merchant_id]).get(merchant_id, [])
+
+
+def fetch_latest_forecasts_bulk(merchant_ids: Iterable[int]) -> Dict[int, List[Dict]]:
+    """
+    Fetches the most recently generated forecasts of several merchants in one query,
+    {merchant_id: [forecast row]}; merchants without forecasts are left out.
+    
+    Data source: ClickHouse (category_sales_forecast_latest)
+    
+    The latest table holds one row per (merchant, category, model), so the read touches
+    the merchants' current forecasts only, however long the history table grows.
+    argMax picks the newest row of a key until the ReplacingMergeTree has merged; keys
+    whose newest row is older than their merchant's latest run (a model that produced no
+    forecast in it) are left out, as with the latest run of the history table.
     """
+    merchant_ids = tuple(sorted(merchant_ids))
+    if not merchant_ids:
+        return {}
     ch_client = get_clickhouse_client()
     
-    # ClickHouse query to get latest forecasts
+    # ClickHouse query to get latest forecasts, one row per forecast point
+    # (ARRAY JOIN keeps the points as plain DateTime64 / Float64 columns)
     sql = """
-        WITH latest_forecast AS (
-            SELECT max(generated_at) AS max_generated_at
-            FROM category_sales_forecast
-            WHERE merchant_id = %(merchant_id)s
-        )
         SELECT
-            f.category_id,
-            f.model_name,
-            f.generated_at,
-            f.forecasted_values,
-            f.mae
-        FROM category_sales_forecast f, latest_forecast lf
-        WHERE f.merchant_id = %(merchant_id)s
-          AND f.generated_at = lf.max_generated_at
-        ORDER BY f.category_id, f.model_name
-    """
-    
-    rows = ch_client.query(sql, {"merchant_id": merchant_id})
-    
-    if not rows:
-        return []
-    
-    # Get category IDs for name lookup from PostgreSQL
-    category_ids = list(set(row['category_id'] for row in rows))
-    category_names = _get_category_names_from_postgres(category_ids)
-    
-    # Build result list
-    results = []
-    for row in rows:
-        # Parse JSON forecasted values
-        forecasted_values_str = row['forecasted_values']
-        try:
-            forecasted_values = json.loads(forecasted_values_str) if forecasted_values_str else []
-        except json.JSONDecodeError:
-            forecasted_values = []
-        
-        results.append({
-            'category_id': row['category_id'],
-            'category_name': category_names.get(row['category_id'], str(row['category_id'])),
-            'model_name': row['model_name'],
-            'generated_at': row['generated_at'],
-            'forecasted_values': forecasted_values,
-            'mae': row['mae']
+            merchant_id,
+            category_id,
+            model_name,
+            latest_generated_at AS generated_at,
+            forecast_date,
+            forecast_value,
+            latest_mae AS mae
+        FROM (
+            SELECT
+                merchant_id,
+                category_id,
+                model_name,
+                max(generated_at) AS latest_generated_at,
+                argMax(forecast_dates, generated_at) AS latest_dates,
+                argMax(forecast_values, generated_at) AS latest_values,
+                argMax(mae, generated_at) AS latest_mae
+            FROM category_sales_forecast_latest
+            WHERE merchant_id IN %(merchant_ids)s
+            GROUP BY merchant_id, category_id, model_name
+        )
+        ARRAY JOIN latest_dates AS forecast_date, latest_values AS forecast_value
+        WHERE (merchant_id, latest_generated_at) IN (
+            SELECT merchant_id, max(generated_at) FROM category_sales_forecast_latest
+            WHERE merchant_id IN %(merchant_ids)s
+            GROUP BY merchant_id
+        )
+        ORDER BY merchant_id, category_id, model_name, forecast_date
+    """
+    
+    columns = ch_client.query_columns(sql, {"merchant_ids": merchant_ids})
+    
+    if not columns:
+        return {}
+    
+    # Split the point rows back into one entry per (merchant, category, model); points are ordered by date
+    row_merchant_ids = columns['merchant_id']
+    category_ids = columns['category_id']
+    model_names = columns['model_name'].astype(object)
+    changes = np.flatnonzero(
+        (row_merchant_ids[1:] != row_merchant_ids[:-1])
+        | (category_ids[1:] != category_ids[:-1])
+        | (model_names[1:] != model_names[:-1])
+    ) + 1
+    starts = np.concatenate(([0], changes))
+    ends = np.concatenate((changes, [len(category_ids)]))
+    
+    forecast_dates = columns['forecast_date'].astype("datetime64[ms]").tolist()
+    forecast_values = columns['forecast_value'].astype(np.float64).tolist()
+    
+    # Category names from the in-process catalog
+    category_names = get_category_catalog().get_names(set(category_ids[starts].tolist()))
+    
+    generated_at = columns['generated_at'][starts].astype("datetime64[ms]").tolist()
+    mae = [None if pd.isna(value) else float(value) for value in columns['mae'][starts].tolist()]
+    
+    # Build result lists
+    results: Dict[int, List[Dict]] = {}
+    for merchant_id, category_id, model_name, generated, mae_value, start, end in zip(
+        row_merchant_ids[starts].tolist(), category_ids[starts].tolist(), model_names[starts].tolist(),
+        generated_at, mae, starts.tolist(), ends.tolist()
+    ):
+        results.setdefault(merchant_id, []).append({
+            'category_id': category_id,
+            'category_name': category_names.get(category_id, str(category_id)),
+            'model_name': model_name,
+            'generated_at': generated,
+            'forecast_dates': forecast_dates[start:end],
+            'forecast_values': forecast_values[start:end],
+            'mae': mae_value
         })
     
     return results
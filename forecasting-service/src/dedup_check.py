@@ -0,0 +1,144 @@
+"""
+Correctness check and benchmark of the category_sales_agg read paths (FINAL vs argMax).
+
+Builds a synthetic ReplacingMergeTree with the category_sales_agg schema, where every
+key has several versions spread over separate parts (merges stopped), then:
+1. compares the full deduplicated result of both read modes row by row;
+2. times a per-merchant read (API / per-merchant worker path) and a full ordered scan
+   (bulk worker fetch) in each mode.
+
+Run from forecasting-service/ against a ClickHouse you can write to:
+    python -m src.dedup_check --merchants 5000 --categories 20 --days 365 --versions 3
+Use --table category_sales_agg to only run the correctness check on live data.
+"""
+
+import argparse
+import itertools
+import random
+import statistics
+import time
+from typing import Callable, Dict
+
+from .clickhouse_client import get_clickhouse_client
+from .db import agg_series_sql
+
+BENCH_TABLE = "category_sales_agg_dedup_bench"
+MODES = ("final", "argmax")
+
+
+def build_bench_table(ch_client, merchants: int, categories: int, days: int, versions: int):
+    """(Re)create the synthetic table; each INSERT is one version of every key, in its own parts."""
+    ch_client.command(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    ch_client.command(f"CREATE TABLE {BENCH_TABLE} AS category_sales_agg")
+    ch_client.command(f"SYSTEM STOP MERGES {BENCH_TABLE}")
+    keys = merchants * categories * days
+    for version in range(versions):
+        # (number + version) % versions permutes the updated_at offsets of a key across inserts,
+        # so the newest version is not always the last one inserted
+        ch_client.command(f"""
+            INSERT INTO {BENCH_TABLE}
+                (merchant_id, category_id, bucket_type, bucket_start, bucket_end,
+                 total_sales_amount, total_units_sold, order_count, updated_at)
+            SELECT
+                intDiv(number, {categories * days}) + 1 AS merchant_id,
+                merchant_id * 1000 + intDiv(number % {categories * days}, {days}) AS category_id,
+                'DAY' AS bucket_type,
+                toDateTime64('2023-01-01 00:00:00', 3, 'UTC') + toIntervalDay(number % {days}) AS bucket_start,
+                bucket_start + toIntervalDay(1) AS bucket_end,
+                toDecimal64((cityHash64(number, {version}) % 1000000) / 100, 2) AS total_sales_amount,
+                cityHash64(number, {version}) % 100 AS total_units_sold,
+                cityHash64(number, {version}) % 20 AS order_count,
+                toDateTime64('2024-01-01 00:00:00', 3, 'UTC') + toIntervalSecond((number + {version}) % {versions}) AS updated_at
+            FROM numbers({keys})
+        """)
+
+
+def check_equal(ch_client, table: str) -> bool:
+    """
+    Compare the complete deduplicated contents returned by both modes.
+    Done inside ClickHouse (row counts plus EXCEPT in both directions), so it scales to large tables.
+    """
+    sql = {
+        mode: agg_series_sql(
+            where="1 = 1",
+            order_by="merchant_id, category_id, bucket_type, bucket_start",
+            key_columns="merchant_id, category_id, bucket_type",
+            table=table,
+            mode=mode,
+        )
+        for mode in MODES
+    }
+    rows = {mode: ch_client.command(f"SELECT count() FROM ({sql[mode]})") for mode in MODES}
+    only_final = ch_client.command(f"SELECT count() FROM (({sql['final']}) EXCEPT ({sql['argmax']}))")
+    only_argmax = ch_client.command(f"SELECT count() FROM (({sql['argmax']}) EXCEPT ({sql['final']}))")
+    print(f"Rows: FINAL={rows['final']} argMax={rows['argmax']}; only in FINAL={only_final}, only in argMax={only_argmax}")
+    if rows["final"] != rows["argmax"] or only_final or only_argmax:
+        print("MISMATCH: the read modes return different series")
+        return False
+    print("OK: both read modes return identical series")
+    return True
+
+
+def _time(fn: Callable[[], object], repeats: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return {"median": statistics.median(timings), "min": min(timings)}
+
+
+def benchmark(ch_client, table: str, merchants: int, repeats: int):
+    merchant_ids = itertools.cycle(random.Random(0).sample(range(1, merchants + 1), min(repeats, merchants)))
+    print(f"{'query':<24}{'mode':<8}{'median s':>10}{'min s':>10}")
+    for mode in MODES:
+        per_merchant_sql = agg_series_sql(
+            where="merchant_id = %(merchant_id)s AND bucket_type = 'DAY'",
+            order_by="category_id, bucket_start",
+            table=table,
+            mode=mode,
+        )
+        stats = _time(lambda: ch_client.query_columns(per_merchant_sql, {"merchant_id": next(merchant_ids)}), repeats)
+        print(f"{'per-merchant read':<24}{mode:<8}{stats['median']:>10.4f}{stats['min']:>10.4f}")
+
+        scan_sql = agg_series_sql(
+            where="bucket_type = 'DAY'",
+            order_by="merchant_id, category_id, bucket_start",
+            key_columns="merchant_id, category_id",
+            table=table,
+            mode=mode,
+        )
+        stats = _time(lambda: sum(len(block["merchant_id"]) for block in ch_client.stream_columns(scan_sql)), repeats)
+        print(f"{'full ordered scan':<24}{mode:<8}{stats['median']:>10.4f}{stats['min']:>10.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", help="Check an existing table instead of building the synthetic one")
+    parser.add_argument("--merchants", type=int, default=1000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--versions", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic table afterwards")
+    args = parser.parse_args()
+
+    ch_client = get_clickhouse_client()
+    if args.table:
+        raise SystemExit(0 if check_equal(ch_client, args.table) else 1)
+
+    started = time.perf_counter()
+    build_bench_table(ch_client, args.merchants, args.categories, args.days, args.versions)
+    rows = args.merchants * args.categories * args.days
+    print(f"Built {BENCH_TABLE}: {rows} keys x {args.versions} versions in {time.perf_counter() - started:.1f}s")
+    try:
+        ok = check_equal(ch_client, BENCH_TABLE)
+        benchmark(ch_client, BENCH_TABLE, args.merchants, args.repeats)
+    finally:
+        if not args.keep:
+            ch_client.command(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
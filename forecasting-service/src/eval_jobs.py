@@ -0,0 +1,326 @@
+"""
+Background walk-forward evaluations (the job form of /evaluate-models).
+
+A submitted job fetches the merchant's series, splits its categories into
+shards and evaluates them on a process pool shared by all jobs, so long
+backtests do not hold an API thread or the client connection, and jobs of
+different merchants run side by side. Progress and metrics over the shards
+finished so far can be polled. Finished jobs are kept, and an identical job
+(same merchant, bucket type, test points and unchanged aggregates) is answered
+with the stored one instead of being evaluated again.
+"""
+
+import contextvars
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from opentelemetry import trace
+
+from .config import (
+    EVAL_JOB_PROCESSES,
+    EVAL_JOB_SHARD_CATEGORIES,
+    EVAL_JOB_CONCURRENCY,
+    EVAL_JOB_MAX_PENDING,
+    EVAL_JOB_MAX_STORED,
+    EVAL_JOB_MAX_AGE_SECONDS,
+)
+from .db import fetch_category_time_series, get_agg_freshness
+from .evaluate_models import compute_metrics, data_sufficiency, walk_forward_forecasts
+from .timeseries import TimeSeries
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# {model_name: {"actuals": [...], "forecasts": [...]}}
+WalkForwardResults = Dict[str, Dict[str, List[float]]]
+
+_service = None
+
+
+def _get_service():
+    """Forecasting service of the current (pool) process, created on first use."""
+    global _service
+    if _service is None:
+        from .service import ForecastingService
+        _service = ForecastingService()
+    return _service
+
+
+def _evaluate_shard(category_series: Dict[int, TimeSeries], bucket_type: str, test_points: int) -> WalkForwardResults:
+    """Runs in a pool process: walk-forward forecasts of one shard of categories."""
+    results = walk_forward_forecasts(_get_service(), category_series, bucket_type, test_points)
+    return {name: dict(data) for name, data in results.items()}
+
+
+def plan_shards(all_series: Dict[int, TimeSeries], shard_categories: int) -> List[Dict[int, TimeSeries]]:
+    """Split categories into shards of `shard_categories`, longest series first."""
+    ordered = sorted(all_series.items(), key=lambda item: len(item[1]), reverse=True)
+    size = max(shard_categories, 1)
+    return [dict(ordered[i:i + size]) for i in range(0, len(ordered), size)]
+
+
+@dataclass
+class EvaluationJob:
+    job_id: str
+    merchant_id: int
+    bucket_type: str
+    test_points: int
+    # get_agg_freshness() at submission; None = unknown, never reused
+    token: Optional[int]
+    status: str = QUEUED
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    categories_total: Optional[int] = None
+    categories_done: int = 0
+    error: Optional[str] = None
+    sufficiency: Optional[Dict] = None
+    # Walk-forward actuals/forecasts of the shards finished so far
+    results: WalkForwardResults = field(default_factory=dict)
+    metrics: Optional[Dict] = None
+
+    @property
+    def key(self) -> Tuple[int, str, int]:
+        return self.merchant_id, self.bucket_type, self.test_points
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (COMPLETED, FAILED)
+
+    def merge(self, shard_results: WalkForwardResults, categories: int):
+        for name, data in shard_results.items():
+            merged = self.results.setdefault(name, {"actuals": [], "forecasts": []})
+            merged["actuals"].extend(data["actuals"])
+            merged["forecasts"].extend(data["forecasts"])
+        self.categories_done += categories
+
+    def snapshot(self) -> Dict:
+        """Poll response: status, progress and the (partial, while running) metrics."""
+        metrics = self.metrics
+        if metrics is None and self.results:
+            metrics = compute_metrics(self.results)
+            if self.sufficiency is not None:
+                metrics["_data_sufficiency"] = self.sufficiency
+        return {
+            "job_id": self.job_id,
+            "merchant_id": self.merchant_id,
+            "bucket_type": self.bucket_type,
+            "test_points": self.test_points,
+            "status": self.status,
+            "progress": {
+                "categories_done": self.categories_done,
+                "categories_total": self.categories_total,
+            },
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "metrics": metrics,
+        }
+
+
+class EvaluationJobManager:
+    """
+    Queue, runner and store of evaluation jobs.
+    Jobs are coordinated on a small thread pool; the model fits run on a process pool
+    created lazily (spawned, since the API process is multi-threaded).
+    """
+
+    _instance = None
+
+    def __init__(
+        self,
+        processes: int = EVAL_JOB_PROCESSES,
+        shard_categories: int = EVAL_JOB_SHARD_CATEGORIES,
+        concurrency: int = EVAL_JOB_CONCURRENCY,
+        max_pending: int = EVAL_JOB_MAX_PENDING,
+        max_stored: int = EVAL_JOB_MAX_STORED,
+        max_age_seconds: float = EVAL_JOB_MAX_AGE_SECONDS,
+    ):
+        self.processes = processes if processes > 0 else (os.cpu_count() or 1)
+        self.shard_categories = shard_categories
+        self.max_pending = max_pending  # 0 = unbounded queue
+        self.max_stored = max_stored
+        self.max_age_seconds = max_age_seconds
+        self._runner = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="eval-job")
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, EvaluationJob]" = OrderedDict()
+        # (merchant_id, bucket_type, test_points) -> latest job id
+        self._latest: Dict[Tuple[int, str, int], str] = {}
+        self.reused = 0
+        self.rejected = 0
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._closed:
+                raise RuntimeError("Evaluation jobs are shut down")
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"Started evaluation pool with {self.processes} processes")
+            return self._pool
+
+    def submit(self, merchant_id: int, bucket_type: str, test_points: int) -> Tuple[EvaluationJob, bool]:
+        """
+        Create a job, or return the identical queued/running/completed one.
+        Returns (job, reused). Blocking: reads the aggregates' freshness token.
+        """
+        try:
+            token = get_agg_freshness(merchant_id, bucket_type)
+        except Exception as e:
+            logger.warning(f"Freshness probe failed, evaluation job will not be reused: {e}")
+            token = None
+
+        with self._lock:
+            self._evict()
+            previous = self._jobs.get(self._latest.get((merchant_id, bucket_type, test_points), ""))
+            if previous is not None and token is not None and previous.token == token and previous.status != FAILED:
+                self.reused += 1
+                return previous, True
+
+            pending = sum(1 for job in self._jobs.values() if not job.finished)
+            if self.max_pending and pending >= self.max_pending:
+                self.rejected += 1
+                logger.warning(f"Evaluation job queue is full ({pending} pending), rejecting job")
+                raise HTTPException(status_code=503, detail="Too many evaluation jobs, retry later")
+
+            job = EvaluationJob(uuid.uuid4().hex, merchant_id, bucket_type, test_points, token)
+            self._jobs[job.job_id] = job
+            self._latest[job.key] = job.job_id
+
+        # Copy the context so the job's span is linked to the submitting request
+        context = contextvars.copy_context()
+        self._runner.submit(context.run, self._run, job)
+        logger.info(f"Queued evaluation job {job.job_id} for merchant {merchant_id} ({bucket_type}, {test_points} test points)")
+        return job, False
+
+    def get(self, job_id: str) -> Optional[EvaluationJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def snapshot(self, job: EvaluationJob) -> Dict:
+        with self._lock:
+            return job.snapshot()
+
+    def _evict(self):
+        """Drop expired finished jobs, then the oldest finished ones beyond max_stored. Lock held."""
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.finished]
+        expired = [job for job in finished if now - job.finished_at > self.max_age_seconds]
+        remaining = [job for job in finished if now - job.finished_at <= self.max_age_seconds]
+        excess = max(len(self._jobs) - len(expired) - self.max_stored, 0)
+        for job in expired + remaining[:excess]:
+            del self._jobs[job.job_id]
+            if self._latest.get(job.key) == job.job_id:
+                del self._latest[job.key]
+
+    def _run(self, job: EvaluationJob):
+        with tracer.start_as_current_span("task evaluate-models-job") as span:
+            span.set_attribute("job.id", job.job_id)
+            span.set_attribute("merchant_id", job.merchant_id)
+            with self._lock:
+                job.status = RUNNING
+                job.started_at = time.time()
+            try:
+                all_series, category_names = fetch_category_time_series(job.merchant_id, job.bucket_type)
+                shards = plan_shards(all_series, self.shard_categories)
+                span.set_attribute("job.shards", len(shards))
+                with self._lock:
+                    job.categories_total = len(all_series)
+                    job.sufficiency = data_sufficiency(all_series, category_names)
+
+                for shard, shard_results in self._evaluate(shards, job.bucket_type, job.test_points):
+                    with self._lock:
+                        job.merge(shard_results, len(shard))
+
+                with self._lock:
+                    job.metrics = compute_metrics(job.results)
+                    job.metrics["_data_sufficiency"] = job.sufficiency
+                    job.status = COMPLETED
+                    job.finished_at = time.time()
+                logger.info(f"Evaluation job {job.job_id} completed in {job.finished_at - job.started_at:.2f}s")
+            except Exception as e:
+                logger.error(f"Evaluation job {job.job_id} failed: {e}")
+                with self._lock:
+                    job.status = FAILED
+                    job.error = str(e)
+                    job.finished_at = time.time()
+
+    def _evaluate(self, shards: List[Dict[int, TimeSeries]], bucket_type: str, test_points: int):
+        """Yield (shard, results) as shards finish."""
+        if self.processes == 1:
+            for shard in shards:
+                yield shard, _evaluate_shard(shard, bucket_type, test_points)
+            return
+
+        pool = self._get_pool()
+        futures: Dict[Future, Dict[int, TimeSeries]] = {
+            pool.submit(_evaluate_shard, shard, bucket_type, test_points): shard for shard in shards
+        }
+        pending = set(futures)
+        try:
+            while pending:
+                # Wake up periodically: shards already running are not finished by a shutdown
+                done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield futures[future], future.result()
+                if self._closed:
+                    raise RuntimeError("Evaluation jobs are shut down")
+        except BrokenProcessPool:
+            # A child died (e.g. OOM); the next job starts a fresh pool
+            with self._pool_lock:
+                if self._pool is pool:
+                    self._pool = None
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            by_status = {status: 0 for status in (QUEUED, RUNNING, COMPLETED, FAILED)}
+            for job in self._jobs.values():
+                by_status[job.status] += 1
+        return {
+            "processes": self.processes,
+            "jobs": by_status,
+            "reused": self.reused,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._runner.shutdown(wait=False, cancel_futures=True)
+        with self._pool_lock:
+            self._closed = True
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+def get_evaluation_jobs() -> EvaluationJobManager:
+    return EvaluationJobManager.get_instance()
@@ -1,77 +1,94 @@
 
+import logging
 import pandas as pd
 from collections import defaultdict
-from typing import Dict, List
+from typing import Dict, List, Optional
 import numpy as np
 
-from .service import ForecastingService, TimeSeriesPoint
+from .batch import BatchForecastEngine
+from .service import ForecastingService, seasonal_period
+from .config import EVAL_REFIT_EVERY
 from .db import fetch_category_time_series
+from .timeseries import TimeSeries
 
+logger = logging.getLogger(__name__)
 
-def evaluate_models(merchant_id: int, bucket_type: str, test_points: int = 5) -> Dict:
-    """
-    Evaluates all forecasting models using a walk-forward validation approach.
 
-    Args:
-        merchant_id: The merchant ID to evaluate.
-        bucket_type: The aggregation bucket type (DAY, WEEK, MONTH).
-        test_points: The number of recent data points to use for testing.
-
-    Returns:
-        A dictionary containing the evaluation metrics for each model,
-        plus data sufficiency metadata.
+def walk_forward_forecasts(
+    forecasting_service: ForecastingService,
+    all_series: Dict[int, TimeSeries],
+    bucket_type: str,
+    test_points: int,
+    lookback: int = 4,
+    refit_every: int = EVAL_REFIT_EVERY,
+) -> Dict[str, Dict[str, List[float]]]:
     """
-    print(f"Evaluating models for merchant {merchant_id}, bucket {bucket_type}...")
-
-    all_series, category_names = fetch_category_time_series(merchant_id, bucket_type)
-    forecasting_service = ForecastingService()
-    model_names = forecasting_service._models.keys()
-
-    # Track data sufficiency per category
-    data_points_per_category = {}
-    for category_id, series in all_series.items():
-        data_points_per_category[category_id] = {
-            "category_name": category_names.get(category_id, f"Category {category_id}"),
-            "data_points": len(series)
-        }
-
-    # Minimum data requirements per model
-    model_requirements = {
-        "rolling": 4,
-        "wma": 4,
-        "ses": 4,
-        "snaive": 52,  # Needs 1 year of data
-        "arima": 10
-    }
-
-    results = defaultdict(lambda: defaultdict(list))
-    for category_id, series in all_series.items():
-        if len(series) < test_points + 1:
+    One-step forecasts of the last `test_points` points of every series, each made
+    from the data before it. Returns {model_name: {"actuals": [...], "forecasts": [...]}},
+    ordered by category, then origin (most recent first).
+
+    Closed-form models run for all categories and origins on one batch engine.
+    Models with `forecast_origins` (SES, ARIMA) are fitted once per category and
+    rolled forward through the origins, re-estimating every `refit_every` origins;
+    any other model is refitted per origin.
+    """
+    evaluated = {cid: series for cid, series in all_series.items() if len(series) >= test_points + 1}
+    origins = range(1, test_points + 1)
+    # model_name -> category_id -> origin -> forecast
+    by_model: Dict[str, Dict[int, Dict[int, Optional[float]]]] = {name: {} for name in forecasting_service._models}
+
+    batch_names = forecasting_service._batch_models
+    if evaluated and batch_names:
+        engine = BatchForecastEngine(evaluated, max(lookback, seasonal_period(bucket_type)) + test_points)
+        for name in batch_names:
+            model = forecasting_service._models[name]
+            for origin in origins:
+                for category_id, (value, _) in model.forecast_batch(engine, lookback, bucket_type, origin).items():
+                    by_model[name].setdefault(category_id, {})[origin] = value
+
+    for name, model in forecasting_service._models.items():
+        if name in batch_names:
             continue
-
-        for i in range(1, test_points + 1):
-            train_series = series[:-i]
-            actual_value = series[-i].value
-            if not train_series:
-                continue
-
-            for model_name in model_names:
-                model = forecasting_service._models[model_name]
-                try:
-                    lookback = 4
-                    forecast_value, _ = model.forecast(
-                        series=train_series,
-                        lookback=lookback,
-                        bucket_type=bucket_type,
-                        category_id=category_id,
-                        category_name=category_names[category_id],
+        for category_id, series in evaluated.items():
+            try:
+                if hasattr(model, "forecast_origins"):
+                    by_model[name][category_id] = model.forecast_origins(
+                        series, test_points, bucket_type, category_id, refit_every
                     )
-                    if forecast_value is not None:
-                        results[model_name]["actuals"].append(actual_value)
-                        results[model_name]["forecasts"].append(forecast_value)
-                except Exception as e:
-                    print(f"Error forecasting with {model_name}: {e}")
+                else:
+                    by_model[name][category_id] = {
+                        origin: model.forecast(series[:-origin], lookback, bucket_type, category_id, str(category_id))[0]
+                        for origin in origins
+                    }
+            except Exception as e:
+                logger.error(f"Error forecasting with {name} for category {category_id}: {e}")
 
+    results = defaultdict(lambda: defaultdict(list))
+    for category_id, series in evaluated.items():
+        for origin in origins:
+            actual_value = float(series.values[-origin])
+            for name in forecasting_service._models:
+                forecast_value = by_model[name].get(category_id, {}).get(origin)
+                if forecast_value is not None:
+                    results[name]["actuals"].append(actual_value)
+                    results[name]["forecasts"].append(forecast_value)
+    return results
+
+
+# Minimum data requirements per model
+MODEL_REQUIREMENTS = {
+    "rolling": 4,
+    "wma": 4,
+    "ses": 4,
+    "snaive": 52,  # Needs 1 year of data
+    "arima": 10
+}
+
+
+def compute_metrics(results: Dict[str, Dict[str, List[float]]]) -> Dict[str, Dict]:
+    """
+    MAE/MSE/RMSE/MAPE per model from walk-forward actuals and forecasts.
+    """
     metrics = {}
     for model_name, data in results.items():
         actuals = np.array(data["actuals"])
@@ -99,27 +116,62 @@ def evaluate_models(merchant_id: int, bucket_type: str, test_points: int = 5) ->
             "mape": f"{float(mape):.2f}%",
             "forecasts_generated": int(len(forecasts)),
         }
+    return metrics
+
+
+def data_sufficiency(all_series: Dict[int, TimeSeries], category_names: Dict[int, str]) -> Dict:
+    """
+    Data sufficiency metadata of an evaluation (reported under "_data_sufficiency").
+    """
+    # Track data sufficiency per category
+    data_points_per_category = {}
+    for category_id, series in all_series.items():
+        data_points_per_category[category_id] = {
+            "category_name": category_names.get(category_id, f"Category {category_id}"),
+            "data_points": len(series)
+        }
 
-    # Add data sufficiency metadata
     min_data_points = min((d["data_points"] for d in data_points_per_category.values()), default=0)
     max_data_points = max((d["data_points"] for d in data_points_per_category.values()), default=0)
     
     # Determine which models are eligible based on data availability
     eligible_models = []
-    for model, required in model_requirements.items():
+    for model, required in MODEL_REQUIREMENTS.items():
         if min_data_points >= required:
             eligible_models.append(model)
     
-    # Add metadata to response (prefix with _ to indicate metadata)
-    metrics["_data_sufficiency"] = {
+    return {
         "min_data_points": min_data_points,
         "max_data_points": max_data_points,
         "category_count": len(data_points_per_category),
         "eligible_models": eligible_models,
-        "model_requirements": model_requirements,
+        "model_requirements": MODEL_REQUIREMENTS,
         "recommendation": "rolling" if min_data_points < 10 else ("arima" if min_data_points >= 10 else "ses")
     }
 
+
+def evaluate_models(merchant_id: int, bucket_type: str, test_points: int = 5) -> Dict:
+    """
+    Evaluates all forecasting models using a walk-forward validation approach.
+
+    Args:
+        merchant_id: The merchant ID to evaluate.
+        bucket_type: The aggregation bucket type (DAY, WEEK, MONTH).
+        test_points: The number of recent data points to use for testing.
+
+    Returns:
+        A dictionary containing the evaluation metrics for each model,
+        plus data sufficiency metadata.
+    """
+    print(f"Evaluating models for merchant {merchant_id}, bucket {bucket_type}...")
+
+    all_series, category_names = fetch_category_time_series(merchant_id, bucket_type)
+    forecasting_service = ForecastingService()
+
+    results = walk_forward_forecasts(forecasting_service, all_series, bucket_type, test_points)
+    metrics = compute_metrics(results)
+    metrics["_data_sufficiency"] = data_sufficiency(all_series, category_names)
+
     print("\nEvaluation complete.")
     return metrics
 
@@ -0,0 +1,84 @@
+"""
+Dedicated executors for the async API handlers.
+
+Blocking work is kept off the event loop and split by cost, so cheap lookups
+never queue behind model fitting:
+- io:   ClickHouse/Postgres reads of the fast paths (compare-models, probes, health)
+- fit:  on-demand model fitting (top-categories)
+- eval: walk-forward evaluations
+Each executor has its own thread limit and a bound on queued + running calls;
+beyond it requests are rejected with 503 instead of piling up.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, TypeVar
+
+from fastapi import HTTPException
+
+from .config import (
+    API_IO_THREADS,
+    API_IO_MAX_PENDING,
+    API_FIT_THREADS,
+    API_FIT_MAX_PENDING,
+    API_EVAL_THREADS,
+    API_EVAL_MAX_PENDING,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class BoundedExecutor:
+    """
+    Thread pool with a cap on outstanding calls, awaited from the event loop.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int = 0):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending  # 0 = unbounded queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"api-{name}")
+        # Only touched from the event loop thread
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        if self.max_pending and self._pending >= self.max_pending:
+            self.rejected += 1
+            logger.warning(f"Executor '{self.name}' is saturated ({self._pending} pending), rejecting request")
+            raise HTTPException(status_code=503, detail=f"Server busy ({self.name}), retry later")
+
+        self._pending += 1
+        try:
+            # Copy the context so tracing spans started in the worker thread keep their parent
+            context = contextvars.copy_context()
+            call = functools.partial(context.run, fn, *args, **kwargs)
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        finally:
+            self._pending -= 1
+            self.completed += 1
+
+    def stats(self) -> Dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+io_executor = BoundedExecutor("io", API_IO_THREADS, API_IO_MAX_PENDING)
+fit_executor = BoundedExecutor("fit", API_FIT_THREADS, API_FIT_MAX_PENDING)
+eval_executor = BoundedExecutor("eval", API_EVAL_THREADS, API_EVAL_MAX_PENDING)
+
+ALL_EXECUTORS = (io_executor, fit_executor, eval_executor)
@@ -0,0 +1,100 @@
+"""
+Content-addressed cache of per-category model outputs.
+
+The key is a hash of the series contents (bucket starts and values) plus the
+model name, lookback, bucket type and number of forecast steps, so identical
+requests over unchanged data reuse the previous fit and skip statsmodels. Entries expire after a TTL
+and the cache is bounded by an approximate memory budget (LRU eviction).
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+from .timeseries import TimeSeries
+
+# (forecast value, or the values of several steps, message)
+ForecastOutput = Tuple[Union[None, float, List[float]], Optional[str]]
+
+# Approximate bytes per entry besides the message text (key, tuple, float, OrderedDict node)
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+class FitCache:
+    """
+    Thread-safe LRU + TTL cache of (forecast_value, message) per fit key.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 300):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # key -> (output, expires_at, size)
+        self._entries: "OrderedDict[bytes, Tuple[ForecastOutput, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(model_name: str, series: TimeSeries, lookback: int, bucket_type: str, steps: int = 1) -> bytes:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{model_name}|{lookback}|{bucket_type}|{steps}|{len(series)}|".encode())
+        digest.update(series.bucket_starts.tobytes())
+        digest.update(series.values.tobytes())
+        return digest.digest()
+
+    def get(self, key: bytes) -> Optional[ForecastOutput]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            output, expires_at, size = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return output
+
+    def put(self, key: bytes, output: ForecastOutput):
+        size = _ENTRY_OVERHEAD_BYTES + len(key) + len(output[1] or "")
+        if isinstance(output[0], list):
+            size += 32 * len(output[0])
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (output, time.monotonic() + self.ttl_seconds, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
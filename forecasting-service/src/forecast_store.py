@@ -0,0 +1,143 @@
+"""
+In-memory copy of the latest stored forecasts, served by the API process.
+
+The worker replaces a merchant's forecasts once per cycle, so /forecast/compare-models
+does not need to query ClickHouse per request. The store probes the overall
+max(generated_at) of category_sales_forecast_latest in the background; only when
+it moved does it read the per-merchant values, reload the merchants whose
+generated_at changed in one bulk query, and keep each merchant's serialized
+response. A lookup is a dict read: no database access. Category names are baked
+into the responses (and removed forecasts only show up in the per-merchant read),
+so every merchant is reloaded after `full_reload_seconds` as well.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from opentelemetry import trace
+
+from . import db
+from .config import FORECAST_STORE_REFRESH_SECONDS, FORECAST_STORE_FULL_RELOAD_SECONDS
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+# Merchants reloaded per bulk query
+RELOAD_BATCH = 500
+
+
+class LatestForecastStore:
+    """
+    merchant_id -> (generated_at epoch ms, serialized compare-models response), refreshed in the background.
+    """
+
+    def __init__(
+        self,
+        build: Callable[[List[Dict]], bytes],
+        refresh_interval_seconds: float = FORECAST_STORE_REFRESH_SECONDS,
+        full_reload_seconds: float = FORECAST_STORE_FULL_RELOAD_SECONDS,
+    ):
+        # Serializes a merchant's fetch_latest_forecasts rows ([] = no forecasts) into a response body
+        self.build = build
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self._generated_at: Dict[int, int] = {}
+        self._bodies: Dict[int, bytes] = {}
+        self._empty_body: Optional[bytes] = None
+        # Overall max(generated_at) seen by the last refresh that read the per-merchant values
+        self._watermark_ms: Optional[int] = None
+        self._refresh_lock = threading.Lock()
+        self._last_full_reload = 0.0
+        self.last_refresh_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.hits = 0
+        self.empty = 0
+        self.reloads = 0
+        self.failures = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self.last_refresh_at is not None
+
+    def get(self, merchant_id: int) -> Optional[bytes]:
+        """Serialized response of the merchant's latest forecasts; None until the first refresh succeeded."""
+        body = self._bodies.get(merchant_id)
+        if body is not None:
+            self.hits += 1
+            return body
+        if not self.loaded:
+            return None
+        self.empty += 1
+        return self._empty_body
+
+    def refresh(self) -> int:
+        """
+        Reload merchants whose latest generated_at changed (all of them on the first call and
+        every `full_reload_seconds`). Returns the number of merchants reloaded; failures are
+        logged and leave the store as is.
+        """
+        with self._refresh_lock:
+            with tracer.start_as_current_span("forecast_store.refresh") as span:
+                try:
+                    reloaded = self._refresh(span)
+                except Exception as e:
+                    self.failures += 1
+                    self.last_error = str(e)
+                    logger.warning(f"Latest-forecast store refresh failed, serving the previous forecasts: {e}")
+                    return 0
+            self.last_refresh_at = time.time()
+            self.last_error = None
+            if reloaded:
+                logger.info(f"Latest-forecast store reloaded {reloaded} merchants ({len(self._bodies)} in memory)")
+            return reloaded
+
+    def _refresh(self, span) -> int:
+        full = time.monotonic() - self._last_full_reload >= self.full_reload_seconds
+        # Probed before the per-merchant read: forecasts written in between are read again next time
+        watermark_ms = db.get_forecast_watermark()
+        span.set_attribute("forecast_store.full_reload", full)
+        if not full and watermark_ms == self._watermark_ms:
+            span.set_attribute("forecast_store.changed", 0)
+            return 0
+
+        versions = {merchant_id: generated_at_ms for merchant_id, (generated_at_ms, _) in db.fetch_forecast_ages().items()}
+        changed = [
+            merchant_id for merchant_id, generated_at_ms in versions.items()
+            if full or self._generated_at.get(merchant_id) != generated_at_ms
+        ]
+        span.set_attribute("forecast_store.merchants", len(versions))
+        span.set_attribute("forecast_store.changed", len(changed))
+
+        if full or self._empty_body is None:
+            self._empty_body = self.build([])
+        for start in range(0, len(changed), RELOAD_BATCH):
+            batch = changed[start:start + RELOAD_BATCH]
+            rows = db.fetch_latest_forecasts_bulk(batch)
+            for merchant_id in batch:
+                # Rows written after the probe only cause one more reload on the next refresh
+                self._bodies[merchant_id] = self.build(rows.get(merchant_id, []))
+                self._generated_at[merchant_id] = versions[merchant_id]
+        for merchant_id in set(self._bodies) - set(versions):
+            # Forecasts expired or removed
+            self._bodies.pop(merchant_id, None)
+            self._generated_at.pop(merchant_id, None)
+        if full:
+            self._last_full_reload = time.monotonic()
+        self._watermark_ms = watermark_ms
+        self.reloads += len(changed)
+        return len(changed)
+
+    def stats(self) -> Dict:
+        return {
+            "loaded": self.loaded,
+            "merchants": len(self._bodies),
+            "bytes": sum(len(body) for body in list(self._bodies.values())),
+            "hits": self.hits,
+            "empty": self.empty,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_refresh_age_seconds": round(time.time() - self.last_refresh_at, 1) if self.last_refresh_at else None,
+            "last_error": self.last_error,
+        }
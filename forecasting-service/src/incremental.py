@@ -0,0 +1,95 @@
+"""
+Incremental forecasting state for the worker.
+
+Keeps a high-water mark on category_sales_agg.updated_at and the last model
+results per (merchant, category). Each run refits only the series that changed
+since the watermark. A merchant with changes is stored as a complete set (fresh
+results plus the carried-forward ones), so its latest generated_at batch stays
+complete; merchants without changes keep their previous batch untouched.
+State lives in the worker process: after a restart the first run is a full run.
+The kept results are bounded to the most recently forecast merchants; a merchant
+whose results were dropped is refitted in full when it changes again.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# merchant_id -> category_ids to refit (None = every category of the merchant)
+ForecastPlan = Dict[int, Optional[Set[int]]]
+
+
+class IncrementalForecastState:
+    """Watermark and last results of the worker's incremental forecast runs."""
+
+    def __init__(self, lag_seconds: int = 10, full_refresh_every_runs: int = 0, max_merchants: int = 0):
+        self.lag_ms = lag_seconds * 1000
+        self.full_refresh_every_runs = full_refresh_every_runs
+        self.max_merchants = max_merchants  # 0 = keep every merchant's results
+        self.watermark_ms: Optional[int] = None
+        self._runs_since_full = 0
+        # merchant_id -> category_id -> run_all_models() category result, least recently forecast first
+        self._results: "OrderedDict[int, Dict[int, dict]]" = OrderedDict()
+        # merge() runs on the worker's write threads
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def needs_full_run(self) -> bool:
+        if self.watermark_ms is None:
+            return True
+        return 0 < self.full_refresh_every_runs <= self._runs_since_full
+
+    def widen(self, plan: ForecastPlan) -> ForecastPlan:
+        """Refit every category of planned merchants whose previous results are not kept."""
+        with self._lock:
+            return {
+                merchant_id: category_ids if merchant_id in self._results else None
+                for merchant_id, category_ids in plan.items()
+            }
+
+    def since_ms(self) -> int:
+        """Lower bound for the next change scan (watermark minus the visibility lag)."""
+        return self.watermark_ms - self.lag_ms
+
+    def merge(self, merchant_id: int, results: Dict[int, dict], full: bool) -> Dict[int, dict]:
+        """
+        Record fresh results for a merchant and return its complete result set.
+        On a full run the fresh results replace whatever was stored.
+        """
+        with self._lock:
+            if full or merchant_id not in self._results:
+                self._results[merchant_id] = dict(results)
+            else:
+                self._results[merchant_id].update(results)
+            self._results.move_to_end(merchant_id)
+            return self._results[merchant_id]
+
+    def drop(self, merchant_ids: Set[int]):
+        """Forget merchants this worker no longer forecasts (moved to another shard)."""
+        with self._lock:
+            for merchant_id in merchant_ids:
+                self._results.pop(merchant_id, None)
+
+    def complete_run(self, watermark_ms: Optional[int], full: bool, merchant_ids: Set[int]):
+        """
+        Advance the watermark once a run has been stored. A full run also drops
+        merchants that no longer have data. Results beyond `max_merchants` are dropped
+        here, least recently forecast first, so none are dropped while their run merges.
+        """
+        with self._lock:
+            if full:
+                for merchant_id in set(self._results) - merchant_ids:
+                    del self._results[merchant_id]
+            while self.max_merchants and len(self._results) > self.max_merchants:
+                self._results.popitem(last=False)
+                self.evictions += 1
+        if full:
+            self._runs_since_full = 0
+        else:
+            self._runs_since_full += 1
+        if watermark_ms is not None:
+            self.watermark_ms = max(watermark_ms, self.watermark_ms or watermark_ms)
+        logger.info(f"Incremental watermark at {self.watermark_ms} ms ({'full' if full else 'incremental'} run)")
@@ -0,0 +1,207 @@
+"""
+Process-pool execution of per-category model fits for the forecasting worker.
+
+Closed-form models are vectorized in the parent process (see batch.py); only
+models without a batch implementation (SES, ARIMA) are fitted in the pool.
+Work is split into (merchant, category, model) tasks, so a large merchant is
+spread over every process instead of pinning a single one.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .arima_params import ArimaParamStore, ArimaState
+from .timeseries import TimeSeries
+
+logger = logging.getLogger(__name__)
+
+# Relative fit cost per data point, used to balance chunks across processes
+FIT_COST_WEIGHTS = {"arima": 8.0, "ses": 1.0}
+
+# (merchant_id, category_id, model_name, series, stored model state or None)
+FitTask = Tuple[int, int, str, TimeSeries, Optional[ArimaState]]
+# (category_id, model_name) -> (forecast values of the horizon, message)
+FittedForecasts = Dict[Tuple[int, str], Tuple[Optional[List[float]], Optional[str]]]
+# (category_id, model_name) -> the fit's forecast of the last point from the points before it (model selection)
+HoldoutForecasts = Dict[Tuple[int, str], Optional[float]]
+
+_models = None
+
+
+def _get_models():
+    """Model registry of the current (child) process, created on first use."""
+    global _models
+    if _models is None:
+        from .service import ForecastingService
+        _models = ForecastingService()._models
+    return _models
+
+
+def _fit_chunk(
+    tasks: List[FitTask], lookback: int, bucket_type: str, steps: int = 1
+) -> Tuple[List[Tuple], Dict[str, Dict]]:
+    """
+    Runs in a pool process: fit every task of the chunk, forecasting `steps` buckets per fit
+    plus the fit's holdout forecast of the last point.
+    Returns plain result tuples plus the model states (e.g. ARIMA params) updated by the fits.
+    """
+    from .service import model_forecast_steps_holdout
+
+    models = _get_models()
+    outcomes = []
+    for merchant_id, category_id, model_name, series, state in tasks:
+        model = models[model_name]
+        param_store = getattr(model, "param_store", None)
+        if state is not None and param_store is not None:
+            # Adopt the parent's current state; this process's copy may be stale
+            param_store.put((merchant_id, category_id, bucket_type), state, dirty=False)
+        try:
+            values, message, holdout = model_forecast_steps_holdout(
+                model,
+                series=series,
+                steps=steps,
+                lookback=lookback,
+                bucket_type=bucket_type,
+                category_id=category_id,
+                category_name=str(category_id),
+                merchant_id=merchant_id,
+            )
+        except Exception as e:
+            logger.error(f"Model '{model_name}' failed for merchant {merchant_id} category {category_id}: {e}")
+            values, message, holdout = None, f"{model_name} failed: {e}", None
+        outcomes.append((merchant_id, category_id, model_name, values, message, holdout))
+
+    state_updates = {}
+    for model_name, model in models.items():
+        param_store = getattr(model, "param_store", None)
+        if param_store is not None:
+            state_updates[model_name] = param_store.drain_dirty()
+    return outcomes, state_updates
+
+
+def _task_cost(task: FitTask) -> float:
+    _, _, model_name, series, _ = task
+    return FIT_COST_WEIGHTS.get(model_name, 1.0) * max(len(series), 1)
+
+
+def plan_chunks(tasks: List[FitTask], target_chunks: int) -> List[List[FitTask]]:
+    """
+    Group tasks into roughly equal-cost chunks, most expensive tasks first.
+
+    Chunks are submitted in this order, so the big ARIMA fits of large merchants
+    start immediately and the tail of the run is made of small chunks that
+    keep every process busy until the end.
+    """
+    if not tasks:
+        return []
+    costed = sorted(((_task_cost(task), task) for task in tasks), key=lambda item: item[0], reverse=True)
+    budget = sum(cost for cost, _ in costed) / max(target_chunks, 1)
+
+    chunks: List[List[FitTask]] = []
+    current: List[FitTask] = []
+    current_cost = 0.0
+    for cost, task in costed:
+        current.append(task)
+        current_cost += cost
+        if current_cost >= budget:
+            chunks.append(current)
+            current, current_cost = [], 0.0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class ParallelFitRunner:
+    """
+    Fits per-category models for many merchants on a process pool.
+    The pool is created lazily and reused across worker runs.
+    """
+
+    def __init__(
+        self,
+        model_names: List[str],
+        processes: int = 0,
+        chunks_per_process: int = 4,
+        param_stores: Optional[Dict[str, ArimaParamStore]] = None,
+    ):
+        self.model_names = list(model_names)
+        # model_name -> parent-side store; states travel with the tasks and updates come back
+        self.param_stores = {name: store for name, store in (param_stores or {}).items() if store is not None}
+        self.processes = processes if processes > 0 else (os.cpu_count() or 1)
+        self.chunks_per_process = max(chunks_per_process, 1)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # fit() may be called from several threads sharing the pool
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.processes)
+                logger.info(f"Started model fitting pool with {self.processes} processes")
+            return self._executor
+
+    def fit(
+        self,
+        merchant_series: Dict[int, Dict[int, TimeSeries]],
+        lookback: int,
+        bucket_type: str,
+        steps: int = 1,
+    ) -> Iterator[Tuple[int, FittedForecasts, HoldoutForecasts]]:
+        """
+        Yield (merchant_id, fitted, holdouts) as soon as every task of that merchant has
+        finished, so results can be stored while other merchants are still fitting.
+        Each fit forecasts the next `steps` buckets; its out-of-sample forecast of the last
+        point goes into `holdouts`, so model selection needs no second fit.
+        """
+        tasks: List[FitTask] = []
+        pending: Dict[int, int] = {}
+        fitted: Dict[int, FittedForecasts] = {}
+        holdouts: Dict[int, HoldoutForecasts] = {}
+        for merchant_id, category_series in merchant_series.items():
+            fitted[merchant_id] = {}
+            holdouts[merchant_id] = {}
+            pending[merchant_id] = len(category_series) * len(self.model_names)
+            for category_id, series in category_series.items():
+                for model_name in self.model_names:
+                    store = self.param_stores.get(model_name)
+                    state = store.get((merchant_id, category_id, bucket_type)) if store is not None else None
+                    tasks.append((merchant_id, category_id, model_name, series, state))
+
+        for merchant_id in [m for m, count in pending.items() if count == 0]:
+            del pending[merchant_id]
+            yield merchant_id, fitted.pop(merchant_id), holdouts.pop(merchant_id)
+
+        chunks = plan_chunks(tasks, self.processes * self.chunks_per_process)
+        logger.debug(f"Dispatching {len(tasks)} fit tasks for {len(pending)} merchants in {len(chunks)} chunks")
+
+        executor = self._get_executor()
+        futures = [executor.submit(_fit_chunk, chunk, lookback, bucket_type, steps) for chunk in chunks]
+        try:
+            for future in as_completed(futures):
+                outcomes, state_updates = future.result()
+                for model_name, states in state_updates.items():
+                    if model_name in self.param_stores:
+                        self.param_stores[model_name].merge(states)
+                for merchant_id, category_id, model_name, values, message, holdout in outcomes:
+                    fitted[merchant_id][(category_id, model_name)] = (values, message)
+                    holdouts[merchant_id][(category_id, model_name)] = holdout
+                    pending[merchant_id] -= 1
+                    if pending[merchant_id] == 0:
+                        del pending[merchant_id]
+                        yield merchant_id, fitted.pop(merchant_id), holdouts.pop(merchant_id)
+        except BrokenProcessPool:
+            # A child died (e.g. OOM); start a fresh pool on the next run
+            self._executor = None
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
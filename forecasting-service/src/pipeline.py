@@ -0,0 +1,226 @@
+"""
+Bounded-queue stage pipeline for the forecasting worker.
+
+A source feeds the first stage; every stage runs its function on its own
+threads and hands its results to the next stage through a bounded queue. A full
+queue blocks the stage in front of it (backpressure), so a slow stage throttles
+the ones before it instead of letting fetched series pile up in memory, while
+the fetch, fit and write of different merchants overlap.
+"""
+
+import contextvars
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# End-of-input marker passed down the queues
+_DONE = object()
+# Seconds between checks of the stop flag while blocked on a queue
+POLL_SECONDS = 0.1
+
+
+@dataclass
+class Stage:
+    """
+    One step of a pipeline. `fn` maps an item to the next stage's item, or to None to drop it;
+    with `expand`, it returns an iterable of items instead (e.g. a streamed fetch).
+    With `batch_size` > 1, `fn` gets a list of up to that many items: the next one and
+    whichever are already queued behind it (it does not wait for more).
+    """
+    name: str
+    fn: Callable[[Any], Any]
+    workers: int = 1
+    # Items waiting for this stage before the previous one blocks
+    queue_size: int = 4
+    expand: bool = False
+    batch_size: int = 1
+
+
+@dataclass
+class StageStats:
+    processed: int = 0
+    emitted: int = 0
+    busy_seconds: float = 0.0
+    # Time spent waiting for room in the next stage's queue
+    blocked_seconds: float = 0.0
+    max_queue_depth: int = 0
+
+
+class StagePipeline:
+    """
+    Runs items through stages connected by bounded queues, each stage on its own threads.
+    """
+
+    def __init__(self, stages: List[Stage], output_queue_size: int = 1):
+        self.stages = stages
+        self.output_queue_size = max(output_queue_size, 1)
+        self.stats: Dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def run(self, source: Iterable) -> Iterator:
+        """
+        Feed `source` through the stages and yield the last stage's items as they are done
+        (not in source order once a stage has several workers). The first error of any
+        stage stops the pipeline and is raised here; closing the iterator stops it too.
+        """
+        self._stop = threading.Event()
+        self._error = None
+        self.stats = {"source": StageStats(), **{stage.name: StageStats() for stage in self.stages}}
+        queues = [queue.Queue(maxsize=max(stage.queue_size, 1)) for stage in self.stages]
+        queues.append(queue.Queue(maxsize=self.output_queue_size))
+        workers = [max(stage.workers, 1) for stage in self.stages]
+        remaining = list(workers)
+
+        # Stage threads run in a copy of the caller's context, so their spans join the caller's trace
+        threads = [self._thread("source", self._feed, source, queues[0], workers[0])]
+        for index, stage in enumerate(self.stages):
+            for worker in range(workers[index]):
+                threads.append(self._thread(f"{stage.name}-{worker}", self._work, index, queues, workers, remaining))
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _DONE:
+                    break
+                yield item
+            if self._error is not None:
+                raise self._error
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+    @staticmethod
+    def _thread(name: str, target: Callable, *args) -> threading.Thread:
+        return threading.Thread(
+            target=contextvars.copy_context().run, args=(target, *args), name=f"pipeline-{name}", daemon=True
+        )
+
+    def _feed(self, source: Iterable, inbox: queue.Queue, consumers: int):
+        stats = self.stats["source"]
+        try:
+            for item in source:
+                with self._lock:
+                    stats.emitted += 1
+                if self._put(inbox, item, stats, self.stats[self.stages[0].name]) is None:
+                    return
+        except Exception as e:
+            self._fail("source", e)
+            return
+        for _ in range(consumers):
+            if self._put(inbox, _DONE) is None:
+                return
+
+    def _work(self, index: int, queues: List[queue.Queue], workers: List[int], remaining: List[int]):
+        stage = self.stages[index]
+        stats = self.stats[stage.name]
+        inbox, outbox = queues[index], queues[index + 1]
+        downstream = self.stats[self.stages[index + 1].name] if index + 1 < len(self.stages) else None
+        try:
+            done = False
+            while not done:
+                item = self._get(inbox)
+                if item is _DONE:
+                    break
+                items = [item]
+                while len(items) < stage.batch_size:
+                    try:
+                        queued = inbox.get_nowait()
+                    except queue.Empty:
+                        break
+                    if queued is _DONE:
+                        # Finish the batch, then stop like on a plain _DONE
+                        done = True
+                        break
+                    items.append(queued)
+                started = time.monotonic()
+                blocked = 0.0
+                result = stage.fn(items if stage.batch_size > 1 else item)
+                results = result if stage.expand else (() if result is None else (result,))
+                for output in results:
+                    waited = self._put(outbox, output, stats, downstream)
+                    if waited is None:
+                        return
+                    blocked += waited
+                    with self._lock:
+                        stats.emitted += 1
+                with self._lock:
+                    stats.processed += len(items)
+                    stats.busy_seconds += time.monotonic() - started - blocked
+        except Exception as e:
+            self._fail(stage.name, e)
+            return
+
+        with self._lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if last:
+            # The next stage's workers (or the caller) stop once every worker of this stage is done
+            for _ in range(workers[index + 1] if index + 1 < len(self.stages) else 1):
+                if self._put(outbox, _DONE) is None:
+                    return
+
+    def _put(
+        self,
+        outbox: queue.Queue,
+        item,
+        sender: Optional[StageStats] = None,
+        receiver: Optional[StageStats] = None,
+    ) -> Optional[float]:
+        """Block until the item fits in the queue. Returns the seconds blocked, None once the pipeline is stopping."""
+        waited = 0.0
+        try:
+            outbox.put_nowait(item)
+        except queue.Full:
+            blocked_at = time.monotonic()
+            while True:
+                try:
+                    outbox.put(item, timeout=POLL_SECONDS)
+                    break
+                except queue.Full:
+                    if self._stop.is_set():
+                        return None
+            waited = time.monotonic() - blocked_at
+        with self._lock:
+            if sender is not None:
+                sender.blocked_seconds += waited
+            if receiver is not None:
+                receiver.max_queue_depth = max(receiver.max_queue_depth, outbox.qsize())
+        return waited
+
+    def _get(self, inbox: queue.Queue):
+        """Next item of the queue; _DONE once the pipeline is stopping."""
+        while True:
+            try:
+                return inbox.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _DONE
+
+    def _fail(self, name: str, error: BaseException):
+        logger.error(f"Pipeline stage '{name}' failed: {error}")
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def summary(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                name: {
+                    "processed": stats.processed,
+                    "emitted": stats.emitted,
+                    "busy_seconds": round(stats.busy_seconds, 2),
+                    "blocked_seconds": round(stats.blocked_seconds, 2),
+                    "max_queue_depth": stats.max_queue_depth,
+                }
+                for name, stats in self.stats.items()
+            }
@@ -5,7 +5,10 @@ Singleton client for PostgreSQL database access.
 
 import os
 import logging
+import threading
+import time
 import psycopg2
+from psycopg2 import pool as pg_pool
 from psycopg2.extras import RealDictCursor
 from contextlib import contextmanager
 
@@ -18,16 +21,51 @@ POSTGRES_USER = os.getenv("POSTGRES_USER", "qb_user")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "qb_password")
 POSTGRES_DB = os.getenv("POSTGRES_DB", "qb_db")
 
+# Connection pool sizing. MIN_SIZE connections are kept open while idle (psycopg2 closes
+# returned connections beyond that), so it should cover the usual request concurrency.
+# A checkout waits up to POSTGRES_POOL_TIMEOUT_SECONDS when MAX_SIZE are in use.
+POSTGRES_POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "4"))
+POSTGRES_POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10"))
+POSTGRES_POOL_TIMEOUT_SECONDS = float(os.getenv("POSTGRES_POOL_TIMEOUT_SECONDS", "10"))
+# Connections idle longer than this are validated with SELECT 1 before reuse
+POSTGRES_POOL_VALIDATE_IDLE_SECONDS = float(os.getenv("POSTGRES_POOL_VALIDATE_IDLE_SECONDS", "30"))
+
 class PostgresClient:
     """
-    Manages connections to the PostgreSQL database.
+    Manages a thread-safe pool of connections to the PostgreSQL database.
     """
     
     _instance = None
     
-    def __init__(self):
+    def __init__(
+        self,
+        min_size: int = POSTGRES_POOL_MIN_SIZE,
+        max_size: int = POSTGRES_POOL_MAX_SIZE,
+        timeout_seconds: float = POSTGRES_POOL_TIMEOUT_SECONDS,
+        validate_idle_seconds: float = POSTGRES_POOL_VALIDATE_IDLE_SECONDS,
+    ):
         self.dsn = f"host={POSTGRES_HOST} port={POSTGRES_PORT} user={POSTGRES_USER} password={POSTGRES_PASSWORD} dbname={POSTGRES_DB}"
-        logger.info(f"Postgres client initialized for host: {POSTGRES_HOST}")
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.timeout_seconds = timeout_seconds
+        self.validate_idle_seconds = validate_idle_seconds
+        # Created on first checkout (and again in a forked child: connections can't be shared across processes)
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+        # Bounds checkouts to max_size so callers wait instead of getting PoolError
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._last_used = {}  # id(conn) -> monotonic time it was returned
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "discarded": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+        self._in_use = 0
+        logger.info(f"Postgres client initialized for host: {POSTGRES_HOST} (pool {self.min_size}-{max_size})")
     
     @classmethod
     def get_instance(cls):
@@ -35,35 +73,126 @@ class PostgresClient:
             cls._instance = cls()
         return cls._instance
     
-    def get_connection(self):
-        return psycopg2.connect(self.dsn)
+    def _get_pool(self) -> pg_pool.ThreadedConnectionPool:
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = pg_pool.ThreadedConnectionPool(self.min_size, self.max_size, self.dsn)
+                self._pool_pid = os.getpid()
+                self._last_used.clear()
+            return self._pool
+
+    def _is_usable(self, conn) -> bool:
+        """Cheap check on every checkout; a round trip only for connections idle for a while."""
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is None or time.monotonic() - last_used < self.validate_idle_seconds:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout_seconds):
+            with self._stats_lock:
+                self._stats["timeouts"] += 1
+            raise pg_pool.PoolError(f"Timed out after {self.timeout_seconds}s waiting for a Postgres connection")
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            while not self._is_usable(conn):
+                with self._stats_lock:
+                    self._stats["discarded"] += 1
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        waited = time.monotonic() - started
+        with self._stats_lock:
+            self._stats["checkouts"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+            self._in_use += 1
+        return conn
+
+    def _release(self, conn, broken: bool = False):
+        try:
+            pool = self._get_pool()
+            if broken or conn.closed:
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                pool.putconn(conn)
+        finally:
+            with self._stats_lock:
+                self._in_use -= 1
+            self._slots.release()
 
     @contextmanager
     def cursor(self, commit=False):
         """
-        Context manager for DB cursors.
+        Context manager for DB cursors on a pooled connection.
+        The transaction is committed (commit=True) or rolled back before the connection is returned.
         """
-        conn = self.get_connection()
+        conn = self._checkout()
+        broken = False
+        cur = None
         try:
             cur = conn.cursor(cursor_factory=RealDictCursor)
             yield cur
             if commit:
                 conn.commit()
-        except Exception:
-            conn.rollback()
+            else:
+                conn.rollback()
+        except Exception as e:
+            broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
             raise
         finally:
-            cur.close()
-            conn.close()
+            if cur is not None and not cur.closed:
+                cur.close()
+            self._release(conn, broken=broken)
+
+    def pool_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+            stats["in_use"] = self._in_use
+        checkouts = stats["checkouts"]
+        stats["wait_seconds_avg"] = round(stats["wait_seconds_total"] / checkouts, 6) if checkouts else 0.0
+        stats["wait_seconds_total"] = round(stats["wait_seconds_total"], 6)
+        stats["wait_seconds_max"] = round(stats["wait_seconds_max"], 6)
+        stats["min_size"] = self.min_size
+        stats["max_size"] = self.max_size
+        return stats
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.closeall()
+            self._pool = None
+            self._last_used.clear()
 
     def health_check(self) -> dict:
         try:
             with self.cursor() as cur:
                 cur.execute("SELECT 1")
-                return {"status": "UP", "database": "Postgres"}
+                return {"status": "UP", "database": "Postgres", "pool": self.pool_stats()}
         except Exception as e:
             logger.error(f"Postgres health check failed: {e}")
-            return {"status": "DOWN", "error": str(e)}
+            return {"status": "DOWN", "error": str(e), "pool": self.pool_stats()}
 
 def get_postgres_client() -> PostgresClient:
     return PostgresClient.get_instance()
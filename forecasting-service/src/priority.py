@@ -0,0 +1,184 @@
+"""
+Priority order and time budget of the forecasting worker's cycles.
+
+Merchants are ranked by how stale their stored forecasts are, weighted by
+their size (recent sales volume) and data velocity (categories changed since
+their last forecast), so the largest and busiest merchants never end up with
+the stalest forecasts. Each cycle takes merchants in that order while their
+estimated fitting cost fits the cycle's time budget; the rest, and whatever is
+left when the budget runs out mid-cycle, is deferred to the next cycle with
+its planned categories, where its staleness has grown and ranks it higher.
+"""
+
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import WORKER_CYCLE_BUDGET_SECONDS, WORKER_PRIORITY_MAX_AGE_SECONDS
+from .incremental import ForecastPlan
+from .timeseries import TimeSeries
+
+logger = logging.getLogger(__name__)
+
+# Smoothing of the learned fitting cost per series
+COST_EWMA_ALPHA = 0.3
+# Cost assumed per series before any run was timed
+DEFAULT_SECONDS_PER_SERIES = 0.05
+# Recent buckets summed as a merchant's size
+SIZE_BUCKETS = 28
+
+
+def merge_plans(plan: ForecastPlan, other: ForecastPlan) -> ForecastPlan:
+    """Union of two plans; None (every category) wins over a category set."""
+    merged = dict(plan)
+    for merchant_id, category_ids in other.items():
+        if merchant_id not in merged:
+            merged[merchant_id] = category_ids
+        elif merged[merchant_id] is None or category_ids is None:
+            merged[merchant_id] = None
+        else:
+            merged[merchant_id] = merged[merchant_id] | category_ids
+    return merged
+
+
+class PriorityScheduler:
+    """
+    Ranks the planned merchants of a cycle, cuts them to the time budget and keeps the deferred backlog.
+    """
+
+    def __init__(
+        self,
+        budget_seconds: float = WORKER_CYCLE_BUDGET_SECONDS,
+        max_age_seconds: float = WORKER_PRIORITY_MAX_AGE_SECONDS,
+    ):
+        self.budget_seconds = budget_seconds  # 0 = no budget, only ordering
+        self.max_age_seconds = max_age_seconds  # staleness assumed for never-forecast merchants
+        self.seconds_per_series = DEFAULT_SECONDS_PER_SERIES
+        # merchant_id -> epoch seconds of its last stored forecast
+        self.forecast_at: Dict[int, float] = {}
+        # merchant_id -> (recent sales volume, category count)
+        self.sizes: Dict[int, Tuple[float, int]] = {}
+        self.backlog: ForecastPlan = {}
+        # Backlog taken by the running cycle, restored if the cycle fails
+        self._taken: ForecastPlan = {}
+        self.deadline: Optional[float] = None
+        self._started_at: Optional[float] = None
+        self._series_done = 0
+        self._lock = threading.Lock()
+
+    def load_ages(self, ages: Dict[int, Tuple[int, int]]):
+        """Seed staleness from the stored forecasts (fetch_forecast_ages), e.g. after a restart."""
+        now = time.time()
+        for merchant_id, (_, age_seconds) in ages.items():
+            self.forecast_at.setdefault(merchant_id, now - age_seconds)
+
+    def take_backlog(self) -> ForecastPlan:
+        with self._lock:
+            backlog, self.backlog = self.backlog, {}
+            self._taken = backlog
+        return backlog
+
+    def restore(self):
+        """
+        The cycle failed: defer the backlog it took again. Those merchants' changes are
+        already behind the incremental watermark, so no later plan would find them.
+        """
+        taken, self._taken = self._taken, {}
+        self.defer(taken)
+
+    def defer(self, plan: ForecastPlan):
+        # Called from the worker's fit threads
+        with self._lock:
+            self.backlog = merge_plans(self.backlog, plan)
+
+    def age(self, merchant_id: int, now: float) -> float:
+        forecast_at = self.forecast_at.get(merchant_id)
+        return self.max_age_seconds if forecast_at is None else max(now - forecast_at, 0.0)
+
+    def _series_count(self, merchant_id: int, category_ids) -> int:
+        if category_ids is not None:
+            return len(category_ids)
+        return self.sizes.get(merchant_id, (0.0, 1))[1]
+
+    def priority(self, merchant_id: int, category_ids, now: float) -> float:
+        """Staleness x log size x log velocity."""
+        volume = self.sizes.get(merchant_id, (0.0, 0))[0]
+        return (
+            self.age(merchant_id, now)
+            * (1.0 + math.log1p(volume))
+            * (1.0 + math.log1p(self._series_count(merchant_id, category_ids)))
+        )
+
+    def select(self, plan: ForecastPlan) -> Tuple[ForecastPlan, ForecastPlan]:
+        """
+        Start a cycle: order the plan by priority (highest first) and keep merchants while their
+        estimated cost fits the budget. Returns (selected plan in order, deferred plan).
+        The highest-priority merchant is always selected.
+        """
+        now = time.time()
+        ranked = sorted(plan, key=lambda merchant_id: self.priority(merchant_id, plan[merchant_id], now), reverse=True)
+        selected: ForecastPlan = {}
+        deferred: ForecastPlan = {}
+        estimated = 0.0
+        for merchant_id in ranked:
+            cost = self._series_count(merchant_id, plan[merchant_id]) * self.seconds_per_series
+            if selected and self.budget_seconds and estimated + cost > self.budget_seconds:
+                deferred[merchant_id] = plan[merchant_id]
+            else:
+                selected[merchant_id] = plan[merchant_id]
+                estimated += cost
+        self.defer(deferred)
+        self._started_at = time.monotonic()
+        self.deadline = self._started_at + self.budget_seconds if self.budget_seconds else None
+        self._series_done = 0
+        if deferred:
+            logger.info(
+                f"Time budget {self.budget_seconds:g}s: {len(selected)} merchants selected "
+                f"(~{estimated:.1f}s estimated), {len(deferred)} deferred"
+            )
+        return selected, deferred
+
+    def over_budget(self) -> bool:
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def record(self, merchant_id: int, series: Dict[int, TimeSeries], generated_at: float, full: bool):
+        """A merchant's forecasts were stored: update its staleness, size and the cost per series."""
+        self.forecast_at[merchant_id] = generated_at
+        volume = float(sum(np.sum(ts.values[-SIZE_BUCKETS:]) for ts in series.values()))
+        previous_volume, categories = self.sizes.get(merchant_id, (0.0, 0))
+        if full:
+            self.sizes[merchant_id] = (volume, len(series))
+        else:
+            # Only the refitted categories were fetched; keep the larger known picture
+            self.sizes[merchant_id] = (max(volume, previous_volume), max(categories, len(series)))
+        self._series_done += len(series)
+
+    def finish(self):
+        """End of a cycle: learn the cost per series from its wall time."""
+        self._taken = {}
+        if self._started_at is None or not self._series_done:
+            return
+        observed = (time.monotonic() - self._started_at) / self._series_done
+        self.seconds_per_series = COST_EWMA_ALPHA * observed + (1 - COST_EWMA_ALPHA) * self.seconds_per_series
+        self._started_at = None
+
+    def ages(self, merchant_ids: Optional[List[int]] = None) -> Dict[int, float]:
+        """Forecast age in seconds per merchant (all known merchants by default)."""
+        now = time.time()
+        ids = self.forecast_at.keys() if merchant_ids is None else merchant_ids
+        return {merchant_id: self.age(merchant_id, now) for merchant_id in ids}
+
+    def age_summary(self) -> Dict:
+        ages = sorted(self.ages().values())
+        if not ages:
+            return {"merchants": 0}
+        return {
+            "merchants": len(ages),
+            "p50_seconds": round(ages[len(ages) // 2], 1),
+            "max_seconds": round(ages[-1], 1),
+            "deferred": len(self.backlog),
+        }
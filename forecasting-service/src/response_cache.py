@@ -0,0 +1,73 @@
+"""
+Cache of serialized API responses, validated by a data freshness token.
+
+Each entry stores the token (e.g. max(updated_at) of the merchant's aggregates)
+that was current when the response was built. A lookup passes the current
+token from a cheap probe query; any difference is a miss, so a hit never
+serves data older than what the probe sees. A max age bounds staleness of
+inputs the probe does not cover (e.g. category names).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU of key -> (freshness token, serialized body).
+    """
+
+    def __init__(self, max_entries: int = 2048, max_age_seconds: float = 600):
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        # key -> (token, body, stored_at)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, bytes, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, token: Any) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_token, body, stored_at = entry
+            if stored_token != token or time.monotonic() - stored_at > self.max_age_seconds:
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: Hashable, token: Any, body: bytes):
+        with self._lock:
+            self._entries[key] = (token, body, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "max_age_seconds": self.max_age_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+            }
@@ -1,9 +1,25 @@
-from typing import List, Dict, Optional, Protocol, Tuple, Any
+from typing import Any, Callable, Dict, Iterable, List, Optional, Protocol, Tuple
 from dataclasses import dataclass
-from datetime import datetime
 from fastapi import HTTPException
-import pandas as pd
+import numpy as np
 import logging
+import math
+import time
+from .batch import BatchForecastEngine
+from .timeseries import TimeSeries, TimeSeriesPoint, future_bucket_starts, split_series
+from .db import agg_series_sql, fetch_model_selection
+from .arima_params import ArimaParamStore, ArimaState
+from .fit_cache import FitCache
+from .config import (
+    ARIMA_WARM_START,
+    ARIMA_MAX_NEW_POINTS,
+    ARIMA_PARAMS_MAX_AGE_SECONDS,
+    ARIMA_PARAMS_MAX_ENTRIES,
+    FIT_CACHE_ENABLED,
+    FIT_CACHE_MAX_BYTES,
+    FIT_CACHE_TTL_SECONDS,
+    AUTO_STORED_SELECTION,
+)
 from .postgres_client import get_postgres_client
 from .clickhouse_client import get_clickhouse_client
 
@@ -16,15 +32,26 @@ logger = logging.getLogger(__name__)
 # ----------------------------
 
 class ForecastModel(Protocol):
+    """
+    `merchant_id` is passed when `series` is the full live series of that
+    merchant's category, so stateful models may reuse state across calls.
+    Models whose output does not depend on `lookback` set `uses_lookback = False`
+    (cached fits are then shared across lookbacks). Models may also implement
+    `forecast_steps(series, steps, ...)`, the next `steps` buckets from one fit
+    (see `model_forecast_steps`), and `forecast_steps_holdout`, which also returns
+    the forecast of the last point from a fit on the points before it
+    (see `model_forecast_steps_holdout`).
+    """
     name: str
 
     def forecast(
         self,
-        series: List["TimeSeriesPoint"],
+        series: TimeSeries,
         lookback: int,
         bucket_type: str,
         category_id: int,
         category_name: str,
+        merchant_id: Optional[int] = None,
     ) -> Tuple[Optional[float], Optional[str]]:
         ...
 
@@ -32,11 +59,6 @@ class ForecastModel(Protocol):
 # Domain models
 # ----------------------------
 
-@dataclass
-class TimeSeriesPoint:
-    bucket_start: datetime
-    value: float
-
 @dataclass
 class CategoryForecastResult:
     category_id: int
@@ -76,6 +98,11 @@ MODEL_DATA_REQUIREMENTS = {
 }
 
 
+def seasonal_period(bucket_type: str) -> int:
+    """Season length used by SNAIVE: weekly for DAY, yearly for WEEK/MONTH."""
+    return 7 if bucket_type == "DAY" else 52 if bucket_type == "WEEK" else 12
+
+
 
 class ForecastingService:
     """
@@ -87,13 +114,24 @@ class ForecastingService:
         self.default_lookback = default_lookback
         self.ch_client = get_clickhouse_client()
         self.pg_client = get_postgres_client()  # For category names only
+        # Fitted ARIMA params per (merchant, category, bucket_type), reused for cheap refits
+        self.arima_params = ArimaParamStore(
+            max_new_points=ARIMA_MAX_NEW_POINTS,
+            max_age_seconds=ARIMA_PARAMS_MAX_AGE_SECONDS,
+            max_entries=ARIMA_PARAMS_MAX_ENTRIES,
+        ) if ARIMA_WARM_START else None
+        # Outputs of per-category fits keyed by series contents, for repeated on-demand requests
+        self.fit_cache = FitCache(
+            max_bytes=FIT_CACHE_MAX_BYTES,
+            ttl_seconds=FIT_CACHE_TTL_SECONDS,
+        ) if FIT_CACHE_ENABLED else None
         # Registry of forecasting models
         self._models: Dict[str, ForecastModel] = {
             "rolling": RollingAverageModel(),
             "wma": WeightedMovingAverageModel(),
             "ses": ExponentialSmoothingModel(),
             "snaive": SeasonalNaiveModel(),
-            "arima": ARIMAModel(),
+            "arima": ARIMAModel(param_store=self.arima_params),
         }
         # Ensemble model weights (higher = more influence)
         self._ensemble_weights = {
@@ -102,18 +140,138 @@ class ForecastingService:
             "wma": 0.20,
             "rolling": 0.15,
         }
+        # Closed-form models that can forecast every category in one vectorized pass
+        self._batch_models = [
+            name for name, impl in self._models.items() if hasattr(impl, "forecast_batch")
+        ]
+        # Models that still need one fit per category (candidates for parallel fitting)
+        self.per_category_models = [name for name in self._models if name not in self._batch_models]
+
+    def _batch_forecast(
+        self,
+        series_map: Dict[int, TimeSeries],
+        model_names,
+        lookback: int,
+        bucket_type: str,
+        offset: int = 0,
+    ) -> Dict[str, Dict[int, Tuple[Optional[float], Optional[str]]]]:
+        """
+        Run the requested closed-form models for all categories at once.
+        Returns {model_name: {category_id: (forecast_value, message)}}; models
+        without a batch implementation are left out and must be fitted per category.
+        """
+        names = [name for name in model_names if name in self._batch_models]
+        if not names or not series_map:
+            return {}
+
+        window = max(lookback, seasonal_period(bucket_type)) + offset
+        engine = BatchForecastEngine(series_map, window)
+        return {
+            name: self._models[name].forecast_batch(engine, lookback, bucket_type, offset)
+            for name in names
+        }
+
+    def _batch_forecast_steps(
+        self,
+        series_map: Dict[int, TimeSeries],
+        model_names,
+        lookback: int,
+        bucket_type: str,
+        steps: int,
+    ) -> Dict[str, Dict[int, Tuple[Optional[List[float]], Optional[str]]]]:
+        """
+        Multi-step version of _batch_forecast: {model_name: {category_id: (values of the next `steps` buckets, message)}}.
+        """
+        names = [name for name in model_names if name in self._batch_models]
+        if not names or not series_map:
+            return {}
+
+        engine = BatchForecastEngine(series_map, max(lookback, seasonal_period(bucket_type)))
+        return {
+            name: self._models[name].forecast_batch_steps(engine, lookback, bucket_type, steps)
+            for name in names
+        }
+
+    def _cached_forecast(
+        self,
+        model_name: str,
+        series: TimeSeries,
+        lookback: int,
+        bucket_type: str,
+        category_id: int,
+        category_name: str,
+        merchant_id: Optional[int] = None,
+        shared: bool = True,
+    ) -> Tuple[Optional[float], Optional[str]]:
+        """
+        Single-category model forecast, served from the fit cache when the same
+        model already ran on identical series contents (`shared=False` bypasses it).
+        Failures (no forecast value) are not cached, so the next request fits again.
+        """
+        model = self._models[model_name]
+        return self._cached(
+            model_name, series, lookback, bucket_type, 1, shared,
+            lambda: model.forecast(series, lookback, bucket_type, category_id, category_name, merchant_id),
+        )
+
+    def _cached_forecast_steps(
+        self,
+        model_name: str,
+        series: TimeSeries,
+        steps: int,
+        lookback: int,
+        bucket_type: str,
+        category_id: int,
+        category_name: str,
+        merchant_id: Optional[int] = None,
+        shared: bool = True,
+    ) -> Tuple[Optional[List[float]], Optional[str]]:
+        """Like _cached_forecast, for the next `steps` buckets from one fit."""
+        model = self._models[model_name]
+        return self._cached(
+            model_name, series, lookback, bucket_type, steps, shared,
+            lambda: model_forecast_steps(model, series, steps, lookback, bucket_type, category_id, category_name, merchant_id),
+        )
+
+    def _cached(
+        self,
+        model_name: str,
+        series: TimeSeries,
+        lookback: int,
+        bucket_type: str,
+        steps: int,
+        shared: bool,
+        compute: Callable[[], Tuple[Any, Optional[str]]],
+    ) -> Tuple[Any, Optional[str]]:
+        if self.fit_cache is None or not shared:
+            return compute()
+
+        # Models that ignore the lookback share one entry for every lookback
+        model = self._models[model_name]
+        key = FitCache.make_key(
+            model_name, series, lookback if getattr(model, "uses_lookback", True) else 0, bucket_type, steps
+        )
+        output = self.fit_cache.get(key)
+        if output is None:
+            output = compute()
+            if output[0] is not None:
+                self.fit_cache.put(key, output)
+        return output
 
     def _has_enough_data(self, model_name: str, data_points: int, bucket_type: str) -> bool:
         """Check if there's enough data for a given model."""
         # SNAIVE period varies by bucket type
         if model_name == "snaive":
-            period = 7 if bucket_type == "DAY" else 52 if bucket_type == "WEEK" else 12
-            return data_points >= period
+            return data_points >= seasonal_period(bucket_type)
         required = MODEL_DATA_REQUIREMENTS.get(model_name, 4)
         return data_points >= required
 
     def _evaluate_model_for_category(
-        self, model: ForecastModel, series: List[TimeSeriesPoint], bucket_type: str, category_id: int
+        self,
+        model_name: str,
+        series: TimeSeries,
+        bucket_type: str,
+        category_id: int,
     ) -> float:
         """Simple one-step-ahead error for model selection."""
         if len(series) < 5:
@@ -121,29 +279,41 @@ class ForecastingService:
         
         # Use last point as test, rest as training
         train_series = series[:-1]
-        actual = series[-1].value
         
         try:
-            forecast_value, _ = model.forecast(
+            forecast_value, _ = self._cached_forecast(
+                model_name,
                 series=train_series,
                 lookback=4,
                 bucket_type=bucket_type,
                 category_id=category_id,
                 category_name=str(category_id),
             )
-            if forecast_value is None:
-                return float('inf')
-            # Calculate absolute percentage error
-            if actual == 0:
-                return float('inf') if forecast_value != 0 else 0
-            return abs((actual - forecast_value) / actual) * 100
+            return self._holdout_error(series, forecast_value)
         except:
             return float('inf')
 
+    def _holdout_error(self, series: TimeSeries, forecast_value: Optional[float]) -> float:
+        """Absolute percentage error of a forecast made for the last point of the series."""
+        if forecast_value is None:
+            return float('inf')
+        actual = float(series.values[-1])
+        if actual == 0:
+            return float('inf') if forecast_value != 0 else 0
+        return abs((actual - forecast_value) / actual) * 100
+
     def _select_best_model_for_category(
-        self, series: List[TimeSeriesPoint], category_id: int, bucket_type: str
+        self,
+        series: TimeSeries,
+        category_id: int,
+        bucket_type: str,
+        holdout_forecasts: Optional[Dict[str, Tuple[Optional[float], Optional[str]]]] = None,
     ) -> Tuple[str, float]:
-        """Evaluate all eligible models for this category and return the best one."""
+        """
+        Evaluate all eligible models for this category and return the best one.
+        `holdout_forecasts` carries batch-computed one-step forecasts of the last
+        point, so closed-form models skip their per-category fit.
+        """
         data_points = len(series)
         
         # Filter eligible models based on data sufficiency
@@ -160,18 +330,78 @@ class ForecastingService:
         best_error = float('inf')
         
         for name, model in eligible_models.items():
-            error = self._evaluate_model_for_category(model, series, bucket_type, category_id)
+            if holdout_forecasts and name in holdout_forecasts and data_points >= 5:
+                error = self._holdout_error(series, holdout_forecasts[name][0])
+            else:
+                error = self._evaluate_model_for_category(name, series, bucket_type, category_id)
             if error < best_error:
                 best_error = error
                 best_model = name
         
         return best_model, best_error
 
+    def select_models(
+        self,
+        category_series: Dict[int, TimeSeries],
+        bucket_type: str,
+        holdouts: Optional[Dict[Tuple[int, str], Optional[float]]] = None,
+    ) -> Dict[int, Tuple[str, float, int]]:
+        """
+        model=auto selection for every category: {category_id: (model_name, holdout_ape, data_points)}.
+        Run by the worker and stored, so auto requests only fit the chosen model.
+        `holdouts` holds (category_id, model_name) -> one-step forecast of the last point taken
+        from the run's own fits (see fit_per_category_models); those models are not refitted.
+        """
+        series_map = {category_id: series for category_id, series in category_series.items() if series}
+        if not series_map:
+            return {}
+        holdout = self._batch_forecast(series_map, self._batch_models, 4, bucket_type, offset=1)
+        fitted_holdout: Dict[int, Dict[str, Tuple[Optional[float], Optional[str]]]] = {}
+        for (category_id, model_name), value in (holdouts or {}).items():
+            fitted_holdout.setdefault(category_id, {})[model_name] = (value, None)
+        selections = {}
+        for category_id, series in series_map.items():
+            holdout_forecasts = {name: results[category_id] for name, results in holdout.items()}
+            holdout_forecasts.update(fitted_holdout.get(category_id, {}))
+            best_model_name, best_error = self._select_best_model_for_category(
+                series, category_id, bucket_type,
+                holdout_forecasts=holdout_forecasts,
+            )
+            selections[category_id] = (best_model_name, best_error, len(series))
+        return selections
+
+    def _stored_selections(
+        self, merchant_id: int, bucket_type: str, series_map: Dict[int, TimeSeries]
+    ) -> Dict[int, str]:
+        """
+        Stored model=auto choices that still apply to the current series.
+        Read failures and unknown or no longer eligible models are left out (selected per request).
+        """
+        if not AUTO_STORED_SELECTION:
+            return {}
+        try:
+            stored = fetch_model_selection(merchant_id, bucket_type)
+        except Exception as e:
+            logger.warning(f"Could not read stored model selection, selecting per request: {e}")
+            return {}
+        return {
+            category_id: model_name
+            for category_id, (model_name, _, _) in stored.items()
+            if category_id in series_map
+            and model_name in self._models
+            and self._has_enough_data(model_name, len(series_map[category_id]), bucket_type)
+        }
+
     def _ensemble_forecast(
-        self, series: List[TimeSeriesPoint], lookback: int, bucket_type: str, 
-        category_id: int, category_name: str
+        self, series: TimeSeries, lookback: int, bucket_type: str, 
+        category_id: int, category_name: str,
+        merchant_id: Optional[int] = None,
+        batch_forecasts: Optional[Dict[str, Tuple[Optional[float], Optional[str]]]] = None,
     ) -> Tuple[Optional[float], str]:
-        """Weighted average of multiple models."""
+        """
+        Weighted average of multiple models.
+        `batch_forecasts` holds already computed closed-form results for this category.
+        """
         forecasts = {}
         total_weight = 0
         data_points = len(series)
@@ -182,7 +412,12 @@ class ForecastingService:
             if not self._has_enough_data(name, data_points, bucket_type):
                 continue
             try:
-                value, _ = model.forecast(series, lookback, bucket_type, category_id, category_name)
+                if batch_forecasts and name in batch_forecasts:
+                    value, _ = batch_forecasts[name]
+                else:
+                    value, _ = self._cached_forecast(
+                        name, series, lookback, bucket_type, category_id, category_name, merchant_id,
+                    )
                 if value is not None:
                     weight = self._ensemble_weights.get(name, 0.1)
                     forecasts[name] = (value, weight)
@@ -199,32 +434,40 @@ class ForecastingService:
         
         return round(ensemble_value, 2), f"Ensemble of {len(forecasts)} models: {models_used}"
 
-    def _fetch_series(self, merchant_id: int, bucket_type: str, limit_per_category: int = 20) -> Dict[int, List[TimeSeriesPoint]]:
+    def _fetch_series(
+        self,
+        merchant_id: int,
+        bucket_type: str,
+        limit_per_category: int = 20,
+        category_ids: Optional[Iterable[int]] = None,
+    ) -> Dict[int, TimeSeries]:
         """
         Fetches time-series data from ClickHouse (category_sales_agg).
-        Filters by merchant_id to only return categories belonging to that merchant.
-        """
-        query = """
-            SELECT merchant_id, category_id, bucket_start, total_sales_amount
-            FROM category_sales_agg FINAL
-            WHERE merchant_id = %(merchant_id)s AND bucket_type = %(bucket_type)s
-            ORDER BY category_id, bucket_start ASC
+        Filters by merchant_id to only return categories belonging to that merchant,
+        and to `category_ids` when given.
         """
+        params = {"merchant_id": merchant_id, "bucket_type": bucket_type}
+        category_filter = ""
+        if category_ids is not None:
+            params["category_ids"] = tuple(sorted(category_ids))
+            if not params["category_ids"]:
+                return {}
+            category_filter = "AND category_id IN %(category_ids)s"
         
-        category_series: Dict[int, List[TimeSeriesPoint]] = {}
+        query = agg_series_sql(
+            where=f"merchant_id = %(merchant_id)s AND bucket_type = %(bucket_type)s {category_filter}",
+            order_by="category_id, bucket_start ASC",
+        )
         
         try:
-            rows = self.ch_client.query(query, {"merchant_id": merchant_id, "bucket_type": bucket_type})
+            columns = self.ch_client.query_columns(query, params)
+            if not columns:
+                return {}
             
-            for row in rows:
-                cat_id = row['category_id']
-                point = TimeSeriesPoint(
-                    bucket_start=row['bucket_start'],
-                    value=float(row['total_sales_amount'])
-                )
-                if cat_id not in category_series:
-                    category_series[cat_id] = []
-                category_series[cat_id].append(point)
+            # Rows arrive ordered by (category_id, bucket_start): split the columns per category
+            category_series = split_series(
+                columns["category_id"], columns["bucket_start"], columns["total_sales_amount"]
+            )
                     
         except Exception as e:
             logger.error(f"Failed to fetch series from ClickHouse: {e}")
@@ -232,15 +475,59 @@ class ForecastingService:
             
         return category_series
 
+    def fit_per_category_models(
+        self,
+        merchant_id: int,
+        category_series: Dict[int, TimeSeries],
+        lookback: int,
+        bucket_type: str,
+        steps: int = 1,
+    ) -> Tuple[
+        Dict[Tuple[int, str], Tuple[Optional[List[float]], Optional[str]]],
+        Dict[Tuple[int, str], Optional[float]],
+    ]:
+        """
+        In-process counterpart of the worker's process pool (parallel.py): fit every
+        per-category model once per category. Returns (fitted, holdouts), keyed by
+        (category_id, model_name): the forecasts of the next `steps` buckets, and the same
+        fit's out-of-sample forecast of the last point for model selection.
+        """
+        fitted = {}
+        holdouts = {}
+        for category_id, series in category_series.items():
+            for model_name in self.per_category_models:
+                try:
+                    values, message, holdout_value = model_forecast_steps_holdout(
+                        self._models[model_name],
+                        series=series,
+                        steps=steps,
+                        lookback=lookback,
+                        bucket_type=bucket_type,
+                        category_id=category_id,
+                        category_name=str(category_id),
+                        merchant_id=merchant_id,
+                    )
+                except Exception as e:
+                    logger.error(f"Model '{model_name}' failed for merchant {merchant_id} category {category_id}: {e}")
+                    values, message, holdout_value = None, f"{model_name} failed: {e}", None
+                fitted[(category_id, model_name)] = (values, message)
+                holdouts[(category_id, model_name)] = holdout_value
+        return fitted, holdouts
+
     def run_all_models(
         self,
         merchant_id: int,
-        category_series: Dict[int, List[TimeSeriesPoint]], # Can pass in if already fetched, or None
+        category_series: Dict[int, TimeSeries], # Can pass in if already fetched, or None
         lookback: int,
         limit: int,
+        fitted: Optional[Dict[Tuple[int, str], Tuple[Optional[List[float]], Optional[str]]]] = None,
+        horizon: int = 1,
     ) -> Dict[int, Dict[str, Dict[str, ModelForecast]]]:
         """
         Run all available models using data from Postgres.
+        Each model is fitted once per category and forecasts the next `horizon` buckets.
+        `fitted` holds (category_id, model_name) -> (values, message) results that were
+        already computed elsewhere (e.g. on the worker's process pool).
         """
         all_results = {}
         bucket_type = "DAY" 
@@ -249,23 +536,37 @@ class ForecastingService:
         if category_series is None:
              category_series = self._fetch_series(merchant_id, bucket_type)
 
+        # Closed-form models for every category in one vectorized pass
+        batch = self._batch_forecast_steps(category_series, self._models.keys(), lookback, bucket_type, horizon)
+
         for category_id, series in category_series.items():
             category_results = {"models": {}}
             for model_name, model_impl in self._models.items():
                 try:
-                    forecast_value, message = model_impl.forecast(
-                        series=series,
-                        lookback=lookback,
-                        bucket_type=bucket_type,
-                        category_id=category_id,
-                        category_name=str(category_id), 
-                    )
+                    if model_name in batch:
+                        forecast_values, message = batch[model_name][category_id]
+                    elif fitted is not None and (category_id, model_name) in fitted:
+                        forecast_values, message = fitted[(category_id, model_name)]
+                    else:
+                        forecast_values, message = self._cached_forecast_steps(
+                            model_name,
+                            series=series,
+                            steps=horizon,
+                            lookback=lookback,
+                            bucket_type=bucket_type,
+                            category_id=category_id,
+                            category_name=str(category_id), 
+                            merchant_id=merchant_id,
+                            shared=False,
+                        )
                     
                     forecast_points = None
-                    if forecast_value is not None:
-                        last_bucket_start = series[-1].bucket_start
-                        next_bucket_start = last_bucket_start + pd.Timedelta(days=1)
-                        forecast_points = [TimeSeriesPoint(bucket_start=next_bucket_start, value=forecast_value)]
+                    if forecast_values is not None:
+                        bucket_starts = future_bucket_starts(series.last_bucket_start, bucket_type, len(forecast_values))
+                        forecast_points = [
+                            TimeSeriesPoint(bucket_start=bucket_start, value=value)
+                            for bucket_start, value in zip(bucket_starts, forecast_values)
+                        ]
 
                     category_results["models"][model_name] = ModelForecast(
                         forecast=forecast_points,
@@ -307,25 +608,55 @@ class ForecastingService:
         if model not in ("auto", "ensemble") and model not in self._models:
             raise HTTPException(status_code=400, detail=f"Model '{model}' not found.")
 
+        # Closed-form models are computed for all categories up front
+        if model == "auto":
+            batch_names = self._batch_models
+        elif model == "ensemble":
+            batch_names = [name for name in self._batch_models if name != "snaive"]
+        else:
+            batch_names = [model]
+        batch = self._batch_forecast(series_map, batch_names, lookback, bucket_type)
+        # auto: use the worker's stored selection; the remaining categories are selected
+        # here, with one-step holdout forecasts of the last point
+        selections: Dict[int, str] = {}
+        holdout = {}
+        if model == "auto":
+            selections = self._stored_selections(merchant_id, bucket_type, series_map)
+            unselected = {cid: s for cid, s in series_map.items() if cid not in selections and s}
+            if unselected:
+                holdout = self._batch_forecast(unselected, batch_names, 4, bucket_type, offset=1)
+
         for category_id, series in series_map.items():
             category_name = category_names.get(category_id, str(category_id))
             
             if not series:
                 continue
 
+            category_batch = {name: results[category_id] for name, results in batch.items()}
+
             try:
                 # Handle special model modes
                 if model == "auto":
                     # Per-category best model selection
-                    best_model_name, _ = self._select_best_model_for_category(series, category_id, bucket_type)
-                    model_impl = self._models[best_model_name]
-                    forecast_value, message = model_impl.forecast(
-                        series=series,
-                        lookback=lookback,
-                        bucket_type=bucket_type,
-                        category_id=category_id,
-                        category_name=category_name,
-                    )
+                    if category_id in selections:
+                        best_model_name = selections[category_id]
+                    else:
+                        best_model_name, _ = self._select_best_model_for_category(
+                            series, category_id, bucket_type,
+                            holdout_forecasts={name: results[category_id] for name, results in holdout.items()},
+                        )
+                    if best_model_name in category_batch:
+                        forecast_value, message = category_batch[best_model_name]
+                    else:
+                        forecast_value, message = self._cached_forecast(
+                            best_model_name,
+                            series=series,
+                            lookback=lookback,
+                            bucket_type=bucket_type,
+                            category_id=category_id,
+                            category_name=category_name,
+                            merchant_id=merchant_id,
+                        )
                     used_model_name = best_model_name
                 elif model == "ensemble":
                     # Weighted ensemble of multiple models
@@ -335,19 +666,26 @@ class ForecastingService:
                         bucket_type=bucket_type,
                         category_id=category_id,
                         category_name=category_name,
+                        merchant_id=merchant_id,
+                        batch_forecasts=category_batch,
                     )
                     used_model_name = "ensemble"
+                elif model in category_batch:
+                    # Standard single model, already computed in the batch pass
+                    forecast_value, message = category_batch[model]
+                    used_model_name = self._models[model].name
                 else:
                     # Standard single model
-                    model_impl = self._models[model]
-                    forecast_value, message = model_impl.forecast(
+                    forecast_value, message = self._cached_forecast(
+                        model,
                         series=series,
                         lookback=lookback,
                         bucket_type=bucket_type,
                         category_id=category_id,
                         category_name=category_name,
+                        merchant_id=merchant_id,
                     )
-                    used_model_name = model_impl.name
+                    used_model_name = self._models[model].name
                 
                 if message:
                     messages.append(message)
@@ -367,90 +705,283 @@ class ForecastingService:
                 logger.error(f"Prediction failed for category {category_id}: {e}")
                 continue
 
+
         # Sort by forecasted value descending
         results.sort(key=lambda r: r.forecast_value, reverse=True)
         return ForecastResult(forecasts=results[:limit], messages=messages)
 
 # ---------- MODEL IMPLEMENTATIONS ----------
 
+def _batch_results(
+    engine: BatchForecastEngine, values, offset: int, not_enough_data
+) -> Dict[int, Tuple[Optional[float], Optional[str]]]:
+    """Map a per-category forecast vector back to (value, message) tuples; NaN means not enough data."""
+    return {
+        category_id: (None, not_enough_data(available)) if math.isnan(value) else (value, None)
+        for category_id, value, available in zip(
+            engine.category_ids, values.tolist(), engine.available(offset).tolist()
+        )
+    }
+
+
+def _flat_steps(
+    output: Tuple[Optional[float], Optional[str]], steps: int
+) -> Tuple[Optional[List[float]], Optional[str]]:
+    """Multi-step output of a model whose forecast is flat (the same value for every future bucket)."""
+    value, message = output
+    return ([value] * steps if value is not None else None), message
+
+
+def _batch_step_results(
+    engine: BatchForecastEngine, matrix: np.ndarray, offset: int, not_enough_data
+) -> Dict[int, Tuple[Optional[List[float]], Optional[str]]]:
+    """Map a categories x steps forecast matrix back to (values, message) tuples; NaN rows mean not enough data."""
+    return {
+        category_id: (None, not_enough_data(available)) if math.isnan(row[0]) else (row, None)
+        for category_id, row, available in zip(
+            engine.category_ids, matrix.tolist(), engine.available(offset).tolist()
+        )
+    }
+
+
+def model_forecast_steps(
+    model: ForecastModel,
+    series: TimeSeries,
+    steps: int,
+    lookback: int,
+    bucket_type: str,
+    category_id: int,
+    category_name: str,
+    merchant_id: Optional[int] = None,
+) -> Tuple[Optional[List[float]], Optional[str]]:
+    """Forecasts of the next `steps` buckets from one fit; models without `forecast_steps` make one."""
+    if hasattr(model, "forecast_steps"):
+        return model.forecast_steps(series, steps, lookback, bucket_type, category_id, category_name, merchant_id)
+    value, message = model.forecast(series, lookback, bucket_type, category_id, category_name, merchant_id)
+    return ([value] if value is not None else None), message
+
+
+def model_forecast_steps_holdout(
+    model: ForecastModel,
+    series: TimeSeries,
+    steps: int,
+    lookback: int,
+    bucket_type: str,
+    category_id: int,
+    category_name: str,
+    merchant_id: Optional[int] = None,
+) -> Tuple[Optional[List[float]], Optional[str], Optional[float]]:
+    """
+    model_forecast_steps plus the model=auto holdout forecast of the last point, made from the
+    points before it by the same fit; None for models without `forecast_steps_holdout`.
+    """
+    if hasattr(model, "forecast_steps_holdout"):
+        return model.forecast_steps_holdout(series, steps, lookback, bucket_type, category_id, category_name, merchant_id)
+    values, message = model_forecast_steps(model, series, steps, lookback, bucket_type, category_id, category_name, merchant_id)
+    return values, message, None
+
+
 class RollingAverageModel:
     name = "rolling"
 
     def forecast(
         self,
-        series: List[TimeSeriesPoint],
+        series: TimeSeries,
         lookback: int,
         bucket_type: str,
         category_id: int,
         category_name: str,
+        merchant_id: Optional[int] = None,
     ) -> Tuple[Optional[float], Optional[str]]:
         if lookback <= 0 or len(series) < lookback:
             return None, f"Not enough data for rolling average (needs {lookback}, has {len(series)})"
 
-        values = [p.value for p in series[-lookback:]]
-        return sum(values) / lookback, None
+        return float(series.values[-lookback:].sum()) / lookback, None
+
+    def forecast_batch(
+        self, engine: BatchForecastEngine, lookback: int, bucket_type: str, offset: int = 0
+    ) -> Dict[int, Tuple[Optional[float], Optional[str]]]:
+        message = lambda has: f"Not enough data for rolling average (needs {lookback}, has {has})"
+        if lookback <= 0:
+            return {cid: (None, message(has)) for cid, has in zip(engine.category_ids, engine.available(offset).tolist())}
+        return _batch_results(engine, engine.rolling(lookback, offset), offset, message)
+
+    def forecast_steps(
+        self, series: TimeSeries, steps: int, lookback: int, bucket_type: str,
+        category_id: int, category_name: str, merchant_id: Optional[int] = None,
+    ) -> Tuple[Optional[List[float]], Optional[str]]:
+        return _flat_steps(self.forecast(series, lookback, bucket_type, category_id, category_name), steps)
+
+    def forecast_batch_steps(
+        self, engine: BatchForecastEngine, lookback: int, bucket_type: str, steps: int
+    ) -> Dict[int, Tuple[Optional[List[float]], Optional[str]]]:
+        return {cid: _flat_steps(output, steps) for cid, output in self.forecast_batch(engine, lookback, bucket_type).items()}
 
 class WeightedMovingAverageModel:
     name = "wma"
 
     def forecast(
         self,
-        series: List[TimeSeriesPoint],
+        series: TimeSeries,
         lookback: int,
         bucket_type: str,
         category_id: int,
         category_name: str,
+        merchant_id: Optional[int] = None,
     ) -> Tuple[Optional[float], Optional[str]]:
         if lookback <= 0 or len(series) < lookback:
             return None, f"Not enough data for WMA (needs {lookback}, has {len(series)})"
 
-        values = [p.value for p in series[-lookback:]]
-        weights = range(1, lookback + 1)
+        weights = np.arange(1, lookback + 1, dtype=np.float64)
         
-        weighted_sum = sum(v * w for v, w in zip(values, weights))
-        return weighted_sum / sum(weights), None
+        weighted_sum = float(series.values[-lookback:] @ weights)
+        return weighted_sum / float(weights.sum()), None
+
+    def forecast_batch(
+        self, engine: BatchForecastEngine, lookback: int, bucket_type: str, offset: int = 0
+    ) -> Dict[int, Tuple[Optional[float], Optional[str]]]:
+        message = lambda has: f"Not enough data for WMA (needs {lookback}, has {has})"
+        if lookback <= 0:
+            return {cid: (None, message(has)) for cid, has in zip(engine.category_ids, engine.available(offset).tolist())}
+        return _batch_results(engine, engine.wma(lookback, offset), offset, message)
+
+    def forecast_steps(
+        self, series: TimeSeries, steps: int, lookback: int, bucket_type: str,
+        category_id: int, category_name: str, merchant_id: Optional[int] = None,
+    ) -> Tuple[Optional[List[float]], Optional[str]]:
+        return _flat_steps(self.forecast(series, lookback, bucket_type, category_id, category_name), steps)
+
+    def forecast_batch_steps(
+        self, engine: BatchForecastEngine, lookback: int, bucket_type: str, steps: int
+    ) -> Dict[int, Tuple[Optional[List[float]], Optional[str]]]:
+        return {cid: _flat_steps(output, steps) for cid, output in self.forecast_batch(engine, lookback, bucket_type).items()}
 
 class ExponentialSmoothingModel:
     name = "ses"
+    uses_lookback = False
 
     def forecast(
         self,
-        series: List[TimeSeriesPoint],
+        series: TimeSeries,
         lookback: int,
         bucket_type: str,
         category_id: int,
         category_name: str,
+        merchant_id: Optional[int] = None,
     ) -> Tuple[Optional[float], Optional[str]]:
+        values, message = self.forecast_steps(series, 1, lookback, bucket_type, category_id, category_name)
+        return (values[0] if values is not None else None), message
+
+    def forecast_steps(
+        self, series: TimeSeries, steps: int, lookback: int, bucket_type: str,
+        category_id: int, category_name: str, merchant_id: Optional[int] = None,
+    ) -> Tuple[Optional[List[float]], Optional[str]]:
         if len(series) < 2:
             return None, "Not enough data for SES (needs 2+)"
         
         try:
             from statsmodels.tsa.api import SimpleExpSmoothing
-            values = [p.value for p in series]
-            model = SimpleExpSmoothing(values, initialization_method="estimated").fit()
-            return model.forecast(1)[0], None
+            model = SimpleExpSmoothing(series.values, initialization_method="estimated").fit()
+            return model.forecast(steps).tolist(), None
         except ImportError:
             raise HTTPException(status_code=501, detail="Statsmodels not installed")
         except Exception:
             return None, "SES calculation failed"
 
+    def forecast_steps_holdout(
+        self, series: TimeSeries, steps: int, lookback: int, bucket_type: str,
+        category_id: int, category_name: str, merchant_id: Optional[int] = None,
+    ) -> Tuple[Optional[List[float]], Optional[str], Optional[float]]:
+        """
+        forecast_steps plus the forecast of the last point from a fit on the points before it.
+        The fitted level is then rolled forward over the last point for the forecast.
+        """
+        if len(series) < 3:
+            values, message = self.forecast_steps(series, steps, lookback, bucket_type, category_id, category_name)
+            return values, message, None
+        
+        try:
+            from statsmodels.tsa.api import SimpleExpSmoothing
+            values = series.values
+            fitted = SimpleExpSmoothing(values[:-1], initialization_method="estimated").fit()
+            alpha = float(fitted.params["smoothing_level"])
+            holdout_value = float(fitted.forecast(1)[0])
+            level = alpha * float(values[-1]) + (1 - alpha) * holdout_value
+            return [level] * steps, None, holdout_value
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Statsmodels not installed")
+        except Exception:
+            return None, "SES calculation failed", None
+
+    def forecast_origins(
+        self, series: TimeSeries, origins: int, bucket_type: str, category_id: int, refit_every: int = 0
+    ) -> Dict[int, Optional[float]]:
+        """
+        Walk-forward one-step forecasts: {i: forecast of series[-i] made from series[:-i]} for i in 1..origins.
+        Fits at the earliest usable origin, then rolls the level forward with the fitted
+        alpha (level = alpha * y + (1 - alpha) * level); re-estimates every `refit_every` origins (0 = never).
+        """
+        values = series.values
+        n = len(values)
+        start = max(n - origins, 2)
+        forecasts: Dict[int, Optional[float]] = {i: None for i in range(1, origins + 1)}
+        try:
+            from statsmodels.tsa.api import SimpleExpSmoothing
+            for t in range(start, n):
+                if t == start or (refit_every and (t - start) % refit_every == 0):
+                    fitted = SimpleExpSmoothing(values[:t], initialization_method="estimated").fit()
+                    alpha = float(fitted.params["smoothing_level"])
+                    level = float(fitted.forecast(1)[0])
+                forecasts[n - t] = level
+                level = alpha * float(values[t]) + (1 - alpha) * level
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Statsmodels not installed")
+        except Exception:
+            pass
+        return forecasts
+
 class SeasonalNaiveModel:
     name = "snaive"
 
     def forecast(
         self,
-        series: List[TimeSeriesPoint],
+        series: TimeSeries,
         lookback: int,
         bucket_type: str,
         category_id: int,
         category_name: str,
+        merchant_id: Optional[int] = None,
     ) -> Tuple[Optional[float], Optional[str]]:
-        period = 7 if bucket_type == "DAY" else 52 if bucket_type == "WEEK" else 12
+        period = seasonal_period(bucket_type)
         
         if len(series) < period:
             return None, f"Not enough data for Seasonal Naive (needs {period}, has {len(series)})"
 
-        return series[-period].value, None
+        return float(series.values[-period]), None
+
+    def forecast_batch(
+        self, engine: BatchForecastEngine, lookback: int, bucket_type: str, offset: int = 0
+    ) -> Dict[int, Tuple[Optional[float], Optional[str]]]:
+        period = seasonal_period(bucket_type)
+        message = lambda has: f"Not enough data for Seasonal Naive (needs {period}, has {has})"
+        return _batch_results(engine, engine.snaive(period, offset), offset, message)
+
+    def forecast_steps(
+        self, series: TimeSeries, steps: int, lookback: int, bucket_type: str,
+        category_id: int, category_name: str, merchant_id: Optional[int] = None,
+    ) -> Tuple[Optional[List[float]], Optional[str]]:
+        period = seasonal_period(bucket_type)
+        if len(series) < period:
+            return None, f"Not enough data for Seasonal Naive (needs {period}, has {len(series)})"
+        # Step h repeats the value one (or more) seasons before it
+        return series.values[-period:][np.arange(steps) % period].tolist(), None
+
+    def forecast_batch_steps(
+        self, engine: BatchForecastEngine, lookback: int, bucket_type: str, steps: int
+    ) -> Dict[int, Tuple[Optional[List[float]], Optional[str]]]:
+        period = seasonal_period(bucket_type)
+        message = lambda has: f"Not enough data for Seasonal Naive (needs {period}, has {has})"
+        return _batch_step_results(engine, engine.snaive_steps(period, steps), 0, message)
 
 
 class ARIMAModel:
@@ -460,46 +991,151 @@ class ARIMAModel:
     Good for trending data with some autocorrelation.
     """
     name = "arima"
+    order = (1, 1, 1)
+    uses_lookback = False
+
+    def __init__(self, param_store: Optional[ArimaParamStore] = None):
+        self.param_store = param_store
 
     def forecast(
         self,
-        series: List[TimeSeriesPoint],
+        series: TimeSeries,
         lookback: int,
         bucket_type: str,
         category_id: int,
         category_name: str,
+        merchant_id: Optional[int] = None,
     ) -> Tuple[Optional[float], Optional[str]]:
+        values, message = self.forecast_steps(series, 1, lookback, bucket_type, category_id, category_name, merchant_id)
+        return (values[0] if values is not None else None), message
+
+    def _fit(self, values: np.ndarray, key, use_store: bool):
+        """
+        Fit ARIMA to `values` (call with warnings suppressed). Stored params of `key` are
+        re-applied with a Kalman filter pass when only a few points arrived since they were
+        optimised, or warm-start a full MLE fit otherwise (whose params are then stored).
+        """
+        from statsmodels.tsa.arima.model import ARIMA
+        
+        state = self.param_store.get(key) if use_store else None
+        # ARIMA(1,1,1) is a robust default:
+        # - p=1: One autoregressive term
+        # - d=1: First differencing (handles trends)
+        # - q=1: One moving average term
+        model = ARIMA(values, order=self.order)
+        if state is not None and self.param_store.can_reuse(state, len(values)):
+            # Only a few new points: re-run the Kalman filter with the stored params
+            return model.filter(state.params)
+        # Full MLE fit, warm-started from the stored params when available
+        fitted = model.fit(start_params=state.params if state is not None else None)
+        if use_store:
+            self.param_store.put(key, ArimaState(
+                params=np.asarray(fitted.params, dtype=np.float64),
+                nobs=len(values),
+                fitted_at=time.time(),
+            ))
+        return fitted
+
+    def forecast_steps(
+        self, series: TimeSeries, steps: int, lookback: int, bucket_type: str,
+        category_id: int, category_name: str, merchant_id: Optional[int] = None,
+    ) -> Tuple[Optional[List[float]], Optional[str]]:
         # ARIMA needs at least 10 observations for reasonable fitting
         if len(series) < 10:
             return None, f"Not enough data for ARIMA (needs 10+, has {len(series)})"
         
         try:
-            from statsmodels.tsa.arima.model import ARIMA
             import warnings
             
-            values = [p.value for p in series]
+            # Stored params of this series, if the caller identified it (see ForecastModel)
+            key = (merchant_id, category_id, bucket_type)
+            use_store = self.param_store is not None and merchant_id is not None
             
             # Suppress convergence warnings during fitting
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
+                fitted = self._fit(series.values, key, use_store)
                 
-                # ARIMA(1,1,1) is a robust default:
-                # - p=1: One autoregressive term
-                # - d=1: First differencing (handles trends)
-                # - q=1: One moving average term
-                model = ARIMA(values, order=(1, 1, 1))
-                fitted = model.fit()
-                
-                # Forecast one step ahead
-                forecast_value = fitted.forecast(steps=1)[0]
+                # Forecast all steps from the one fit
+                forecast_values = fitted.forecast(steps=steps)
                 
                 # Ensure non-negative (sales can't be negative)
-                forecast_value = max(0, forecast_value)
+                return [round(max(0, value), 2) for value in forecast_values], None
                 
-                return round(forecast_value, 2), None
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Statsmodels not installed")
+        except Exception as e:
+            logger.warning(f"ARIMA failed for category {category_id}: {e}")
+            return None, f"ARIMA calculation failed: {str(e)}"
+
+    def forecast_steps_holdout(
+        self, series: TimeSeries, steps: int, lookback: int, bucket_type: str,
+        category_id: int, category_name: str, merchant_id: Optional[int] = None,
+    ) -> Tuple[Optional[List[float]], Optional[str], Optional[float]]:
+        """
+        forecast_steps plus the forecast of the last point from a fit on the points before it.
+        The fitted model is then extended by the last point (params kept) for the forecast.
+        """
+        if len(series) < 11:
+            values, message = self.forecast_steps(
+                series, steps, lookback, bucket_type, category_id, category_name, merchant_id
+            )
+            return values, message, None
+        
+        try:
+            import warnings
+            
+            values = series.values
+            key = (merchant_id, category_id, bucket_type)
+            use_store = self.param_store is not None and merchant_id is not None
+            
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                fitted = self._fit(values[:-1], key, use_store)
+                holdout_value = fitted.forecast(steps=1)[0]
+                forecast_values = fitted.append(values[-1:]).forecast(steps=steps)
+                
+                return (
+                    [round(max(0, value), 2) for value in forecast_values],
+                    None,
+                    round(max(0, float(holdout_value)), 2),
+                )
                 
         except ImportError:
             raise HTTPException(status_code=501, detail="Statsmodels not installed")
         except Exception as e:
             logger.warning(f"ARIMA failed for category {category_id}: {e}")
-            return None, f"ARIMA calculation failed: {str(e)}"
\ No newline at end of file
+            return None, f"ARIMA calculation failed: {str(e)}", None
+
+    def forecast_origins(
+        self, series: TimeSeries, origins: int, bucket_type: str, category_id: int, refit_every: int = 0
+    ) -> Dict[int, Optional[float]]:
+        """
+        Walk-forward one-step forecasts: {i: forecast of series[-i] made from series[:-i]} for i in 1..origins.
+        Fits at the earliest usable origin, then extends the fitted state space model by one
+        observation per origin (Kalman filter step, params kept); every `refit_every` origins
+        (0 = never) the params are re-estimated, warm-started from the current ones.
+        """
+        values = series.values
+        n = len(values)
+        start = max(n - origins, 10)
+        forecasts: Dict[int, Optional[float]] = {i: None for i in range(1, origins + 1)}
+        try:
+            from statsmodels.tsa.arima.model import ARIMA
+            import warnings
+
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                fitted = None
+                for t in range(start, n):
+                    if fitted is None or (refit_every and (t - start) % refit_every == 0):
+                        start_params = fitted.params if fitted is not None else None
+                        fitted = ARIMA(values[:t], order=self.order).fit(start_params=start_params)
+                    elif t > start:
+                        fitted = fitted.extend(values[t - 1:t])
+                    forecasts[n - t] = round(max(0, fitted.forecast(steps=1)[0]), 2)
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Statsmodels not installed")
+        except Exception as e:
+            logger.warning(f"ARIMA walk-forward failed for category {category_id}: {e}")
+        return forecasts
\ No newline at end of file
@@ -0,0 +1,271 @@
+"""
+Merchant sharding across forecasting worker replicas.
+
+Every replica heartbeats into forecasting.worker_shards. Each cycle it builds a
+consistent-hash ring over the live replicas and forecasts the merchants that
+hash to itself, so adding a replica moves only ~1/N of the merchants and a dead
+replica's merchants spread over the survivors once its heartbeat expires.
+Ring views can briefly disagree while replicas join or leave, so a merchant is
+also leased per cycle in forecasting.merchant_leases with one conditional
+upsert: whichever replica claims it first forecasts it, the other skips it. A
+lease is kept alive by the holder's heartbeats and expires when it dies, so an
+unfinished merchant is picked up again in a later cycle.
+"""
+
+import bisect
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+from opentelemetry import trace
+
+from .config import (
+    WORKER_ID,
+    WORKER_LEASE_TTL_SECONDS,
+    WORKER_HEARTBEAT_SECONDS,
+    WORKER_CYCLE_SECONDS,
+    WORKER_RING_VNODES,
+)
+from .postgres_client import get_postgres_client
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+# Rows of replicas gone for this many lease TTLs are deleted by the heartbeat
+STALE_WORKER_TTLS = 10
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class ConsistentHashRing:
+    """
+    Hash ring with `vnodes` virtual nodes per worker; a key belongs to the first node clockwise.
+    """
+
+    def __init__(self, workers: Iterable[str], vnodes: int = WORKER_RING_VNODES):
+        points = sorted((_hash(f"{worker}#{i}"), worker) for worker in set(workers) for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._workers = [worker for _, worker in points]
+
+    def owner(self, key) -> Optional[str]:
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(str(key))) % len(self._hashes)
+        return self._workers[index]
+
+
+@dataclass
+class ShardAssignment:
+    cycle: int
+    workers: List[str]
+    # Merchants this replica owns on the ring
+    owned: Set[int] = field(default_factory=set)
+    # Owned merchants this replica has not forecast since it started owning them (refit in full)
+    acquired: Set[int] = field(default_factory=set)
+    # Merchants that moved to another replica since the last cycle
+    released: Set[int] = field(default_factory=set)
+
+
+class WorkerShardCoordinator:
+    """
+    Membership, merchant assignment and per-cycle leases of one worker replica.
+    """
+
+    def __init__(
+        self,
+        worker_id: str = WORKER_ID,
+        lease_ttl_seconds: int = WORKER_LEASE_TTL_SECONDS,
+        heartbeat_seconds: int = WORKER_HEARTBEAT_SECONDS,
+        cycle_seconds: int = WORKER_CYCLE_SECONDS,
+        vnodes: int = WORKER_RING_VNODES,
+    ):
+        self.worker_id = worker_id
+        self.lease_ttl_seconds = lease_ttl_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.cycle_seconds = cycle_seconds
+        self.vnodes = vnodes
+        self.cycle: Optional[int] = None
+        self.workers: List[str] = [worker_id]
+        # Every merchant with data (refreshed by full runs, extended by change scans)
+        self._merchants: Set[int] = set()
+        # Owned merchants this replica forecast while owning them
+        self._forecast: Set[int] = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.claimed = 0
+        self.contended = 0
+
+    def start(self):
+        """Register the replica and keep heartbeating in a background thread."""
+        self.heartbeat()
+        self._thread = threading.Thread(target=self._heartbeat_loop, name="shard-heartbeat", daemon=True)
+        self._thread.start()
+        logger.info(f"Worker {self.worker_id} joined the shard ring")
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_seconds):
+            self.heartbeat()
+
+    def heartbeat(self):
+        """Refresh this replica's heartbeat and extend the leases it still holds."""
+        try:
+            with get_postgres_client().cursor(commit=True) as cur:
+                cur.execute(
+                    """
+                    INSERT INTO forecasting.worker_shards (worker_id, started_at, heartbeat_at)
+                    VALUES (%s, now(), now())
+                    ON CONFLICT (worker_id) DO UPDATE SET heartbeat_at = now()
+                    """,
+                    (self.worker_id,),
+                )
+                cur.execute(
+                    """
+                    UPDATE forecasting.merchant_leases
+                    SET leased_until = now() + make_interval(secs => %s)
+                    WHERE worker_id = %s AND NOT completed AND leased_until > now()
+                    """,
+                    (self.lease_ttl_seconds, self.worker_id),
+                )
+                cur.execute(
+                    "DELETE FROM forecasting.worker_shards WHERE heartbeat_at < now() - make_interval(secs => %s)",
+                    (self.lease_ttl_seconds * STALE_WORKER_TTLS,),
+                )
+        except Exception as e:
+            logger.warning(f"Shard heartbeat of worker {self.worker_id} failed: {e}")
+
+    def assign(self, merchant_ids: Iterable[int], full: bool) -> ShardAssignment:
+        """
+        Start a cycle: read the live replicas and split the merchants on the ring.
+        `merchant_ids` are all merchants (full) or the ones changed since the last run.
+        """
+        with tracer.start_as_current_span("shard.assign") as span:
+            with get_postgres_client().cursor() as cur:
+                cur.execute("SELECT floor(extract(epoch FROM now()) / %s)::bigint AS cycle", (self.cycle_seconds,))
+                cycle = cur.fetchone()["cycle"]
+                cur.execute(
+                    """
+                    SELECT worker_id FROM forecasting.worker_shards
+                    WHERE heartbeat_at > now() - make_interval(secs => %s)
+                    """,
+                    (self.lease_ttl_seconds,),
+                )
+                workers = sorted({row["worker_id"] for row in cur.fetchall()} | {self.worker_id})
+
+            if full:
+                self._merchants = set(merchant_ids)
+            else:
+                self._merchants.update(merchant_ids)
+            ring = ConsistentHashRing(workers, self.vnodes)
+            owned = {merchant_id for merchant_id in self._merchants if ring.owner(merchant_id) == self.worker_id}
+            released = self._forecast - owned
+            self._forecast &= owned
+            self.cycle = cycle
+            self.workers = workers
+
+            span.set_attribute("shard.cycle", cycle)
+            span.set_attribute("shard.workers", len(workers))
+            span.set_attribute("shard.owned", len(owned))
+        if released:
+            logger.info(f"{len(released)} merchants moved to other workers")
+        return ShardAssignment(cycle, workers, owned, owned - self._forecast, released)
+
+    def claim(self, merchant_ids: Iterable[int]) -> Set[int]:
+        """
+        Lease merchants for the current cycle. A merchant is granted unless another replica
+        holds a live lease on it or it was already forecast in this cycle.
+        """
+        ids = sorted(merchant_ids)
+        if not ids:
+            return set()
+        with tracer.start_as_current_span("shard.claim") as span:
+            with get_postgres_client().cursor(commit=True) as cur:
+                cur.execute(
+                    """
+                    INSERT INTO forecasting.merchant_leases AS l (merchant_id, worker_id, cycle, leased_until, completed)
+                    SELECT merchant_id, %(worker_id)s, %(cycle)s, now() + make_interval(secs => %(ttl)s), FALSE
+                    FROM unnest(%(merchant_ids)s::bigint[]) AS merchant_id
+                    ON CONFLICT (merchant_id) DO UPDATE
+                    SET worker_id = EXCLUDED.worker_id, cycle = EXCLUDED.cycle,
+                        leased_until = EXCLUDED.leased_until, completed = FALSE
+                    WHERE (l.cycle < EXCLUDED.cycle OR NOT l.completed)
+                      AND (l.completed OR l.leased_until < now() OR l.worker_id = EXCLUDED.worker_id)
+                    RETURNING merchant_id
+                    """,
+                    {"worker_id": self.worker_id, "cycle": self.cycle, "ttl": self.lease_ttl_seconds, "merchant_ids": ids},
+                )
+                claimed = {row["merchant_id"] for row in cur.fetchall()}
+            span.set_attribute("shard.requested", len(ids))
+            span.set_attribute("shard.claimed", len(claimed))
+        # Not forecast by this replica now (a peer holds it, or it was already done this cycle):
+        # its changes are past this run's watermark, so it is refitted in full once leased again
+        self._forecast -= set(ids) - claimed
+        self.claimed += len(claimed)
+        self.contended += len(ids) - len(claimed)
+        if len(claimed) < len(ids):
+            logger.info(f"{len(ids) - len(claimed)} merchants are leased by other workers or done in cycle {self.cycle}")
+        return claimed
+
+    def complete(self, merchant_id: int):
+        """Mark a merchant's forecasts of the current cycle as stored."""
+        with get_postgres_client().cursor(commit=True) as cur:
+            cur.execute(
+                """
+                UPDATE forecasting.merchant_leases SET completed = TRUE, leased_until = now()
+                WHERE merchant_id = %s AND worker_id = %s AND cycle = %s
+                """,
+                (merchant_id, self.worker_id, self.cycle),
+            )
+            if cur.rowcount == 0:
+                logger.warning(f"Lease of merchant {merchant_id} was lost before its forecasts were stored")
+        self._forecast.add(merchant_id)
+
+    def release(self, merchant_ids: Optional[Iterable[int]] = None):
+        """
+        Let unfinished leases of this replica expire now (failed run, deferred merchants or shutdown).
+        All of them by default.
+        """
+        try:
+            with get_postgres_client().cursor(commit=True) as cur:
+                if merchant_ids is None:
+                    cur.execute(
+                        """
+                        UPDATE forecasting.merchant_leases SET leased_until = now()
+                        WHERE worker_id = %s AND NOT completed
+                        """,
+                        (self.worker_id,),
+                    )
+                else:
+                    cur.execute(
+                        """
+                        UPDATE forecasting.merchant_leases SET leased_until = now()
+                        WHERE worker_id = %s AND NOT completed AND merchant_id = ANY(%s::bigint[])
+                        """,
+                        (self.worker_id, sorted(merchant_ids)),
+                    )
+        except Exception as e:
+            logger.warning(f"Could not release the leases of worker {self.worker_id}: {e}")
+
+    def stop(self):
+        """Leave the ring: stop heartbeating, release leases and deregister."""
+        self._stop.set()
+        self.release()
+        try:
+            with get_postgres_client().cursor(commit=True) as cur:
+                cur.execute("DELETE FROM forecasting.worker_shards WHERE worker_id = %s", (self.worker_id,))
+        except Exception as e:
+            logger.warning(f"Could not deregister worker {self.worker_id}: {e}")
+        logger.info(f"Worker {self.worker_id} left the shard ring")
+
+    def stats(self) -> Dict:
+        return {
+            "worker_id": self.worker_id,
+            "cycle": self.cycle,
+            "workers": len(self.workers),
+            "merchants_known": len(self._merchants),
+            "claimed": self.claimed,
+            "contended": self.contended,
+        }
@@ -0,0 +1,112 @@
+"""
+Time series domain types for the forecasting service.
+
+TimeSeries keeps a category's buckets as two parallel NumPy arrays
+(datetime64[ms] bucket starts, float64 values) instead of one Python object
+per bucket. Slicing returns views, so training windows and walk-forward
+splits never copy the underlying data.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Union
+
+import numpy as np
+
+BUCKET_DTYPE = "datetime64[ms]"  # Matches ClickHouse DateTime64(3)
+
+# Fixed-length bucket steps; MONTH buckets step by calendar month
+BUCKET_STEPS = {"DAY": np.timedelta64(1, "D"), "WEEK": np.timedelta64(7, "D")}
+
+
+@dataclass
+class TimeSeriesPoint:
+    bucket_start: datetime
+    value: float
+
+
+class TimeSeries:
+    """
+    Compact, array-backed series of (bucket_start, value) pairs ordered by bucket_start.
+    """
+
+    __slots__ = ("bucket_starts", "values")
+
+    def __init__(self, bucket_starts, values):
+        # np.asarray is a no-op for arrays that already have the right dtype (zero-copy)
+        self.bucket_starts = np.asarray(bucket_starts, dtype=BUCKET_DTYPE)
+        self.values = np.asarray(values, dtype=np.float64)
+        if self.bucket_starts.shape != self.values.shape:
+            raise ValueError(
+                f"bucket_starts and values must align ({self.bucket_starts.shape} != {self.values.shape})"
+            )
+
+    @classmethod
+    def empty(cls) -> "TimeSeries":
+        return cls(np.empty(0, dtype=BUCKET_DTYPE), np.empty(0, dtype=np.float64))
+
+    @classmethod
+    def from_points(cls, points: Iterable[TimeSeriesPoint]) -> "TimeSeries":
+        points = list(points)
+        return cls(
+            np.array([p.bucket_start for p in points], dtype=BUCKET_DTYPE),
+            np.array([p.value for p in points], dtype=np.float64),
+        )
+
+    def __len__(self) -> int:
+        return self.values.shape[0]
+
+    def __getitem__(self, key: Union[int, slice]) -> Union["TimeSeries", TimeSeriesPoint]:
+        if isinstance(key, slice):
+            return TimeSeries(self.bucket_starts[key], self.values[key])
+        return TimeSeriesPoint(
+            bucket_start=self.bucket_starts[key].astype(datetime),
+            value=float(self.values[key]),
+        )
+
+    def __iter__(self) -> Iterator[TimeSeriesPoint]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self) -> str:
+        return f"TimeSeries(len={len(self)})"
+
+    @property
+    def last_bucket_start(self) -> datetime:
+        return self.bucket_starts[-1].astype(datetime)
+
+
+def split_series(keys: np.ndarray, bucket_starts: np.ndarray, values: np.ndarray) -> Dict[int, TimeSeries]:
+    """
+    Split columns sorted by (key, bucket_start) into one TimeSeries per key.
+    Each series is a view into the input arrays.
+    """
+    keys = np.asarray(keys)
+    if len(keys) == 0:
+        return {}
+    bucket_starts = np.asarray(bucket_starts, dtype=BUCKET_DTYPE)
+    values = np.asarray(values, dtype=np.float64)
+
+    boundaries = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(keys)]))
+    return {
+        int(keys[start]): TimeSeries(bucket_starts[start:end], values[start:end])
+        for start, end in zip(starts, ends)
+    }
+
+
+def future_bucket_starts(last_bucket_start, bucket_type: str, steps: int) -> List[datetime]:
+    """
+    Bucket starts of the `steps` buckets after `last_bucket_start`.
+    MONTH buckets start on the first of the month.
+    """
+    last = np.datetime64(last_bucket_start, "ms")
+    offsets = np.arange(1, steps + 1)
+    if bucket_type == "MONTH":
+        starts = (last.astype("datetime64[M]") + offsets).astype(BUCKET_DTYPE)
+    elif bucket_type in BUCKET_STEPS:
+        starts = last + offsets * BUCKET_STEPS[bucket_type].astype("timedelta64[ms]")
+    else:
+        raise ValueError(f"Unknown bucket type: {bucket_type}")
+    return starts.astype(datetime).tolist()
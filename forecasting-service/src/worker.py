@@ -1,8 +1,9 @@
 import time
 import os
 import logging
-import json
 from datetime import datetime
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Tuple
 from apscheduler.schedulers.blocking import BlockingScheduler
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
@@ -11,8 +12,45 @@ from opentelemetry.exporter.zipkin.json import ZipkinExporter
 from opentelemetry.sdk.resources import Resource
 
 from src.service import ForecastingService
+from src.timeseries import TimeSeries
 from src.clickhouse_client import get_clickhouse_client
-from src.db import get_distinct_merchants
+from src.db import (
+    get_distinct_merchants,
+    get_agg_watermark,
+    fetch_changed_categories,
+    stream_merchant_series,
+    model_selection_columns,
+    forecast_columns,
+    fetch_forecast_ages,
+)
+from src.config import (
+    WORKER_PROCESSES,
+    WORKER_CHUNKS_PER_PROCESS,
+    WORKER_INCREMENTAL,
+    WATERMARK_LAG_SECONDS,
+    FULL_REFRESH_EVERY_RUNS,
+    WORKER_INCREMENTAL_MAX_MERCHANTS,
+    WORKER_BULK_FETCH,
+    WORKER_FETCH_PARTITIONS,
+    WORKER_FETCH_BATCH,
+    WORKER_FETCH_THREADS,
+    WORKER_FIT_THREADS,
+    WORKER_WRITE_THREADS,
+    WORKER_FIT_QUEUE_SIZE,
+    WORKER_FIT_BATCH,
+    WORKER_WRITE_QUEUE_SIZE,
+    WORKER_MODEL_SELECTION,
+    FORECAST_HORIZONS,
+    ARIMA_PARAMS_PERSIST,
+    WORKER_SHARDING,
+    WORKER_PRIORITY,
+)
+from src.parallel import ParallelFitRunner
+from src.incremental import IncrementalForecastState, ForecastPlan
+from src.sharding import WorkerShardCoordinator
+from src.priority import PriorityScheduler, merge_plans
+from src.pipeline import Stage, StagePipeline
+from src.write_buffer import ColumnarWriteBuffer
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
@@ -30,77 +68,328 @@ tracer = trace.get_tracer(__name__)
 service = ForecastingService()
 ch_client = get_clickhouse_client()
 
+# Optional process pool for the per-category fits (SES, ARIMA)
+fit_runner = (
+    ParallelFitRunner(
+        service.per_category_models,
+        WORKER_PROCESSES,
+        WORKER_CHUNKS_PER_PROCESS,
+        param_stores={"arima": service.arima_params},
+    )
+    if WORKER_PROCESSES != 1 else None
+)
+
+# Watermark + last results for incremental runs
+incremental_state = (
+    IncrementalForecastState(WATERMARK_LAG_SECONDS, FULL_REFRESH_EVERY_RUNS, WORKER_INCREMENTAL_MAX_MERCHANTS)
+    if WORKER_INCREMENTAL else None
+)
+
+# Merchant split with the other worker replicas
+shard_coordinator = WorkerShardCoordinator() if WORKER_SHARDING else None
+
+# Priority order and time budget of each cycle
+priority_scheduler = PriorityScheduler() if WORKER_PRIORITY else None
+
+# Rows of many merchants go into one insert per table
+forecast_buffer = ColumnarWriteBuffer('category_sales_forecast')
+selection_buffer = ColumnarWriteBuffer('category_model_selection')
+
+LOOKBACK = 28
+BUCKET_TYPE = "DAY"
+HORIZON = FORECAST_HORIZONS[BUCKET_TYPE]
+
+
+def save_forecasts(merchant_id: int, results: dict, batch_timestamp: datetime, on_flushed=None) -> int:
+    """
+    Buffer one merchant's model results for ClickHouse; `on_flushed` runs once they are written.
+    Returns the number of rows.
+    """
+    row_id = int(datetime.now().timestamp() * 1000000)
+    # One row per (category, model); the horizon goes into the forecast_dates / forecast_values arrays
+    columns = forecast_columns(merchant_id, results, batch_timestamp, row_id)
+    rows = forecast_buffer.add(columns, on_flushed=on_flushed)
+    
+    logger.info(f"Generated {rows} forecasts for merchant {merchant_id}")
+    return rows
+
+
+def plan_run() -> Tuple[Optional[ForecastPlan], Optional[int], bool]:
+    """
+    Decide which series to refit. Returns (plan, watermark_ms, full_run).
+    A None plan means every merchant, discovered by the bulk scan itself; sharding and the priority
+    scheduler need the merchant list up front, so with either a full run fetches planned batches.
+    The watermark is read before any series, so rows written during the run are picked up next time.
+    """
+    full_run = incremental_state is None or incremental_state.needs_full_run()
+    if full_run:
+        watermark_ms = get_agg_watermark(BUCKET_TYPE) if incremental_state is not None else None
+        if WORKER_BULK_FETCH and shard_coordinator is None and priority_scheduler is None:
+            return None, watermark_ms, True
+        plan = {merchant_id: None for merchant_id in get_distinct_merchants()}
+    else:
+        plan, watermark_ms = fetch_changed_categories(BUCKET_TYPE, incremental_state.since_ms())
+
+    if priority_scheduler is not None:
+        # Merchants deferred by earlier cycles (their changes are already past the watermark)
+        plan = merge_plans(plan, priority_scheduler.take_backlog())
+    if shard_coordinator is not None:
+        plan = shard_plan(plan, full_run)
+    if not full_run:
+        # Merchants whose previous results were dropped have nothing to carry forward
+        plan = incremental_state.widen(plan)
+    if priority_scheduler is not None:
+        plan, deferred = priority_scheduler.select(plan)
+        if deferred and shard_coordinator is not None:
+            shard_coordinator.release(deferred)
+    return plan, watermark_ms, full_run
+
+
+def shard_plan(plan: ForecastPlan, full_run: bool) -> ForecastPlan:
+    """
+    This replica's part of the plan: the merchants it owns on the ring and could lease for the cycle.
+    Merchants it has not forecast since it started owning them (a replica joined or died, or a
+    peer held the lease) are refitted in full, so none of their changes are missed.
+    """
+    assignment = shard_coordinator.assign(plan.keys(), full=full_run)
+    if incremental_state is not None:
+        incremental_state.drop(assignment.released)
+    owned_plan = {merchant_id: plan[merchant_id] for merchant_id in assignment.owned if merchant_id in plan}
+    owned_plan.update({merchant_id: None for merchant_id in assignment.acquired})
+    claimed = shard_coordinator.claim(owned_plan)
+    logger.info(
+        f"Shard cycle {assignment.cycle}: {len(assignment.workers)} workers, {len(assignment.owned)} merchants owned, "
+        f"{len(assignment.acquired)} acquired, {len(claimed)} leased"
+    )
+    return {merchant_id: owned_plan[merchant_id] for merchant_id in claimed}
+
+
+def fetch_units(plan: Optional[ForecastPlan]) -> List[Tuple[Optional[List[int]], Optional[int]]]:
+    """
+    Work items of the fetch stage as (merchant_ids, partition): the hash partitions of the
+    full bulk scan (no plan), or batches of the planned merchants in plan (priority) order.
+    """
+    if plan is None:
+        return [(None, partition) for partition in range(WORKER_FETCH_PARTITIONS)]
+    merchant_ids = list(plan)
+    return [(merchant_ids[i:i + WORKER_FETCH_BATCH], None) for i in range(0, len(merchant_ids), WORKER_FETCH_BATCH)]
+
+
+def fetch_unit(plan: Optional[ForecastPlan], unit) -> Iterator[Tuple[int, Dict[int, TimeSeries]]]:
+    """
+    Fetch stage: yield (merchant_id, {category_id: series}) for the planned series of one
+    fetch unit, in one streamed scan (bulk fetch) or one query per merchant.
+    Planned batches are yielded in plan order, so the priority order reaches the fit stage.
+    """
+    merchant_ids, partition = unit
+    if not WORKER_BULK_FETCH:
+        for merchant_id in merchant_ids:
+            yield merchant_id, service._fetch_series(merchant_id, BUCKET_TYPE, category_ids=plan[merchant_id])
+        return
+
+    if merchant_ids is None:
+        merchant_series = stream_merchant_series(BUCKET_TYPE, None, WORKER_FETCH_PARTITIONS, partition=partition)
+    else:
+        # The scan returns the batch by merchant_id; buffer it to restore the plan order
+        fetched = dict(stream_merchant_series(BUCKET_TYPE, merchant_ids))
+        merchant_series = (
+            (merchant_id, fetched.pop(merchant_id)) for merchant_id in merchant_ids if merchant_id in fetched
+        )
+    for merchant_id, category_series in merchant_series:
+        category_ids = plan.get(merchant_id) if plan is not None else None
+        if category_ids is not None:
+            category_series = {cid: series for cid, series in category_series.items() if cid in category_ids}
+        yield merchant_id, category_series
+
+
+def fit_merchants(plan: Optional[ForecastPlan], items: List[Tuple[int, Dict[int, TimeSeries]]]):
+    """
+    Fit stage: run all models for a batch of merchants and select their model=auto winners.
+    The batch's SES/ARIMA fits go to the process pool (if any) in one call, so its chunks span
+    merchants; each merchant is passed on as soon as its own fits are back.
+    Batches reaching this stage after the priority scheduler's time budget ran out are deferred.
+    """
+    if priority_scheduler is not None and priority_scheduler.over_budget():
+        priority_scheduler.defer({merchant_id: plan[merchant_id] for merchant_id, _ in items})
+        return
+    merchant_series = dict(items)
+    # SES/ARIMA are fitted once per category; the same fits give the selection's holdout forecasts
+    if fit_runner is not None:
+        fitted_merchants = fit_runner.fit(merchant_series, LOOKBACK, BUCKET_TYPE, HORIZON)
+    else:
+        fitted_merchants = (
+            (merchant_id, *service.fit_per_category_models(merchant_id, series, LOOKBACK, BUCKET_TYPE, HORIZON))
+            for merchant_id, series in merchant_series.items()
+        )
+    for merchant_id, fitted, holdouts in fitted_merchants:
+        series = merchant_series[merchant_id]
+        results = service.run_all_models(
+            merchant_id=merchant_id,
+            category_series=series,
+            lookback=LOOKBACK,
+            limit=100,
+            fitted=fitted,
+            horizon=HORIZON,
+        )
+        selection = service.select_models(series, BUCKET_TYPE, holdouts) if WORKER_MODEL_SELECTION else None
+        yield merchant_id, series, results, selection
+
+
+def write_merchant(plan: Optional[ForecastPlan], batch_timestamp: datetime, item):
+    """
+    Write stage: complete the merchant's results with carried-forward categories and buffer them
+    and its model selection for the batched inserts.
+    """
+    merchant_id, series, results, selection = item
+    if incremental_state is not None:
+        results = incremental_state.merge(merchant_id, results, full=plan is None or plan[merchant_id] is None)
+    # The lease is completed once the merchant's rows are flushed
+    on_flushed = partial(shard_coordinator.complete, merchant_id) if shard_coordinator is not None else None
+    rows = save_forecasts(merchant_id, results, batch_timestamp, on_flushed)
+    selection_rows = 0
+    if selection is not None:
+        selection_rows = selection_buffer.add(
+            model_selection_columns(merchant_id, BUCKET_TYPE, selection, batch_timestamp)
+        )
+    return merchant_id, series, rows, selection_rows
+
+
+def forecast_pipeline(plan: Optional[ForecastPlan], batch_timestamp: datetime) -> StagePipeline:
+    """
+    Fetch -> fit -> write stages of one run, each with its own threads and bounded input queue,
+    so ClickHouse reads and writes overlap with model fitting.
+    """
+    fit_threads = WORKER_FIT_THREADS or (fit_runner.processes if fit_runner is not None else 1)
+    return StagePipeline([
+        Stage("fetch", partial(fetch_unit, plan), WORKER_FETCH_THREADS, queue_size=WORKER_FETCH_THREADS, expand=True),
+        Stage("fit", partial(fit_merchants, plan), fit_threads, WORKER_FIT_QUEUE_SIZE, expand=True, batch_size=WORKER_FIT_BATCH),
+        Stage("write", partial(write_merchant, plan, batch_timestamp), WORKER_WRITE_THREADS, WORKER_WRITE_QUEUE_SIZE),
+    ])
+
+
 def run_forecast_job():
     """
     Periodic job to generate forecasts for all categories across all merchants.
     """
-    with tracer.start_as_current_span("task forecast-generation"):
+    with tracer.start_as_current_span("task forecast-generation") as span:
         logger.info("Starting scheduled forecast generation job...")
         
         try:
-            # 1. Get all merchants that have aggregated sales data (from ClickHouse)
-            merchant_ids = get_distinct_merchants()
+            # 1. Find the merchants/categories to forecast (all, or only changed ones)
+            plan, watermark_ms, full_run = plan_run()
+            span.set_attribute("forecast.full_run", full_run)
             
-            if not merchant_ids:
-                logger.info("No merchants with data found. Skipping forecast generation.")
+            if plan is not None and not plan:
+                if full_run and shard_coordinator is None:
+                    logger.info("No merchants with data found. Skipping forecast generation.")
+                else:
+                    logger.info("No aggregate changes for this worker since last run. Forecasts are up to date.")
+                    if incremental_state is not None:
+                        incremental_state.complete_run(watermark_ms, full_run, set())
                 return
             
-            logger.info(f"Generating forecasts for {len(merchant_ids)} merchants: {merchant_ids}")
+            if plan is None:
+                logger.info("Generating forecasts for all merchants (full run, bulk fetch)")
+            else:
+                logger.info(f"Generating forecasts for {len(plan)} merchants ({'full' if full_run else 'incremental'} run): {list(plan)}")
+            if fit_runner is not None:
+                span.set_attribute("worker.processes", fit_runner.processes)
             
             # Use a single batch timestamp for all forecasts in this run
             batch_timestamp = datetime.now()
             
             total_count = 0
-            for merchant_id in merchant_ids:
-                # 2. Run models for this merchant
-                results = service.run_all_models(merchant_id=merchant_id, category_series=None, lookback=28, limit=100)
-                
-                # 3. Store results in ClickHouse
-                data = []
-                columns = ['id', 'merchant_id', 'category_id', 'model_name', 
-                           'generated_at', 'forecast_horizon', 'forecasted_values', 'mae']
-                
-                row_id = int(datetime.now().timestamp() * 1000000)
-                
-                for category_id, category_data in results.items():
-                    models = category_data["models"]
-                    
-                    for model_name, forecast_data in models.items():
-                        if forecast_data.forecast:
-                            next_point = forecast_data.forecast[0]
-                            value = next_point.value
-                            horizon = 1
-                            
-                            forecast_json = json.dumps([{"date": str(next_point.bucket_start), "value": value}])
-                            
-                            data.append([
-                                row_id,
-                                merchant_id,
-                                category_id,
-                                model_name,
-                                batch_timestamp,
-                                horizon,
-                                forecast_json,
-                                forecast_data.mae
-                            ])
-                            row_id += 1
-                
-                if data:
-                    ch_client.insert('category_sales_forecast', data, columns)
-                
-                total_count += len(data)
-                logger.info(f"Generated {len(data)} forecasts for merchant {merchant_id}")
+            selection_count = 0
+            merchant_ids = set()
+            for buffer in (forecast_buffer, selection_buffer):
+                buffer.reset_max_depth()
+            # 2. Fetch, fit and store each merchant in the pipeline
+            pipeline = forecast_pipeline(plan, batch_timestamp)
+            for merchant_id, series, rows, selection_rows in pipeline.run(fetch_units(plan)):
+                merchant_ids.add(merchant_id)
+                total_count += rows
+                selection_count += selection_rows
+                if priority_scheduler is not None:
+                    priority_scheduler.record(
+                        merchant_id, series, batch_timestamp.timestamp(), full=plan is None or plan[merchant_id] is None
+                    )
+            
+            # Write what is still buffered before the run counts as stored
+            forecast_buffer.flush()
+            selection_buffer.flush()
+            for buffer in (forecast_buffer, selection_buffer):
+                buffer_stats = buffer.stats()
+                span.set_attribute(f"write_buffer.{buffer.table}.flushes", buffer_stats["flushes"])
+                span.set_attribute(f"write_buffer.{buffer.table}.max_depth_rows", buffer_stats["max_depth_rows"])
+                logger.info(f"Write buffer: {buffer_stats}")
+            
+            stages = pipeline.summary()
+            for stage_name, stage in stages.items():
+                span.set_attribute(f"pipeline.{stage_name}.busy_seconds", stage["busy_seconds"])
+                span.set_attribute(f"pipeline.{stage_name}.blocked_seconds", stage["blocked_seconds"])
+            logger.info(f"Pipeline stages: {stages}")
+            deferred = stages["fit"]["processed"] - stages["fit"]["emitted"]
+            if deferred:
+                logger.info(f"Time budget exhausted, deferred {deferred} merchants to the next cycle")
+            
+            span.set_attribute("forecast.merchant_count", len(merchant_ids))
+            if plan is None and not merchant_ids:
+                logger.info("No merchants with data found. No forecasts generated.")
+            
+            if incremental_state is not None:
+                incremental_state.complete_run(watermark_ms, full_run, merchant_ids)
+            
+            if priority_scheduler is not None:
+                priority_scheduler.finish()
+                if shard_coordinator is not None and priority_scheduler.backlog:
+                    # Deferred merchants may be leased by whichever replica owns them next cycle
+                    shard_coordinator.release(priority_scheduler.backlog)
+                ages = priority_scheduler.age_summary()
+                span.set_attribute("forecast.deferred", ages.get("deferred", 0))
+                span.set_attribute("forecast.age_max_seconds", ages.get("max_seconds", 0.0))
+                logger.info(f"Forecast age: {ages}")
+            
+            # 3. Persist refreshed ARIMA params so a restarted worker starts warm
+            if service.arima_params is not None and ARIMA_PARAMS_PERSIST:
+                saved_params = service.arima_params.flush(ch_client)
+                logger.info(f"Persisted {saved_params} ARIMA parameter sets.")
             
+            if WORKER_MODEL_SELECTION:
+                logger.info(f"Stored model selection for {selection_count} series.")
             logger.info(f"Forecast job completed. Generated {total_count} total forecast records.")
 
         except Exception as e:
             logger.error(f"Forecast job failed: {e}")
+            # Rows of the failed run are dropped; its merchants are refitted by the next run
+            forecast_buffer.discard()
+            selection_buffer.discard()
+            if priority_scheduler is not None:
+                # Merchants deferred by earlier cycles are planned again next cycle
+                priority_scheduler.restore()
+            if shard_coordinator is not None:
+                # Unfinished merchants can be leased again right away
+                shard_coordinator.release()
             # Span will automatically record exception
 
 if __name__ == "__main__":
     # Wait for DB to be ready
     time.sleep(5) 
     
+    if service.arima_params is not None and ARIMA_PARAMS_PERSIST:
+        try:
+            service.arima_params.load(ch_client)
+        except Exception as e:
+            logger.warning(f"Could not load stored ARIMA params, starting cold: {e}")
+    
+    if shard_coordinator is not None:
+        shard_coordinator.start()
+    
+    if priority_scheduler is not None:
+        try:
+            priority_scheduler.load_ages(fetch_forecast_ages())
+        except Exception as e:
+            logger.warning(f"Could not load forecast ages, treating merchants as never forecast: {e}")
+    
     scheduler = BlockingScheduler()
     
     # Run immediately on startup, then every 60 seconds
@@ -118,3 +407,8 @@ if __name__ == "__main__":
         scheduler.start()
     except (KeyboardInterrupt, SystemExit):
         pass
+    finally:
+        if fit_runner is not None:
+            fit_runner.shutdown()
+        if shard_coordinator is not None:
+            shard_coordinator.stop()
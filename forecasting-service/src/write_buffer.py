@@ -0,0 +1,242 @@
+"""
+Buffered, batched ClickHouse inserts for the forecasting worker.
+
+Every merchant produces a few dozen forecast rows. Inserted one merchant at a
+time they become one tiny part each, which ClickHouse has to merge away and
+throttles ("too many parts") when they arrive faster than it merges. The
+buffer collects column-oriented rows across merchants and writes them as one
+large insert once it holds `max_rows` rows or its oldest row is `max_seconds`
+old (and at the end of every worker run).
+
+A failed flush is retried with the same insert_deduplication_token, so a
+retry of an insert that did reach the server is dropped by ClickHouse instead
+of duplicating the rows. A batch whose retries are exhausted stays in the
+buffer with its token and is tried again first by the next flush. Callbacks
+registered with the rows (e.g. completing a merchant's lease) run only after
+the rows were written.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from opentelemetry import trace
+
+from .clickhouse_client import get_clickhouse_client
+from .config import (
+    WORKER_WRITE_BUFFER_ROWS,
+    WORKER_WRITE_BUFFER_SECONDS,
+    WORKER_ASYNC_INSERT,
+    WORKER_INSERT_RETRIES,
+    WORKER_INSERT_RETRY_BACKOFF_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+tracer = trace.get_tracer(__name__)
+
+# (columns, rows, callbacks, insert_deduplication_token) of one flush
+Batch = Tuple[Dict[str, list], int, List[Callable[[], None]], str]
+
+
+class ColumnarWriteBuffer:
+    """
+    Collects column-oriented rows for one table and flushes them as large inserts. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        table: str,
+        max_rows: int = WORKER_WRITE_BUFFER_ROWS,
+        max_seconds: float = WORKER_WRITE_BUFFER_SECONDS,
+        async_insert: bool = WORKER_ASYNC_INSERT,
+        retries: int = WORKER_INSERT_RETRIES,
+        retry_backoff_seconds: float = WORKER_INSERT_RETRY_BACKOFF_SECONDS,
+    ):
+        self.table = table
+        self.max_rows = max_rows  # 0 = flush on every add
+        self.max_seconds = max_seconds  # 0 = no time-based flush
+        self.async_insert = async_insert
+        self.retries = retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self._columns: Dict[str, list] = {}
+        self._rows = 0
+        self._callbacks: List[Callable[[], None]] = []
+        self._oldest: Optional[float] = None
+        # Batch of a failed flush, kept (with its token) until an insert succeeds
+        self._failed_batch: Optional[Batch] = None
+        self._lock = threading.Lock()
+        # One flush at a time, so batches reach the table in the order they were buffered
+        self._flush_lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+        self._flusher: Optional[threading.Thread] = None
+        # Metrics (max_depth since reset_max_depth(), the others since start)
+        self.max_depth = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.retried = 0
+        self.failed = 0
+        self.last_flush_seconds = 0.0
+
+    def add(self, columns: Dict[str, list], on_flushed: Optional[Callable[[], None]] = None) -> int:
+        """
+        Buffer rows ({column_name: values}, all columns of the table's insert, same order every call).
+        `on_flushed` runs once they are written. Flushes when the buffer is full.
+        Raises the error of a failed background flush. Returns the number of rows added.
+        """
+        self._raise_background_error()
+        rows = len(next(iter(columns.values()), []))
+        with self._lock:
+            if rows:
+                for name, values in columns.items():
+                    self._columns.setdefault(name, []).extend(values)
+                self._rows += rows
+                if self._oldest is None:
+                    self._oldest = time.monotonic()
+            if on_flushed is not None:
+                self._callbacks.append(on_flushed)
+            full = self._rows >= self.max_rows
+            self.max_depth = max(self.max_depth, self._depth())
+        if full:
+            self.flush()
+        elif self.max_seconds:
+            self._ensure_flusher()
+        return rows
+
+    def flush(self) -> int:
+        """
+        Write everything buffered as one insert, retrying with the same deduplication token.
+        Rows of a failed insert stay buffered and their callbacks do not run. Returns the rows written.
+        """
+        return self._flush(background=False)
+
+    def _flush(self, background: bool) -> int:
+        with self._flush_lock:
+            if not background:
+                self._raise_background_error()
+            with self._lock:
+                batches = [self._failed_batch] if self._failed_batch is not None else []
+                if self._rows or self._callbacks:
+                    batches.append((self._columns, self._rows, self._callbacks, uuid.uuid4().hex))
+                oldest = self._oldest
+                self._columns, self._rows, self._callbacks, self._oldest = {}, 0, [], None
+                self._failed_batch = None
+            written: List[Batch] = []
+            for index, (columns, rows, callbacks, token) in enumerate(batches):
+                if rows:
+                    try:
+                        self._insert(columns, rows, token)
+                    except Exception:
+                        self._keep_failed(batches[index:], oldest)
+                        self._run_callbacks(written)
+                        raise
+                written.append(batches[index])
+        self._run_callbacks(written)
+        return sum(rows for _, rows, _, _ in written)
+
+    def _keep_failed(self, batches: List[Batch], oldest: Optional[float]):
+        """Keep unwritten batches for the next flush: the first as it was sent (same token), the rest merged."""
+        failed, rest = batches[0], batches[1:]
+        with self._lock:
+            for columns, rows, callbacks, _ in rest:
+                # Not sent yet; go back in front of the rows buffered meanwhile
+                for name, values in columns.items():
+                    self._columns[name] = values + self._columns.get(name, [])
+                self._rows += rows
+                self._callbacks[:0] = callbacks
+            self._failed_batch = failed
+            self._oldest = oldest if oldest is not None else time.monotonic()
+
+    @staticmethod
+    def _run_callbacks(batches: List[Batch]):
+        for _, _, callbacks, _ in batches:
+            for callback in callbacks:
+                callback()
+
+    def _depth(self) -> int:
+        return self._rows + (self._failed_batch[1] if self._failed_batch is not None else 0)
+
+    def _insert(self, columns: Dict[str, list], rows: int, token: str):
+        settings = {"insert_deduplication_token": token}
+        if self.async_insert:
+            # Wait for the server-side buffer flush, so the rows are stored before callbacks run
+            settings.update({"async_insert": 1, "wait_for_async_insert": 1, "async_insert_deduplicate": 1})
+        with tracer.start_as_current_span("db.buffered_insert") as span:
+            span.set_attribute("db.system", "clickhouse")
+            span.set_attribute("db.operation", "INSERT")
+            span.set_attribute("db.table", self.table)
+            span.set_attribute("row_count", rows)
+            started = time.monotonic()
+            for attempt in range(self.retries + 1):
+                try:
+                    get_clickhouse_client().insert_columns(self.table, columns, settings=settings)
+                    break
+                except Exception as e:
+                    if attempt == self.retries:
+                        self.failed += 1
+                        logger.error(f"Insert of {rows} rows into {self.table} failed after {attempt + 1} attempts: {e}")
+                        raise
+                    self.retried += 1
+                    logger.warning(f"Insert of {rows} rows into {self.table} failed, retrying: {e}")
+                    time.sleep(self.retry_backoff_seconds * 2 ** attempt)
+            span.set_attribute("attempts", attempt + 1)
+        self.flushes += 1
+        self.rows_flushed += rows
+        self.last_flush_seconds = time.monotonic() - started
+
+    def _ensure_flusher(self):
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name=f"write-buffer-{self.table}", daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(min(self.max_seconds, 1.0))
+            try:
+                with self._lock:
+                    due = self._oldest is not None and time.monotonic() - self._oldest >= self.max_seconds
+                if due:
+                    self._flush(background=True)
+            except Exception as e:
+                # Unwritten rows stay buffered; reported to the next add() / flush() caller
+                logger.error(f"Background flush of {self.table} failed: {e}")
+                self._error = e
+
+    def _raise_background_error(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def discard(self) -> int:
+        """Drop the buffered rows and their callbacks (e.g. after a failed run). Returns the rows dropped."""
+        with self._lock:
+            rows = self._depth()
+            self._columns, self._rows, self._callbacks, self._oldest = {}, 0, [], None
+            self._failed_batch = None
+        self._error = None
+        return rows
+
+    def reset_max_depth(self):
+        """Start a new max_depth_rows window (e.g. at the start of a worker run)."""
+        with self._lock:
+            self.max_depth = self._depth()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            depth = self._depth()
+            age = time.monotonic() - self._oldest if self._oldest is not None else 0.0
+        return {
+            "table": self.table,
+            "depth_rows": depth,
+            "oldest_row_seconds": round(age, 2),
+            "max_depth_rows": self.max_depth,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "avg_rows_per_flush": round(self.rows_flushed / self.flushes, 1) if self.flushes else 0.0,
+            "last_flush_seconds": round(self.last_flush_seconds, 3),
+            "retried": self.retried,
+            "failed": self.failed,
+        }
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from src.batch import BatchForecastEngine
+from src.service import RollingAverageModel, SeasonalNaiveModel, WeightedMovingAverageModel
+from src.timeseries import TimeSeries
+
+
+def make_series(values):
+    starts = np.datetime64("2024-01-01", "ms") + np.arange(len(values)) * np.timedelta64(1, "D")
+    return TimeSeries(starts, values)
+
+
+@pytest.fixture
+def series_map():
+    rng = np.random.default_rng(3)
+    # Long, exactly-lookback, short and empty series
+    return {
+        category_id: make_series(rng.uniform(0, 100, length))
+        for category_id, length in ((1, 40), (2, 8), (3, 7), (4, 3), (5, 0))
+    }
+
+
+def scalar(model, series, lookback, bucket_type, offset):
+    if offset:
+        series = series[:-offset] if len(series) >= offset else series[:0]
+    return model.forecast(series, lookback, bucket_type, 0, "")
+
+
+@pytest.mark.parametrize("model", [RollingAverageModel(), WeightedMovingAverageModel(), SeasonalNaiveModel()])
+@pytest.mark.parametrize("offset", [0, 1])
+def test_batch_matches_per_series_forecast(model, offset, series_map):
+    engine = BatchForecastEngine(series_map, window=30)
+    batched = model.forecast_batch(engine, 7, "DAY", offset)
+
+    assert batched.keys() == series_map.keys()
+    for category_id, series in series_map.items():
+        value, message = scalar(model, series, 7, "DAY", offset)
+        assert batched[category_id][1] == message
+        assert batched[category_id][0] == (pytest.approx(value) if value is not None else None)
+
+
+@pytest.mark.parametrize("model", [RollingAverageModel(), WeightedMovingAverageModel(), SeasonalNaiveModel()])
+def test_batch_steps_match_per_series_steps(model, series_map):
+    engine = BatchForecastEngine(series_map, window=30)
+    batched = model.forecast_batch_steps(engine, 7, "DAY", 10)
+
+    for category_id, series in series_map.items():
+        values, message = model.forecast_steps(series, 10, 7, "DAY", category_id, "")
+        assert batched[category_id][1] == message
+        assert batched[category_id][0] == (pytest.approx(values) if values is not None else None)
+
+
+def test_window_too_small_raises(series_map):
+    engine = BatchForecastEngine(series_map, window=7)
+    with pytest.raises(ValueError):
+        engine.rolling(7, offset=1)
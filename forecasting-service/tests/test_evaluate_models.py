@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from src.evaluate_models import walk_forward_forecasts
+from src.service import ForecastingService
+from src.timeseries import TimeSeries
+
+
+def make_series(values):
+    starts = np.datetime64("2024-01-01", "ms") + np.arange(len(values)) * np.timedelta64(1, "D")
+    return TimeSeries(starts, values)
+
+
+@pytest.fixture(scope="module")
+def service():
+    service = ForecastingService()
+    service.fit_cache = None
+    return service
+
+
+@pytest.fixture
+def all_series():
+    rng = np.random.default_rng(11)
+    return {
+        1: make_series(30 + np.arange(40) * 0.5 + rng.normal(0, 3, 40)),
+        2: make_series(80 + rng.normal(0, 10, 25)),
+        # Shorter than test_points + 1: not evaluated
+        3: make_series([4.0, 5.0, 6.0]),
+    }
+
+
+def baseline(service, name, all_series, test_points, lookback):
+    """Refit per origin: the walk-forward definition without the batch engine or state roll-forward."""
+    actuals, forecasts = [], []
+    model = service._models[name]
+    for category_id, series in all_series.items():
+        if len(series) < test_points + 1:
+            continue
+        for origin in range(1, test_points + 1):
+            value, _ = model.forecast(series[:-origin], lookback, "DAY", category_id, str(category_id))
+            if value is not None:
+                actuals.append(float(series.values[-origin]))
+                forecasts.append(value)
+    return actuals, forecasts
+
+
+@pytest.mark.parametrize("name", ["rolling", "wma", "snaive"])
+def test_closed_form_models_match_per_origin_forecasts(service, all_series, name):
+    results = walk_forward_forecasts(service, all_series, "DAY", 5, lookback=4)
+    actuals, forecasts = baseline(service, name, all_series, 5, 4)
+
+    assert results[name]["actuals"] == actuals
+    assert results[name]["forecasts"] == pytest.approx(forecasts)
+    assert len(actuals) == 10
+
+
+def test_ses_refit_every_origin_matches_per_origin_fits(service, all_series):
+    results = walk_forward_forecasts(service, all_series, "DAY", 5, lookback=4, refit_every=1)
+    actuals, forecasts = baseline(service, "ses", all_series, 5, 4)
+
+    assert results["ses"]["actuals"] == actuals
+    assert results["ses"]["forecasts"] == pytest.approx(forecasts, rel=1e-6)
+
+
+def test_rolled_forward_models_forecast_every_origin(service, all_series):
+    results = walk_forward_forecasts(service, all_series, "DAY", 5, lookback=4, refit_every=0)
+
+    for name in ("ses", "arima"):
+        assert results[name]["actuals"] == results["rolling"]["actuals"]
+        assert all(np.isfinite(results[name]["forecasts"]))
+
+
+def test_no_series_long_enough(service):
+    assert walk_forward_forecasts(service, {1: make_series([1.0, 2.0])}, "DAY", 5) == {}
@@ -0,0 +1,33 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from src.executors import BoundedExecutor, io_executor
+
+
+def test_io_executor_is_bounded():
+    assert io_executor.max_workers > 0
+    assert io_executor.max_pending > 0
+
+
+def test_calls_beyond_max_pending_are_rejected():
+    executor = BoundedExecutor("test", max_workers=1, max_pending=2)
+    release = threading.Event()
+
+    async def scenario():
+        running = [asyncio.create_task(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as rejected:
+            await executor.run(release.wait)
+        release.set()
+        await asyncio.gather(*running)
+        return rejected.value.status_code
+
+    try:
+        assert asyncio.run(scenario()) == 503
+    finally:
+        executor.shutdown()
+    assert executor.stats()["rejected"] == 1
+    assert executor.stats()["completed"] == 2
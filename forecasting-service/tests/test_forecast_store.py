@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from src import forecast_store
+from src.forecast_store import LatestForecastStore
+
+
+class FakeForecasts:
+    def __init__(self):
+        self.generated_at = {1: 1000, 2: 1000}
+        self.age_reads = 0
+        self.bulk_reads = []
+
+    def get_forecast_watermark(self):
+        return max(self.generated_at.values()) if self.generated_at else None
+
+    def fetch_forecast_ages(self):
+        self.age_reads += 1
+        return {merchant_id: (generated_at, 0) for merchant_id, generated_at in self.generated_at.items()}
+
+    def fetch_latest_forecasts_bulk(self, merchant_ids):
+        self.bulk_reads.append(sorted(merchant_ids))
+        return {merchant_id: [{"generated_at": self.generated_at[merchant_id]}] for merchant_id in merchant_ids}
+
+
+@pytest.fixture
+def forecasts(monkeypatch):
+    fake = FakeForecasts()
+    monkeypatch.setattr(forecast_store, "db", fake)
+    return fake
+
+
+def make_store():
+    return LatestForecastStore(lambda rows: json.dumps(rows).encode(), refresh_interval_seconds=30, full_reload_seconds=600)
+
+
+def test_first_refresh_loads_every_merchant(forecasts):
+    store = make_store()
+    assert store.get(1) is None
+
+    assert store.refresh() == 2
+    assert json.loads(store.get(1)) == [{"generated_at": 1000}]
+    assert store.get(3) == b"[]"
+
+
+def test_unchanged_watermark_skips_the_per_merchant_read(forecasts):
+    store = make_store()
+    store.refresh()
+
+    assert store.refresh() == 0
+    assert forecasts.age_reads == 1
+
+
+def test_new_forecasts_reload_only_changed_merchants(forecasts):
+    store = make_store()
+    store.refresh()
+    forecasts.generated_at[2] = 2000
+
+    assert store.refresh() == 1
+    assert forecasts.bulk_reads[-1] == [2]
+    assert json.loads(store.get(2)) == [{"generated_at": 2000}]
+
+
+def test_full_reload_drops_removed_merchants(forecasts):
+    store = make_store()
+    store.refresh()
+    del forecasts.generated_at[2]
+    store.full_reload_seconds = 0
+
+    store.refresh()
+
+    assert store.get(2) == b"[]"
+    assert store.stats()["merchants"] == 1
@@ -0,0 +1,37 @@
+from src.incremental import IncrementalForecastState
+
+
+def result(value):
+    return {"rolling": {"forecast_value": value}}
+
+
+def test_merge_carries_unchanged_categories_forward():
+    state = IncrementalForecastState()
+    state.merge(1, {10: result(1.0), 11: result(2.0)}, full=True)
+
+    merged = state.merge(1, {11: result(3.0)}, full=False)
+
+    assert merged == {10: result(1.0), 11: result(3.0)}
+
+
+def test_complete_run_keeps_the_most_recently_forecast_merchants():
+    state = IncrementalForecastState(max_merchants=2)
+    for merchant_id in (1, 2, 3):
+        state.merge(merchant_id, {10: result(1.0)}, full=True)
+    state.merge(1, {10: result(2.0)}, full=False)
+
+    state.complete_run(1000, False, {1})
+
+    assert state.evictions == 1
+    assert state.widen({1: {10}, 2: {10}, 3: {10}}) == {1: {10}, 2: None, 3: {10}}
+
+
+def test_full_run_drops_merchants_without_data():
+    state = IncrementalForecastState()
+    state.merge(1, {10: result(1.0)}, full=True)
+    state.merge(2, {10: result(1.0)}, full=True)
+
+    state.complete_run(1000, True, {2})
+
+    assert state.widen({1: {10}, 2: {10}}) == {1: None, 2: {10}}
+    assert state.since_ms() == 1000 - state.lag_ms
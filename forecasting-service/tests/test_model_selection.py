@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from src.service import ARIMAModel, ExponentialSmoothingModel, ForecastingService
+from src.timeseries import TimeSeries
+
+
+def make_series(values, start="2024-01-01"):
+    starts = np.datetime64(start, "ms") + np.arange(len(values)) * np.timedelta64(1, "D")
+    return TimeSeries(starts, values)
+
+
+@pytest.fixture
+def category_series():
+    rng = np.random.default_rng(7)
+    trend = make_series(20 + np.arange(30) * 1.5 + rng.normal(0, 2, 30))
+    noisy = make_series(50 + rng.normal(0, 8, 30))
+    short = make_series([5, 7, 6, 8, 9, 7])
+    return {1: trend, 2: noisy, 3: short}
+
+
+@pytest.mark.parametrize("model", [ExponentialSmoothingModel(), ARIMAModel()])
+def test_holdout_is_forecast_from_series_without_last_point(model, category_series):
+    series = category_series[1]
+    values, message, holdout = model.forecast_steps_holdout(series, 3, 4, "DAY", 1, "1")
+    expected, _ = model.forecast(series[:-1], 4, "DAY", 1, "1")
+    assert message is None
+    assert len(values) == 3
+    assert holdout == pytest.approx(expected)
+
+
+def test_holdout_is_none_when_prefix_is_too_short():
+    values, message, holdout = ARIMAModel().forecast_steps_holdout(make_series(np.arange(10.0)), 2, 4, "DAY", 1, "1")
+    assert holdout is None
+    assert values is not None and message is None
+
+
+def test_worker_selection_matches_api_selection(category_series):
+    service = ForecastingService()
+    service.fit_cache = None
+    _, holdouts = service.fit_per_category_models(None, category_series, 4, "DAY")
+    worker = service.select_models(category_series, "DAY", holdouts)
+    api = service.select_models(category_series, "DAY")
+    assert worker.keys() == api.keys()
+    for category_id, (model_name, error, points) in api.items():
+        assert worker[category_id][0] == model_name
+        assert worker[category_id][1] == pytest.approx(error)
+        assert worker[category_id][2] == points
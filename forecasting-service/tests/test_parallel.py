@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from src.parallel import ParallelFitRunner, _task_cost, plan_chunks
+from src.service import ForecastingService
+from src.timeseries import TimeSeries
+
+
+def make_series(length):
+    starts = np.datetime64("2024-01-01", "ms") + np.arange(length) * np.timedelta64(1, "D")
+    return TimeSeries(starts, 10 + np.sin(np.arange(length, dtype=float)) * 3)
+
+
+def make_tasks():
+    tasks = []
+    for merchant_id, length in ((1, 60), (2, 10), (3, 30)):
+        for category_id in range(4):
+            for model_name in ("ses", "arima"):
+                tasks.append((merchant_id, category_id, model_name, make_series(length + category_id), None))
+    return tasks
+
+
+def test_plan_chunks_keeps_every_task_once():
+    tasks = make_tasks()
+    chunks = plan_chunks(tasks, 5)
+    planned = [task[:3] for chunk in chunks for task in chunk]
+    assert sorted(planned) == sorted(task[:3] for task in tasks)
+    assert plan_chunks([], 5) == []
+
+
+def test_plan_chunks_puts_expensive_tasks_first_in_balanced_chunks():
+    tasks = make_tasks()
+    chunks = plan_chunks(tasks, 5)
+    costs = [_task_cost(task) for chunk in chunks for task in chunk]
+    assert costs == sorted(costs, reverse=True)
+
+    budget = sum(costs) / 5
+    chunk_costs = [sum(_task_cost(task) for task in chunk) for chunk in chunks]
+    # Every chunk but the last reaches the budget and exceeds it by at most its last task
+    assert all(budget <= cost < budget + max(costs) for cost in chunk_costs[:-1])
+    assert len(chunks) <= 5 + 1
+
+
+def test_plan_chunks_with_one_target_chunk():
+    tasks = make_tasks()
+    assert plan_chunks(tasks, 1) == [sorted(tasks, key=_task_cost, reverse=True)]
+
+
+def test_pool_fits_match_serial_fits():
+    merchant_series = {
+        1: {10: make_series(40), 11: make_series(8)},
+        2: {20: make_series(25)},
+        3: {},
+    }
+    service = ForecastingService()
+    runner = ParallelFitRunner(service.per_category_models, processes=1, chunks_per_process=2)
+    try:
+        pooled = {merchant_id: (fitted, holdouts) for merchant_id, fitted, holdouts in runner.fit(merchant_series, 4, "DAY", 3)}
+    finally:
+        runner.shutdown()
+
+    assert pooled.keys() == merchant_series.keys()
+    for merchant_id, category_series in merchant_series.items():
+        fitted, holdouts = ForecastingService().fit_per_category_models(merchant_id, category_series, 4, "DAY", 3)
+        pooled_fitted, pooled_holdouts = pooled[merchant_id]
+        assert pooled_fitted.keys() == fitted.keys()
+        for key, (values, message) in fitted.items():
+            assert pooled_fitted[key][1] == message
+            assert pooled_fitted[key][0] == (pytest.approx(values) if values is not None else None)
+        assert pooled_holdouts == {
+            key: pytest.approx(value) if value is not None else None for key, value in holdouts.items()
+        }
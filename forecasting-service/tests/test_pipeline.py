@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+from src.pipeline import Stage, StagePipeline
+
+
+def test_items_flow_through_every_stage():
+    pipeline = StagePipeline([
+        Stage("double", lambda x: x * 2, workers=2),
+        Stage("drop_multiples_of_four", lambda x: None if x % 4 == 0 else x),
+    ])
+    assert sorted(pipeline.run(range(10))) == [2, 6, 10, 14, 18]
+    summary = pipeline.summary()
+    assert summary["double"]["processed"] == 10
+    assert summary["drop_multiples_of_four"]["emitted"] == 5
+
+
+def test_expand_stage_emits_many_items_per_input():
+    pipeline = StagePipeline([Stage("repeat", lambda x: [x] * x, expand=True)])
+    assert sorted(pipeline.run([1, 2, 3])) == [1, 2, 2, 3, 3, 3]
+
+
+def test_batch_stage_receives_queued_items_together():
+    batches = []
+
+    def collect(items):
+        if not batches:
+            # The rest of the source queues up while the first batch is busy
+            time.sleep(0.3)
+        batches.append(list(items))
+        return items
+
+    pipeline = StagePipeline([Stage("batch", collect, queue_size=8, expand=True, batch_size=4)])
+    assert sorted(pipeline.run(range(6))) == [0, 1, 2, 3, 4, 5]
+    assert all(len(batch) <= 4 for batch in batches)
+    assert any(len(batch) > 1 for batch in batches)
+    assert sorted(x for batch in batches for x in batch) == [0, 1, 2, 3, 4, 5]
+    assert pipeline.summary()["batch"]["processed"] == 6
+
+
+def test_first_stage_error_stops_the_pipeline_and_is_raised():
+    started = []
+
+    def fail_on_three(x):
+        started.append(x)
+        if x == 3:
+            raise ValueError("bad item")
+        return x
+
+    pipeline = StagePipeline([Stage("check", fail_on_three), Stage("sink", lambda x: x)])
+    with pytest.raises(ValueError, match="bad item"):
+        list(pipeline.run(range(1000)))
+    assert len(started) < 1000
+    assert all(not thread.name.startswith("pipeline-") for thread in threading.enumerate())
+
+
+def test_source_error_is_raised():
+    def source():
+        yield 1
+        raise RuntimeError("scan failed")
+
+    pipeline = StagePipeline([Stage("identity", lambda x: x)])
+    with pytest.raises(RuntimeError, match="scan failed"):
+        list(pipeline.run(source()))
+
+
+def test_only_the_first_error_is_kept():
+    pipeline = StagePipeline([Stage("a", lambda x: x)])
+    pipeline._fail("a", ValueError("first"))
+    pipeline._fail("b", ValueError("second"))
+    assert str(pipeline._error) == "first"
+    assert pipeline._stop.is_set()
@@ -0,0 +1,71 @@
+import time
+
+from src.priority import PriorityScheduler, merge_plans
+
+
+def make_scheduler(budget_seconds=0.0):
+    scheduler = PriorityScheduler(budget_seconds=budget_seconds, max_age_seconds=1000.0)
+    scheduler.seconds_per_series = 1.0
+    return scheduler
+
+
+def test_merge_plans_prefers_every_category():
+    merged = merge_plans({1: {10}, 2: {20}}, {1: None, 2: {21}, 3: {30}})
+    assert merged == {1: None, 2: {20, 21}, 3: {30}}
+
+
+def test_select_orders_by_staleness_size_and_velocity():
+    scheduler = make_scheduler()
+    now = time.time()
+    scheduler.forecast_at = {1: now - 10, 2: now - 500, 3: now - 500}
+    scheduler.sizes = {2: (0.0, 1), 3: (1000.0, 1)}
+
+    selected, deferred = scheduler.select({1: None, 2: None, 3: None})
+
+    assert list(selected) == [3, 2, 1]
+    assert deferred == {}
+
+
+def test_select_defers_what_does_not_fit_the_budget():
+    scheduler = make_scheduler(budget_seconds=3.0)
+    now = time.time()
+    scheduler.forecast_at = {1: now - 100, 2: now - 50}
+
+    selected, deferred = scheduler.select({1: {10, 11}, 2: {20, 21}, 3: {30, 31, 32, 33, 34}})
+
+    # Never-forecast merchant 3 is the stalest and always taken, even over budget
+    assert list(selected) == [3]
+    assert deferred == {1: {10, 11}, 2: {20, 21}}
+    assert scheduler.take_backlog() == deferred
+    assert scheduler.backlog == {}
+
+
+def test_over_budget_after_deadline():
+    scheduler = make_scheduler(budget_seconds=0.01)
+    scheduler.select({1: None})
+    assert not scheduler.over_budget()
+    time.sleep(0.02)
+    assert scheduler.over_budget()
+    assert not make_scheduler().over_budget()
+
+
+def test_restore_defers_the_taken_backlog_again():
+    scheduler = make_scheduler()
+    scheduler.defer({1: {10}})
+    assert scheduler.take_backlog() == {1: {10}}
+    scheduler.defer({1: {11}})
+
+    scheduler.restore()
+
+    assert scheduler.backlog == {1: {10, 11}}
+
+
+def test_finish_forgets_the_taken_backlog():
+    scheduler = make_scheduler()
+    scheduler.defer({1: {10}})
+    scheduler.take_backlog()
+    scheduler.finish()
+
+    scheduler.restore()
+
+    assert scheduler.backlog == {}
@@ -0,0 +1,118 @@
+from collections import Counter
+from contextlib import contextmanager
+
+import pytest
+
+from src import sharding
+from src.sharding import ConsistentHashRing, WorkerShardCoordinator
+
+MERCHANTS = range(1, 5001)
+
+
+def owners(ring):
+    return {merchant_id: ring.owner(merchant_id) for merchant_id in MERCHANTS}
+
+
+def test_ring_is_deterministic_and_balanced():
+    workers = ["worker-a", "worker-b", "worker-c"]
+    assignment = owners(ConsistentHashRing(workers, vnodes=64))
+
+    assert assignment == owners(ConsistentHashRing(reversed(workers), vnodes=64))
+    counts = Counter(assignment.values())
+    assert set(counts) == set(workers)
+    assert max(counts.values()) < 2 * min(counts.values())
+
+
+def test_adding_a_worker_moves_merchants_only_to_it():
+    before = owners(ConsistentHashRing(["worker-a", "worker-b", "worker-c"], vnodes=64))
+    after = owners(ConsistentHashRing(["worker-a", "worker-b", "worker-c", "worker-d"], vnodes=64))
+
+    moved = [merchant_id for merchant_id in MERCHANTS if before[merchant_id] != after[merchant_id]]
+    assert all(after[merchant_id] == "worker-d" for merchant_id in moved)
+    assert 0.1 < len(moved) / len(MERCHANTS) < 0.4
+
+
+def test_removing_a_worker_moves_only_its_merchants():
+    before = owners(ConsistentHashRing(["worker-a", "worker-b", "worker-c"], vnodes=64))
+    after = owners(ConsistentHashRing(["worker-a", "worker-b"], vnodes=64))
+
+    for merchant_id in MERCHANTS:
+        if before[merchant_id] != "worker-c":
+            assert after[merchant_id] == before[merchant_id]
+
+
+def test_empty_ring_has_no_owner():
+    assert ConsistentHashRing([]).owner(1) is None
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 1
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        if "AS cycle" in sql:
+            self._rows = [{"cycle": self.db.cycle}]
+        elif "FROM forecasting.worker_shards" in sql:
+            self._rows = [{"worker_id": worker} for worker in self.db.workers]
+        elif "INSERT INTO forecasting.merchant_leases" in sql:
+            self._rows = [
+                {"merchant_id": merchant_id}
+                for merchant_id in params["merchant_ids"] if merchant_id not in self.db.leased_by_peers
+            ]
+
+    def fetchone(self):
+        return self._rows[0]
+
+    def fetchall(self):
+        return self._rows
+
+
+class FakePostgres:
+    def __init__(self, workers):
+        self.cycle = 1
+        self.workers = workers
+        self.leased_by_peers = set()
+
+    @contextmanager
+    def cursor(self, commit=False):
+        yield FakeCursor(self)
+
+
+@pytest.fixture
+def postgres(monkeypatch):
+    fake = FakePostgres(["worker-a"])
+    monkeypatch.setattr(sharding, "get_postgres_client", lambda: fake)
+    return fake
+
+
+def test_assign_acquires_new_merchants_and_releases_moved_ones(postgres):
+    coordinator = WorkerShardCoordinator(worker_id="worker-a", vnodes=64)
+    merchants = set(range(1, 201))
+
+    first = coordinator.assign(merchants, full=True)
+    assert first.owned == merchants and first.acquired == merchants and not first.released
+    for merchant_id in coordinator.claim(first.owned):
+        coordinator.complete(merchant_id)
+
+    postgres.workers = ["worker-a", "worker-b"]
+    second = coordinator.assign(set(), full=False)
+    ring = ConsistentHashRing(["worker-a", "worker-b"], vnodes=64)
+    assert second.owned == {merchant_id for merchant_id in merchants if ring.owner(merchant_id) == "worker-a"}
+    assert second.released == merchants - second.owned
+    assert not second.acquired
+
+
+def test_contended_merchants_are_refit_in_full_when_leased_again(postgres):
+    coordinator = WorkerShardCoordinator(worker_id="worker-a", vnodes=64)
+    assignment = coordinator.assign({1, 2, 3}, full=True)
+    for merchant_id in coordinator.claim(assignment.owned):
+        coordinator.complete(merchant_id)
+
+    postgres.leased_by_peers = {2}
+    assert coordinator.claim({1, 2, 3}) == {1, 3}
+    assert coordinator.contended == 1
+
+    postgres.leased_by_peers = set()
+    assert coordinator.assign(set(), full=False).acquired == {2}
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from src.timeseries import TimeSeries, TimeSeriesPoint, future_bucket_starts, split_series
+
+POINTS = [
+    TimeSeriesPoint(datetime(2024, 1, 1), 1.0),
+    TimeSeriesPoint(datetime(2024, 1, 2), 2.5),
+    TimeSeriesPoint(datetime(2024, 1, 3), 4.0),
+]
+
+
+def test_round_trip_with_points():
+    series = TimeSeries.from_points(POINTS)
+
+    assert len(series) == 3
+    assert list(series) == POINTS
+    assert series[1] == POINTS[1]
+    assert series.last_bucket_start == datetime(2024, 1, 3)
+
+
+def test_slices_are_views():
+    series = TimeSeries.from_points(POINTS)
+    window = series[1:]
+
+    assert list(window) == POINTS[1:]
+    assert np.shares_memory(window.values, series.values)
+
+
+def test_misaligned_columns_raise():
+    with pytest.raises(ValueError):
+        TimeSeries(np.array(["2024-01-01"], dtype="datetime64[ms]"), [1.0, 2.0])
+    assert len(TimeSeries.empty()) == 0
+
+
+def test_split_series_matches_grouping_rows():
+    keys = np.array([1, 1, 2, 5, 5, 5])
+    starts = np.datetime64("2024-01-01", "ms") + np.array([0, 1, 0, 0, 1, 2]) * np.timedelta64(1, "D")
+    values = np.arange(6, dtype=np.float64)
+
+    split = split_series(keys, starts, values)
+
+    expected = {}
+    for key, start, value in zip(keys.tolist(), starts, values.tolist()):
+        expected.setdefault(key, []).append(TimeSeriesPoint(start.astype(datetime), value))
+    assert {key: list(series) for key, series in split.items()} == expected
+    assert split_series(np.array([]), np.array([]), np.array([])) == {}
+
+
+@pytest.mark.parametrize(
+    "bucket_type, expected",
+    [
+        ("DAY", [datetime(2024, 1, 31), datetime(2024, 2, 1)]),
+        ("WEEK", [datetime(2024, 2, 6), datetime(2024, 2, 13)]),
+        ("MONTH", [datetime(2024, 2, 1), datetime(2024, 3, 1)]),
+    ],
+)
+def test_future_bucket_starts(bucket_type, expected):
+    assert future_bucket_starts(datetime(2024, 1, 30), bucket_type, 2) == expected
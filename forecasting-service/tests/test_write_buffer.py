@@ -0,0 +1,123 @@
+import time
+
+import pytest
+
+from src import write_buffer
+from src.write_buffer import ColumnarWriteBuffer
+
+
+class FakeClient:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.inserts = []
+        self.tokens = []
+
+    def insert_columns(self, table, columns, settings=None):
+        self.tokens.append(settings["insert_deduplication_token"])
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("insert failed")
+        self.inserts.append({name: list(values) for name, values in columns.items()})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    fake = FakeClient()
+    monkeypatch.setattr(write_buffer, "get_clickhouse_client", lambda: fake)
+    return fake
+
+
+def make_buffer(**kwargs):
+    kwargs.setdefault("max_rows", 100)
+    kwargs.setdefault("max_seconds", 0)
+    kwargs.setdefault("retries", 0)
+    kwargs.setdefault("retry_backoff_seconds", 0)
+    return ColumnarWriteBuffer("t", **kwargs)
+
+
+def test_rows_of_many_adds_are_written_in_one_insert(client):
+    buffer = make_buffer()
+    completed = []
+    buffer.add({"a": [1, 2]}, on_flushed=lambda: completed.append(1))
+    buffer.add({"a": [3]}, on_flushed=lambda: completed.append(2))
+    assert client.inserts == [] and completed == []
+
+    assert buffer.flush() == 3
+    assert client.inserts == [{"a": [1, 2, 3]}]
+    assert completed == [1, 2]
+
+
+def test_full_buffer_flushes_on_add(client):
+    buffer = make_buffer(max_rows=2)
+    buffer.add({"a": [1]})
+    buffer.add({"a": [2]})
+    assert client.inserts == [{"a": [1, 2]}]
+
+
+def test_failed_insert_keeps_rows_and_callbacks_until_written(client):
+    buffer = make_buffer()
+    completed = []
+    buffer.add({"a": [1, 2]}, on_flushed=lambda: completed.append(1))
+    client.failures = 1
+    with pytest.raises(ConnectionError):
+        buffer.flush()
+    assert completed == []
+    assert buffer.stats()["depth_rows"] == 2
+
+    buffer.add({"a": [3]}, on_flushed=lambda: completed.append(2))
+    assert buffer.flush() == 3
+    # The failed batch is retried as it was sent, with its deduplication token
+    assert client.inserts == [{"a": [1, 2]}, {"a": [3]}]
+    assert client.tokens[0] == client.tokens[1]
+    assert completed == [1, 2]
+    assert buffer.stats()["depth_rows"] == 0
+
+
+def test_retries_reuse_the_deduplication_token(client):
+    buffer = make_buffer(retries=2)
+    buffer.add({"a": [1]})
+    client.failures = 2
+    assert buffer.flush() == 1
+    assert len(set(client.tokens)) == 1
+    assert buffer.retried == 2
+
+
+def test_discard_drops_failed_rows(client):
+    buffer = make_buffer()
+    buffer.add({"a": [1]}, on_flushed=lambda: pytest.fail("callback of discarded rows"))
+    client.failures = 1
+    with pytest.raises(ConnectionError):
+        buffer.flush()
+    assert buffer.discard() == 1
+    assert buffer.flush() == 0
+    assert client.inserts == []
+
+
+def test_background_flusher_survives_errors(client):
+    buffer = make_buffer(max_seconds=0.05)
+    buffer.add({"a": [1]}, on_flushed=lambda: (_ for _ in ()).throw(RuntimeError("callback failed")))
+    deadline = time.monotonic() + 3
+    while not client.inserts and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert client.inserts == [{"a": [1]}]
+    with pytest.raises(RuntimeError):
+        buffer.add({"a": [2]})
+
+    # The flusher thread is still alive and keeps flushing by age
+    completed = []
+    buffer.add({"a": [3]}, on_flushed=lambda: completed.append(3))
+    deadline = time.monotonic() + 3
+    while not completed and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert completed == [3]
+    assert buffer._flusher.is_alive()
+
+
+def test_max_depth_is_reset_per_cycle(client):
+    buffer = make_buffer()
+    buffer.add({"a": [1, 2, 3]})
+    buffer.flush()
+    assert buffer.stats()["max_depth_rows"] == 3
+    buffer.reset_max_depth()
+    buffer.add({"a": [4]})
+    assert buffer.stats()["max_depth_rows"] == 1